@@ -1,68 +1,8 @@
 import streamlit as st
-from utils import supabase_utils as su
-from streamlit_authenticator import Authenticate
-from utils.ui_utils import hide_streamlit_pages_nav
+from utils.page_utils import bootstrap_page, get_authenticator
 
-# Hide Streamlit’s built-in pages nav on this root script, too
-hide_streamlit_pages_nav()
+# Page config, hidden built-in nav, cached user context and role-based nav
+bootstrap_page("Expense Reporting", require_auth=False)
 
-st.set_page_config(layout="wide", page_title="Expense Reporting")
-
-# --- AUTH SETUP (only in app.py) ---
-if "authenticator" not in st.session_state:
-    creds = su.fetch_all_users_for_auth()
-    cfg   = st.secrets.get("cookie", {})
-    auth  = Authenticate(
-        creds,
-        cfg.get("name",        "cookie_name"),
-        cfg.get("key",         "random_key"),
-        cfg.get("expiry_days", 30),
-    )
-    st.session_state["authenticator"]    = auth
-    st.session_state["user_credentials"] = creds
-
-# --- POPULATE ROLE AFTER LOGIN ---
-if st.session_state.get("authentication_status"):
-    if "role" not in st.session_state or st.session_state.role is None:
-        uname = st.session_state["username"]
-        info  = st.session_state["user_credentials"]["usernames"].get(uname, {})
-        st.session_state["role"]    = info.get("role")
-        st.session_state["user_id"] = info.get("id")
-
-# --- ROLE‐BASED NAVIGATION ---
-PAGES_FOR_ROLES = {
-    "admin": [
-        ("Dashboard",             "2_Dashboard.py"),
-        ("New Report",            "3_New_Report.py"),
-        ("View Reports",          "4_View_Reports.py"),
-        ("User Management",       "6_Users.py"),
-        ("Category Management",   "9_Category_Management.py"),
-        ("Department Maintenance","10_Department_Maintenance.py"),
-        # hidden pages (still reachable via st.switch_page)
-        ("Add User",              "7_Add_User.py"),
-        ("Edit User",             "8_Edit_User.py"),
-    ],
-    "approver": [
-        ("Dashboard",   "2_Dashboard.py"),
-        ("New Report",  "3_New_Report.py"),
-        ("View Reports","4_View_Reports.py"),
-    ],
-    "user": [
-        ("Dashboard",   "2_Dashboard.py"),
-        ("New Report",  "3_New_Report.py"),
-        ("View Reports","4_View_Reports.py"),
-    ],
-    "logged_out": [
-        ("Login",    "1_Login.py"),
-        ("Register", "5_Register.py"),
-    ],
-}
-
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    # Do not display any page file you want to keep hidden: prefix with underscore
-    if fname.startswith("_"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
+# --- AUTH SETUP (shared with the Login page) ---
+get_authenticator()
@@ -0,0 +1,48 @@
+# File: benchmarks/classifier_accuracy.py
+"""
+Held-out accuracy and prediction latency of the vendor category classifier.
+
+Rows come from a CSV export of `expenses` (columns vendor, category_id and
+optionally id, line_items) or, without --csv, straight from Supabase using
+the app's secrets (run from the repository root).
+
+    python benchmarks/classifier_accuracy.py --csv expenses.csv --test-fraction 0.2
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.classifier_utils import evaluate_holdout  # noqa: E402
+
+
+def load_rows(path):
+    if path:
+        with open(path, newline="", encoding="utf-8") as fh:
+            return list(csv.DictReader(fh))
+    from utils import supabase_utils as su
+    return su.get_expense_categories_since(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="CSV export of expenses; defaults to reading Supabase")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--seeds", type=int, default=5, help="number of random splits to average")
+    args = parser.parse_args()
+
+    rows = load_rows(args.csv)
+    runs = [evaluate_holdout(rows, args.test_fraction, seed) for seed in range(args.seeds)]
+    for seed, run in enumerate(runs):
+        print(f"seed {seed}: train {run['train_rows']}, test {run['test_rows']}, "
+              f"accuracy {run['accuracy']:.1%}, coverage {run['coverage']:.1%}, "
+              f"{run['us_per_prediction']:.1f} us/prediction")
+    if runs:
+        print(f"mean accuracy {sum(r['accuracy'] for r in runs) / len(runs):.1%}")
+
+
+if __name__ == "__main__":
+    main()
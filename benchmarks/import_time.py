@@ -0,0 +1,118 @@
+# File: benchmarks/import_time.py
+"""
+Cold-start import report for the app's pages, driven by `python -X importtime`.
+
+Each page's module-level import statements, read from its source with
+`ast`, are run in a fresh interpreter after `streamlit` (every page pays
+for Streamlit itself, so it is excluded). The report lists
+the page's own import cost, its heaviest modules, and fails if the cost is
+over budget or a heavy SDK leaks into a page that never needs it.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget login=300 --top 15
+"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    "login":      "pages/1_Login.py",
+    "dashboard":  "pages/2_Dashboard.py",
+    "new_report": "pages/3_New_Report.py",
+}
+
+# Imports a page runs on first load but not at module level (the login
+# page builds the authenticator, so it pays for streamlit_authenticator)
+EXTRA_IMPORTS = {
+    "login": ["import streamlit_authenticator"],
+}
+
+# Own import cost budget per page, in milliseconds
+BUDGET_MS = {
+    "login":     400,
+    "dashboard": 100,
+}
+
+# Heavy SDKs that must stay out of the login/dashboard cold start
+# (streamlit_authenticator itself pulls in PIL for its captcha widget)
+FORBIDDEN = {
+    "login":     ["google.cloud.vision", "google.generativeai", "fitz", "pandas", "supabase"],
+    "dashboard": ["google.cloud.vision", "google.generativeai", "fitz", "PIL", "pandas", "supabase"],
+}
+
+
+def page_imports(page: str) -> list:
+    """The page's module-level import statements, as source lines."""
+    with open(os.path.join(REPO_ROOT, PAGES[page]), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    statements = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return EXTRA_IMPORTS.get(page, []) + statements
+
+
+def measure(statements):
+    """Returns [(module, level, self_us, cumulative_us)] for imports after streamlit."""
+    code = "import streamlit\n" + "".join(f"{line}\n" for line in statements)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    rows, after_streamlit = [], False
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        head, cum_us, name = line.split("|", 2)
+        self_us = head.split(":", 1)[1]
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        name  = name.strip()
+        if not after_streamlit:
+            after_streamlit = level == 0 and name == "streamlit"
+            continue
+        rows.append((name, level, int(self_us), int(cum_us)))
+    return rows
+
+
+def report(page, budget_ms, top):
+    rows     = measure(page_imports(page))
+    total_ms = sum(cum for _, level, _, cum in rows if level == 0) / 1000
+    loaded   = {name for name, *_ in rows}
+    leaked   = [m for m in FORBIDDEN.get(page, []) if m in loaded]
+
+    print(f"== {page}: {total_ms:.1f} ms own import time"
+          + (f" (budget {budget_ms} ms)" if budget_ms else ""))
+    for name, _, self_us, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"   {self_us / 1000:8.1f} ms  {name}")
+    if leaked:
+        print(f"   !! heavy modules imported at load time: {', '.join(leaked)}")
+
+    return not leaked and (not budget_ms or total_ms <= budget_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", action="append", default=[], metavar="PAGE=MS",
+                        help="override a page's import budget in milliseconds")
+    parser.add_argument("--top", type=int, default=10, help="heaviest modules to list per page")
+    parser.add_argument("pages", nargs="*", default=list(PAGES), help="pages to measure")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGET_MS)
+    for item in args.budget:
+        page, ms = item.split("=", 1)
+        budgets[page] = float(ms)
+
+    ok = True
+    for page in args.pages:
+        ok &= report(page, budgets.get(page), args.top)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
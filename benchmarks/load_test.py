@@ -0,0 +1,329 @@
+# File: benchmarks/load_test.py
+"""
+Concurrent-session load test: N simulated users on one process.
+
+Each user is an AppTest session (streamlit.testing.v1) running the real
+pages against the in-memory backend (utils/local_backend_utils.py):
+log in, open the dashboard, upload a receipt on New Report and wait for
+its OCR, add the expense, browse View Reports and export it to Excel.
+Vision and Gemini are replaced by stub clients that sleep for
+--ocr-latency / --llm-latency, so the OCR job queue and the API quota
+scheduler still do their real work. Sessions share caches, pools and the
+backend exactly as they would on one Streamlit server.
+
+Reports, per page step: reruns, p50/p95/p99/max wall time, backend
+queries per rerun and failures; then the OCR turnaround, session-state
+size per session, process RSS growth per session and API quota stats.
+
+    python benchmarks/load_test.py --sessions 200 --ramp 20 --iterations 2
+    python benchmarks/load_test.py --sessions 20 --query-latency 15 --ocr-latency 800 --llm-latency 1500
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ["EXPENSE_BACKEND"] = "local"
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit import config  # noqa: E402
+from streamlit.runtime.pages_manager import PagesManager  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.testing.v1 import AppTest, app_test  # noqa: E402
+
+from utils import local_backend_utils, ocr_utils  # noqa: E402
+from utils.quota_utils import quota_stats  # noqa: E402
+
+RECEIPT_TEXT = "STAPLES #123\n2025-03-14\nPaper 24.99\nToner 89.00\nSubtotal 113.99\nGST 5.70\nTOTAL 119.69\n"
+RECEIPT_PARSED = {
+    "vendor": "Staples", "date": "2025-03-14", "total_amount": 119.69,
+    "gst_amount": 5.70, "pst_amount": 0.0, "hst_amount": 0.0,
+    "line_items": [{"description": "Paper", "price": 24.99}, {"description": "Toner", "price": 89.00}],
+}
+
+
+class StubVisionClient:
+    """Stands in for vision.ImageAnnotatorClient: sleeps, then returns fixed text."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def document_text_detection(self, image=None, **_):
+        time.sleep(self.latency)
+        return SimpleNamespace(error=SimpleNamespace(code=0, message=""),
+                               full_text_annotation=SimpleNamespace(text=RECEIPT_TEXT))
+
+
+class StubGeminiModel:
+    """Stands in for genai.GenerativeModel: sleeps, then returns fixed JSON."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, prompt, **_):
+        time.sleep(self.latency)
+        return SimpleNamespace(text=json.dumps(RECEIPT_PARSED))
+
+
+def share_apptest_globals():
+    """
+    AppTest is written for one run at a time: around every run it swaps a
+    mock Runtime into a global and clears it after, resets the class-level
+    PagesManager.uses_pages_directory flag and patches config.get_option.
+    Concurrent sessions would see each other's resets, so keep a shared
+    mock Runtime in place, point AppTest's reset at a throwaway subclass,
+    and set the app-testing option for good. Scripts are compiled once into
+    a shared ScriptCache, as on a real server (AppTest recompiles per run,
+    and concurrent compiles trip a CPython 3.11 AST bug).
+    """
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr        = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists   = classmethod(lambda cls: True)
+    app_test.PagesManager = type("PagesManager", (PagesManager,), {})
+    scripts = ScriptCache()
+    app_test.ScriptCache = lambda: scripts
+    config.get_config_options()
+    config._set_option("global.appTest", True, "load_test")
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate bytes held by `obj` and everything it references."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(deep=True))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def rss_mib() -> float:
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """One simulated user; every rerun is timed and its backend queries counted."""
+
+    def __init__(self, number: int, username: str, password: str, timeout: float, results: list):
+        self.number   = number
+        self.username = username
+        self.password = password
+        self.results  = results
+        self.at       = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=timeout)
+
+    def state(self, key: str, default=None):
+        state = self.at.session_state
+        return state[key] if key in state else default
+
+    def queries(self) -> int:
+        return self.state("_query_count", 0)
+
+    def rerun(self, step: str, action=None):
+        """Runs the script (through `action`, e.g. a button click) and records the rerun."""
+        before = self.queries()
+        start  = time.perf_counter()
+        error  = None
+        try:
+            (action or self.at.run)()
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.results.append({
+            "step":    step,
+            "seconds": time.perf_counter() - start,
+            "queries": self.queries() - before,
+            "error":   error,
+        })
+        if error:
+            raise RuntimeError(f"{step}: {error}")
+
+    def open(self, page: str, step: str):
+        self.at.switch_page(page)
+        self.rerun(step)
+
+    def button(self, label: str):
+        return next(b for b in self.at.button if b.label == label)
+
+    # --- flows ---
+
+    def login(self):
+        self.rerun("app")
+        self.open("pages/1_Login.py", "login")
+        self.at.text_input[0].input(self.username)
+        self.at.text_input[1].input(self.password)
+        self.rerun("login: submit", lambda: self.button("Login").click().run())
+        if not self.state("authentication_status"):
+            raise RuntimeError("login: rejected")
+
+    def dashboard(self):
+        self.open("pages/2_Dashboard.py", "dashboard")
+
+    def new_report(self, iteration: int, ocr_timeout: float, ocr_turnaround: list):
+        self.open("pages/3_New_Report.py", "new report")
+        self.at.text_input[0].input(f"Load test {self.number}-{iteration}")
+        # Unique bytes per upload, so every session gets its own OCR job
+        receipt = f"receipt {self.number}-{iteration}-{random.random()}".encode()
+        self.at.file_uploader[0].set_value((f"receipt-{self.number}-{iteration}.png", receipt, "image/png"))
+        started = time.perf_counter()
+        self.rerun("new report: upload")
+        # The page polls the job from a run_every fragment; here, by rerunning
+        while self.state("ocr_result") is None:
+            if time.perf_counter() - started > ocr_timeout:
+                raise RuntimeError("new report: OCR timed out")
+            time.sleep(0.25)
+            self.rerun("new report: poll")
+        ocr_turnaround.append(time.perf_counter() - started)
+        self.rerun("new report: add expense", lambda: self.button("Add Expense to Report").click().run())
+
+    def view_and_export(self):
+        self.open("pages/4_View_Reports.py", "view reports")
+        reports = self.at.selectbox[-1]
+        if len(reports.options) > 1:
+            self.rerun("view reports: select", lambda: reports.select_index(random.randrange(len(reports.options))).run())
+        self.rerun("export: excel", lambda: self.button("Download as Excel").click().run())
+
+    def state_bytes(self) -> int:
+        state = self.at.session_state._state
+        return deep_size(dict(state.filtered_state))
+
+
+def run_session(number, args, results, failures, sizes, ocr_turnaround, start_gate):
+    start_gate.wait()
+    time.sleep(random.uniform(0, args.ramp))
+    session = Session(number, f"user{number % args.users + 1}", args.password, args.timeout, results)
+    try:
+        session.login()
+        for iteration in range(args.iterations):
+            session.dashboard()
+            session.new_report(iteration, args.ocr_timeout, ocr_turnaround)
+            session.view_and_export()
+            time.sleep(random.uniform(0, args.think))
+    except Exception as e:
+        failures.append(f"session {number}: {e}")
+    sizes.append(session.state_bytes())
+    return session
+
+
+def summarise(results: list) -> pd.DataFrame:
+    frame = pd.DataFrame(results)
+    rows = []
+    for step, group in frame.groupby("step", sort=False):
+        ms = group["seconds"].to_numpy() * 1000
+        rows.append({
+            "step":      step,
+            "reruns":    len(group),
+            "p50 ms":    np.percentile(ms, 50),
+            "p95 ms":    np.percentile(ms, 95),
+            "p99 ms":    np.percentile(ms, 99),
+            "max ms":    ms.max(),
+            "queries":   group["queries"].mean(),
+            "max q":     group["queries"].max(),
+            "errors":    int(group["error"].notna().sum()),
+        })
+    return pd.DataFrame(rows).set_index("step")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=1, help="flows per session after login")
+    parser.add_argument("--ramp", type=float, default=5.0, help="sessions start at random within this many seconds")
+    parser.add_argument("--think", type=float, default=1.0, help="max pause between flows, seconds")
+    parser.add_argument("--users", type=int, default=50, help="seeded users (sessions share them round-robin)")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--query-latency", type=float, default=5.0, help="ms added to every backend query")
+    parser.add_argument("--ocr-latency", type=float, default=500.0, help="ms per stub Vision call")
+    parser.add_argument("--llm-latency", type=float, default=1200.0, help="ms per stub Gemini call")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout, seconds")
+    parser.add_argument("--ocr-timeout", type=float, default=600.0, help="max wait for one receipt's OCR, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    local_backend_utils.DEFAULT_SETTINGS.update(
+        users=args.users, password=args.password, latency_ms=args.query_latency, seed=args.seed)
+    vision = StubVisionClient(args.ocr_latency / 1000)
+    gemini = StubGeminiModel(args.llm_latency / 1000)
+    ocr_utils.get_vision_client = lambda: vision
+    ocr_utils.get_gemini_client = lambda: gemini
+
+    share_apptest_globals()
+
+    # Seed the backend and warm imports and caches outside the measurement
+    client = local_backend_utils.get_local_client()
+    warm = Session(0, "user1", args.password, args.timeout, [])
+    warm.login()
+    warm.dashboard()
+    warm.new_report(0, args.ocr_timeout, [])
+    warm.view_and_export()
+    client.db.queries = 0
+    rss_before = rss_mib()
+
+    results, failures, sizes, ocr_turnaround = [], [], [], []
+    start_gate = threading.Barrier(args.sessions + 1)
+    threads = [
+        threading.Thread(target=run_session, name=f"session-{n}",
+                         args=(n, args, results, failures, sizes, ocr_turnaround, start_gate))
+        for n in range(1, args.sessions + 1)
+    ]
+    for thread in threads:
+        thread.start()
+    start_gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss_after = rss_mib()
+
+    pd.set_option("display.width", 160)
+    print(f"== {args.sessions} sessions x {args.iterations} flow(s) in {elapsed:.1f} s, "
+          f"{client.db.queries:,} backend queries, {len(failures)} failed session(s)")
+    print(summarise(results).round(1).to_string())
+    if ocr_turnaround:
+        ms = np.array(ocr_turnaround) * 1000
+        print(f"\nOCR turnaround (upload to result): p50 {np.percentile(ms, 50):.0f} ms, "
+              f"p95 {np.percentile(ms, 95):.0f} ms, p99 {np.percentile(ms, 99):.0f} ms, max {ms.max():.0f} ms")
+    if sizes:
+        kib = np.array(sizes) / 1024
+        print(f"session state per session: median {np.median(kib):.0f} KiB, max {kib.max():.0f} KiB")
+    print(f"process RSS {rss_before:.0f} -> {rss_after:.0f} MiB, "
+          f"{(rss_after - rss_before) / max(1, args.sessions):.2f} MiB per session")
+    print("\nAPI quotas:")
+    for api, stats in quota_stats().items():
+        print(f"  {api}: {stats}")
+    for failure in failures[:10]:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
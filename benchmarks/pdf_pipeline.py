@@ -0,0 +1,83 @@
+# File: benchmarks/pdf_pipeline.py
+"""
+Time and peak memory per page of the PDF rasterisation pipeline.
+
+Builds a synthetic multi-page statement with PyMuPDF (the grand total and
+tax lines on --totals-page), then runs ocr_utils.extract_text_from_bytes
+with a stub recogniser in two configurations: the old behaviour (300 dpi
+RGB PNG, every page) and the current settings (DEFAULT_PDF_SETTINGS).
+Per-page peaks come from tracemalloc, reset before each page, so they
+cover Python allocations only (encoded images, text); MuPDF's pixmaps
+live in C memory tracemalloc cannot see. Process peak RSS is printed
+for the whole run.
+
+    python benchmarks/pdf_pipeline.py --pages 60 --totals-page 3
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # noqa: E402
+
+from utils import ocr_utils  # noqa: E402
+
+LEGACY_SETTINGS = {"dpi": 300, "encoding": "png", "grayscale": False, "max_pages": 10**6, "early_stop": False}
+
+
+def build_statement(pages: int, totals_page: int) -> tuple:
+    """Returns (pdf_bytes, per-page text) for a synthetic statement."""
+    texts = []
+    with fitz.open() as doc:
+        for n in range(1, pages + 1):
+            lines = [f"ACME OFFICE SUPPLY - page {n}"] + [f"Item {n}-{i}   {i}.99" for i in range(40)]
+            if n == totals_page:
+                lines += ["Subtotal 100.00", "GST 5%  5.00", "QST 9.975%  9.98", "TOTAL  114.98"]
+            texts.append("\n".join(lines))
+            doc.new_page().insert_text((36, 48), texts[-1], fontsize=9)
+        return doc.tobytes(), texts
+
+
+def run(label, pdf_bytes, texts, settings):
+    calls = iter(texts)
+    stats = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    ocr_utils.extract_text_from_bytes(
+        pdf_bytes, "application/pdf",
+        recognize=lambda _image: next(calls),
+        settings=settings,
+        stats=stats,
+    )
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    peak = max((row["peak_bytes"] for row in stats), default=0)
+
+    print(f"== {label}: {len(stats)} pages in {elapsed:.2f} s, largest page peak {peak / 2**20:.1f} MiB")
+    print("   page   seconds   image KiB   peak MiB (Python allocations only, not MuPDF pixmaps)")
+    for row in stats:
+        print(f"   {row['page']:4d}   {row['seconds']:7.3f}   {row['image_bytes'] / 1024:9.0f}   "
+              f"{row['peak_bytes'] / 2**20:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--totals-page", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the current settings")
+    args = parser.parse_args()
+
+    pdf_bytes, texts = build_statement(args.pages, args.totals_page)
+    if not args.skip_legacy:
+        run("legacy (300 dpi RGB PNG, all pages)", pdf_bytes, texts, LEGACY_SETTINGS)
+    run(f"current {ocr_utils.DEFAULT_PDF_SETTINGS}", pdf_bytes, texts, dict(ocr_utils.DEFAULT_PDF_SETTINGS))
+    print(f"process peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
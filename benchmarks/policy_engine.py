@@ -0,0 +1,107 @@
+# File: benchmarks/policy_engine.py
+"""
+Throughput of the expense policy engine (utils.policy_utils).
+
+Builds --rows synthetic expenses (dates as ISO strings, as PostgREST
+returns them; a share of them breaking each default rule), then times:
+  - flag_matrix: every rule compiled and evaluated over the whole frame
+  - check_expenses: the same plus one formatted message per violation
+  - a row-by-row Python loop with the same checks, on --loop-rows rows
+    and extrapolated, as the baseline a per-expense validator would give
+
+    python benchmarks/policy_engine.py --rows 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from utils import policy_utils  # noqa: E402
+
+CATEGORIES = [{"id": i, "name": name} for i, name in enumerate(
+    ["Airfare", "Hotel", "Meals", "Ground Transport", "Office Supplies", "Software", "Training",
+     "Client Entertainment"], start=1)]
+LIMITS = {"Meals": 75, "Hotel": 400, "Client Entertainment": 250}
+TODAY  = date(2025, 6, 30)
+
+
+def build_expenses(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng    = np.random.default_rng(seed)
+    amount = rng.uniform(5, 900, rows).round(2)
+    gst    = (amount * 0.05 / 1.05).round(2)
+    off    = rng.random(rows) < 0.02            # GST not 5% of pre-tax
+    gst[off] = (gst[off] * 1.5).round(2)
+    hst    = np.where(rng.random(rows) < 0.01, (amount * 0.13 / 1.13).round(2), 0.0)
+    days   = rng.integers(-365, 5, rows)        # a few in the future
+    dates  = (np.datetime64(TODAY, "D") + days).astype(str)
+    return pd.DataFrame({
+        "id":           np.arange(1, rows + 1),
+        "report_id":    rng.integers(1, rows // 4 + 2, rows),
+        "expense_date": dates,
+        "amount":       amount,
+        "currency":     rng.choice(["CAD", "USD"], rows, p=[0.8, 0.2]),
+        "category_id":  rng.integers(1, len(CATEGORIES) + 1, rows),
+        "gst_amount":   gst,
+        "pst_amount":   0.0,
+        "hst_amount":   hst,
+    })
+
+
+def row_by_row(expenses: pd.DataFrame, settings: dict) -> int:
+    """The same default rules, one expense at a time."""
+    names, count = {c["id"]: c["name"] for c in CATEGORIES}, 0
+    for row in expenses.to_dict("records"):
+        amount, gst, hst = row["amount"], row["gst_amount"] or 0, row["hst_amount"] or 0
+        pretax = amount - gst - (row["pst_amount"] or 0) - hst
+        limit  = settings["limits"].get(names.get(row["category_id"]))
+        when   = date.fromisoformat(row["expense_date"])
+        count += limit is not None and amount > limit
+        count += gst > 0 and abs(gst - settings["gst_rate"] * pretax) > settings["tax_tolerance"]
+        count += gst > 0 and hst > 0
+        count += when > TODAY
+        count += when.weekday() >= 5
+    return count
+
+
+def timed(label: str, rows: int, fn):
+    start   = time.perf_counter()
+    result  = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.3f} s   {rows / elapsed / 1e6:7.2f} M rows/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--loop-rows", type=int, default=50_000, help="rows for the row-by-row baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = dict(policy_utils.DEFAULT_SETTINGS, limits=LIMITS, rules=policy_utils.DEFAULT_RULES)
+    start    = time.perf_counter()
+    expenses = build_expenses(args.rows, args.seed)
+    print(f"built {args.rows:,} expenses in {time.perf_counter() - start:.1f} s")
+
+    flags, _ = timed("flag_matrix (all rules)", args.rows, lambda: policy_utils.flag_matrix(
+        expenses, CATEGORIES, settings, TODAY))
+    violations, _ = timed("check_expenses (with messages)", args.rows, lambda: policy_utils.check_expenses(
+        expenses, CATEGORIES, settings, TODAY))
+    sample = expenses.head(args.loop_rows)
+    looped, elapsed = timed(f"row by row ({len(sample):,} rows)", len(sample), lambda: row_by_row(sample, settings))
+    print(f"{'row by row, extrapolated':<34} {elapsed * args.rows / len(sample):8.3f} s")
+
+    assert looped == int(flags.head(len(sample)).to_numpy().sum()), "baseline and engine disagree"
+    print(f"{len(violations):,} violations: " + ", ".join(
+        f"{rule} {n:,}" for rule, n in flags.sum().items()))
+
+
+if __name__ == "__main__":
+    main()
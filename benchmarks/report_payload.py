@@ -0,0 +1,78 @@
+# File: benchmarks/report_payload.py
+"""
+Report view payload: what View Reports transfers to list a report's
+expenses, before (select *) and after (the light projection), plus what
+opening one row and exporting the whole report load on demand.
+
+Runs against the in-memory backend (utils/local_backend_utils.py) with a
+report of --expenses expenses, each with --ocr-chars characters of OCR
+text and --line-items line items. Sizes are the JSON PostgREST would send.
+
+    python benchmarks/report_payload.py --expenses 40 --ocr-chars 4000 --line-items 12
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["EXPENSE_BACKEND"] = "local"
+
+from utils import supabase_utils as su  # noqa: E402
+from utils.local_backend_utils import get_local_client  # noqa: E402
+
+WORDS = ["COFFEE", "LATTE", "MUFFIN", "SANDWICH", "SUBTOTAL", "GST", "VISA", "APPROVED", "THANK", "YOU", "#4412"]
+
+
+def ocr_text(rng: random.Random, chars: int) -> str:
+    lines = []
+    while sum(len(line) + 1 for line in lines) < chars:
+        lines.append(f"{' '.join(rng.choices(WORDS, k=rng.randint(2, 5)))} {rng.uniform(1, 99):.2f}")
+    return "\n".join(lines)[:chars]
+
+
+def build_report(expenses: int, chars: int, line_items: int, seed: int = 0):
+    rng    = random.Random(seed)
+    client = get_local_client()
+    user   = client.table("users").select("id").limit(1).execute().data[0]
+    report = su.add_report(user["id"], "Payload benchmark", 0)
+    for i in range(expenses):
+        items = [{"description": f"Item {n}", "price": round(rng.uniform(1, 60), 2), "category_id": 3}
+                 for n in range(line_items)]
+        su.add_expense_item(report, "2025-05-14", f"Vendor {i}", "Team lunch", sum(x["price"] for x in items),
+                            category_id=3, receipt_path=f"bench/{i}.pdf", ocr_text=ocr_text(rng, chars),
+                            gst_amount=2.5, line_items=items)
+    return report
+
+
+def size(rows) -> int:
+    return len(json.dumps(rows, default=str).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=40)
+    parser.add_argument("--ocr-chars", type=int, default=4000)
+    parser.add_argument("--line-items", type=int, default=12)
+    args = parser.parse_args()
+
+    report = build_report(args.expenses, args.ocr_chars, args.line_items)
+    full   = get_local_client().table("expenses").select(
+        "*, category:categories!left(id, name, gl_account)").eq("report_id", report).execute().data
+    listed = su._fetch_expenses_for_report(report)
+    ids    = [row["id"] for row in listed]
+    one    = su._fetch_expense_details((ids[0],))
+    export = su._fetch_expense_details(tuple(ids))
+
+    before, after = size(full), size(listed)
+    print(f"{args.expenses} expenses, {args.ocr_chars:,} OCR chars and {args.line_items} line items each")
+    print(f"{'listing, select *':<30} {before:>10,} bytes")
+    print(f"{'listing, light projection':<30} {after:>10,} bytes   {before / after:5.1f}x smaller")
+    print(f"{'one row opened':<30} {size(one):>10,} bytes")
+    print(f"{'export (all details)':<30} {size(export):>10,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# File: benchmarks/upload_memory.py
+"""
+Peak memory per receipt upload: one request with the whole file (the old
+upload_receipt) against upload_utils.upload_file in resumable parts.
+
+Both run over httpx against an in-process stub of the Supabase TUS
+endpoint (a transport that reads request bodies chunk by chunk, as a
+socket would; httpx.MockTransport joins each body first), starting from an in-memory file like the
+one st.file_uploader returns. --fail-every makes the stub reject every Nth
+part, to show the upload resyncing and resuming instead of restarting.
+--from-disk uploads from a file on disk instead (e.g. a batch import),
+where the old path has to read() the whole file first. Python-side peaks
+come from tracemalloc and exclude the in-memory source itself.
+
+    python benchmarks/upload_memory.py --mb 40
+    python benchmarks/upload_memory.py --mb 40 --from-disk
+    python benchmarks/upload_memory.py --mb 40 --part-mb 6 --fail-every 3
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from utils import upload_utils  # noqa: E402
+
+
+def body_length(request: httpx.Request) -> int:
+    """Consumes the request body chunk by chunk, as a socket write would."""
+    return sum(len(chunk) for chunk in request.stream)
+
+
+class StubTusServer(httpx.BaseTransport):
+    """Counts what it receives like the TUS endpoint would, without keeping it."""
+
+    def __init__(self, fail_every: int = 0):
+        self.fail_every = fail_every
+        self.uploads    = {}
+        self.patches    = 0
+        self.received   = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and request.url.path.rstrip("/").endswith("/resumable"):
+            url = f"{str(request.url).rstrip('/')}/{len(self.uploads) + 1}"
+            self.uploads[url] = 0
+            return httpx.Response(201, headers={"Location": url})
+        if request.method == "POST":   # plain single-request upload
+            self.received += body_length(request)
+            return httpx.Response(200, json={"Key": request.url.path})
+        url = str(request.url)
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"Upload-Offset": str(self.uploads[url])})
+        self.patches += 1
+        length = body_length(request)
+        if self.fail_every and self.patches % self.fail_every == 0:
+            return httpx.Response(503)
+        if int(request.headers["upload-offset"]) != self.uploads[url]:
+            return httpx.Response(409)
+        self.uploads[url] += length
+        self.received     += length
+        return httpx.Response(204, headers={"Upload-Offset": str(self.uploads[url])})
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    start  = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"== {label}: {elapsed:.2f} s, Python peak {peak / 2**20:.1f} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=40, help="receipt size in MiB")
+    parser.add_argument("--part-mb", type=float, default=6, help="resumable part size in MiB")
+    parser.add_argument("--fail-every", type=int, default=0, help="stub rejects every Nth part (0 = never)")
+    parser.add_argument("--from-disk", action="store_true", help="upload from a file on disk, not memory")
+    args = parser.parse_args()
+
+    data     = os.urandom(int(args.mb * 2**20))   # kept alive, as UploadedFile's record keeps it
+    server   = StubTusServer(args.fail_every)
+    base_url = "http://stub.invalid"
+    if args.from_disk:
+        disk = tempfile.TemporaryFile()
+        disk.write(data)
+        disk.seek(0)
+        del data
+        receipt = lambda: (disk.seek(0), disk)[1]   # noqa: E731
+        whole   = lambda: disk.read()               # noqa: E731
+    else:
+        buffer  = io.BytesIO(data)
+        receipt = lambda: buffer                    # noqa: E731
+        whole   = lambda: buffer.getvalue()         # noqa: E731
+
+    with httpx.Client(transport=server) as http:
+        measure("single request (whole file, multipart as storage3 sends it)", lambda: http.post(
+            f"{base_url}/storage/v1/object/receipts/old.pdf",
+            files={"file": ("old.pdf", whole(), "application/pdf")}))
+
+    tus = upload_utils.TusClient(base_url, "key", transport=server)
+    settings = dict(upload_utils.DEFAULT_SETTINGS, part_size=int(args.part_mb * 2**20), backoff_base=0.0)
+    stats = measure(f"resumable, {args.part_mb:g} MiB parts", lambda: upload_utils.upload_file(
+        "receipts", "new.pdf", receipt(), "application/pdf", settings=settings, target=tus))
+    print(f"   {stats.parts} parts sent, {stats.retries} resynced after a failed part, "
+          f"largest copy {stats.peak_buffered / 2**20:.1f} MiB, "
+          f"server has {max(server.uploads.values()) / 2**20:.1f} of {stats.size / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
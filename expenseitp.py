@@ -1,54 +1,61 @@
-import streamlit as st
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-import re
-import pandas as pd
+# File: expenseitp.py
+#
+# Receipt OCR with local Tesseract and regex parsing (utils/tesseract_utils.py).
+#
+#   streamlit run expenseitp.py                 one receipt, interactively
+#   python expenseitp.py scans/ --out run1      a folder (or a .zip) in batch
+#   python expenseitp.py drop.zip --out run1 --drafts alice
+#
+# Batch mode OCRs receipts across a process pool and appends every result
+# to <out>/checkpoint.jsonl as it finishes. Files are keyed by the SHA-256
+# of their content: anything already in the checkpoint (or a duplicate
+# within the input) is skipped, so an interrupted run resumes where it
+# stopped when started again with the same --out. results.csv (one row per
+# parsed amount) and results.json are rewritten from the whole checkpoint
+# at the end. --drafts USERNAME also files the receipts not drafted before
+# as one "Draft" report for that user, one expense per receipt. A draft's
+# amount is the receipt's total line (parse_total), or 0 for the user to
+# fill in when there is none; the prototype's per-category amounts only go
+# into results.csv/json. A receipt whose upload fails is not filed, and is
+# tried again on the next run.
 
-CATEGORIES = ['food', 'travel', 'utilities', 'rent', 'entertainment', 'misc']
+import argparse
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
 
-st.title("📄 Expense Report App with OCR Fallback")
+import pandas as pd
+import streamlit as st
 
-uploaded_file = st.file_uploader("Upload a receipt (PDF or image)", type=["pdf", "png", "jpg", "jpeg"])
+from utils.tesseract_utils import (FILE_TYPES, extract_text, limit_ocr_threads, parse_expenses, parse_total,
+                                   process_receipt)
 
-if uploaded_file:
-    extracted_text = ""
+CHECKPOINT  = "checkpoint.jsonl"
+CSV_COLUMNS = ["file", "sha256", "status", "date", "receipt_total", "category", "amount", "error"]
 
-    if uploaded_file.type == "application/pdf":
-        doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-        for page in doc:
-            page_text = page.get_text()
-            extracted_text += page_text
 
-        # Fallback to OCR if no text found
-        if not extracted_text.strip():
-            for page in doc:
-                pix = page.get_pixmap()
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                extracted_text += pytesseract.image_to_string(img)
+def app():
+    """The original single-receipt page."""
+    st.title("📄 Expense Report App with OCR Fallback")
 
-    else:
-        image = Image.open(uploaded_file)
-        extracted_text = pytesseract.image_to_string(image)
+    uploaded_file = st.file_uploader("Upload a receipt (PDF or image)", type=["pdf", "png", "jpg", "jpeg"])
+    if not uploaded_file:
+        return
 
+    extracted_text, _ = extract_text(uploaded_file.read(), uploaded_file.type)
     st.subheader("📝 Extracted Text")
     st.text_area("OCR Output", extracted_text, height=200)
 
-    # Parse expenses
-    expenses = []
-    for line in extracted_text.splitlines():
-        line_lower = line.lower()
-        for cat in CATEGORIES:
-            if cat in line_lower:
-                amounts = re.findall(r'\$?\s*([0-9]+(?:\.[0-9]{2})?)', line)
-                if amounts:
-                    expenses.append({'Category': cat.capitalize(), 'Amount': float(amounts[0])})
-
-    if not expenses:
-        amounts = re.findall(r'\$?\s*([0-9]+(?:\.[0-9]{2})?)', extracted_text)
-        for amt in amounts:
-            expenses.append({'Category': 'Misc', 'Amount': float(amt)})
-
+    expenses = parse_expenses(extracted_text)
     if expenses:
         df = pd.DataFrame(expenses)
         st.subheader("📊 Expense Summary")
@@ -56,3 +63,222 @@ if uploaded_file:
         st.metric("Total Expenses", f"${df['Amount'].sum():.2f}")
     else:
         st.write("No expenses found in the extracted text.")
+
+
+def _mime_type(name: str):
+    return FILE_TYPES.get(os.path.splitext(name)[1].lower())
+
+
+def list_receipts(source: str) -> list:
+    """Receipt names under a folder (relative paths) or in a ZIP, sorted."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [i.filename for i in archive.infolist()
+                     if not i.is_dir() and not i.filename.startswith("__MACOSX/")]
+    else:
+        names = [os.path.relpath(os.path.join(folder, f), source)
+                 for folder, _, files in os.walk(source) for f in files]
+    return sorted(n for n in names if _mime_type(n))
+
+
+def read_receipt(source: str, name: str, archive: zipfile.ZipFile = None) -> bytes:
+    if archive is not None:
+        return archive.read(name)
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return archive.read(name)
+    with open(os.path.join(source, name), "rb") as f:
+        return f.read()
+
+
+def load_checkpoint(path: str) -> tuple:
+    """
+    ({sha256: result} for finished files, {sha256: report_id} for drafted
+    ones). Failed files are left out so they are tried again; a line torn
+    by an interrupted write is ignored.
+    """
+    results, drafted = {}, {}
+    if not os.path.exists(path):
+        return results, drafted
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "report_id" in record:
+                drafted[record["sha256"]] = record["report_id"]
+            elif record.get("status") == "done":
+                results[record["sha256"]] = record
+            else:
+                results.pop(record["sha256"], None)
+    return results, drafted
+
+
+def _append(checkpoint, record: dict):
+    checkpoint.write(json.dumps(record) + "\n")
+    checkpoint.flush()
+
+
+def run_batch(source: str, out_dir: str, workers: int = None, dpi: int = 200, log=sys.stderr) -> dict:
+    """
+    OCRs and parses every receipt in `source` not already in the
+    checkpoint, `workers` at a time, and returns throughput counters.
+    At most two files per worker are read ahead of the pool.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    done, _ = load_checkpoint(os.path.join(out_dir, CHECKPOINT))
+    names   = list_receipts(source)
+    seen    = set(done)
+    counts  = Counter(files=len(names))
+    start   = time.perf_counter()
+    archive = zipfile.ZipFile(source) if zipfile.is_zipfile(source) else None
+
+    def finish(future, name, digest, size):
+        try:
+            record = {"file": name, "sha256": digest, "status": "done", **future.result()}
+            counts["pages"] += record["pages"]
+            counts["ocr_seconds"] += record["seconds"]
+        except Exception as e:
+            record = {"file": name, "sha256": digest, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+        counts[record["status"]] += 1
+        counts["bytes"] += size
+        _append(checkpoint, record)
+        n = counts["done"] + counts["failed"]
+        print(f"[{n + counts['skipped']}/{len(names)}] {record['status']:<6} {name}"
+              + (f"  ({record['error']})" if "error" in record else f"  total {record['receipt_total']}"), file=log)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=limit_ocr_threads,
+                               mp_context=multiprocessing.get_context("spawn"))
+    try:
+        with pool, open(os.path.join(out_dir, CHECKPOINT), "a", encoding="utf-8") as checkpoint:
+            pending = {}
+            for name in names:
+                data   = read_receipt(source, name, archive)
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in seen:
+                    counts["skipped"] += 1
+                    continue
+                seen.add(digest)
+                pending[pool.submit(process_receipt, data, _mime_type(name), dpi)] = (name, digest, len(data))
+                del data
+                while len(pending) >= 2 * workers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future, *pending.pop(future))
+            for future in list(pending):
+                finish(future, *pending.pop(future))
+    finally:
+        if archive is not None:
+            archive.close()
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def write_outputs(out_dir: str) -> list:
+    """Rewrites results.csv and results.json from the checkpoint; returns the finished results."""
+    latest = {}
+    with open(os.path.join(out_dir, CHECKPOINT), encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "report_id" not in record:
+                latest[record["sha256"]] = record
+        results = sorted(latest.values(), key=lambda r: r["file"])
+
+    with open(os.path.join(out_dir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    with open(os.path.join(out_dir, "results.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for r in results:
+            row = {"file": r["file"], "sha256": r["sha256"], "status": r["status"], "date": r.get("date") or "",
+                   "receipt_total": r.get("receipt_total", ""), "error": r.get("error", "")}
+            for expense in r.get("expenses") or [{}]:
+                writer.writerow({**row, "category": expense.get("Category", ""), "amount": expense.get("Amount", "")})
+    return [r for r in results if r["status"] == "done"]
+
+
+def create_drafts(source: str, out_dir: str, results: list, username: str, log=sys.stderr):
+    """
+    Files every finished receipt that has no draft yet as one Draft report
+    for `username`, uploading the receipt with each expense. A receipt that
+    fails to upload is skipped and left undrafted for the next run. The
+    report total is the sum of the expenses actually inserted. Returns the
+    report id, or None when there was nothing to file.
+    """
+    from utils import supabase_utils as su
+
+    path       = os.path.join(out_dir, CHECKPOINT)
+    _, drafted = load_checkpoint(path)
+    todo       = [r for r in results if r["sha256"] not in drafted]
+    if not todo:
+        return None
+    user_id = su.get_user_id(username)
+    if user_id is None:
+        raise SystemExit(f"No user named {username!r}")
+
+    name      = f"Batch import {os.path.basename(os.path.normpath(source))} {date.today()}"
+    report_id = su.add_report(user_id, name, 0, status="Draft")
+    if report_id is None:
+        raise SystemExit("Could not create the draft report")
+    filed = 0.0
+    with open(path, "a", encoding="utf-8") as checkpoint:
+        for r in todo:
+            try:
+                upload = io.BytesIO(read_receipt(source, r["file"]))
+                upload.name, upload.type = os.path.basename(r["file"]), _mime_type(r["file"])
+                upload.file_id = r["sha256"]   # resumes a half-finished upload on the next run
+                receipt_path = su.upload_receipt(upload, username)   # None when the upload failed
+            except OSError as e:
+                print(f"{r['file']}: {e}", file=log)
+                receipt_path = None
+            if not receipt_path:
+                print(f"not drafted, receipt upload failed (retried on the next run): {r['file']}", file=log)
+                continue
+            # Recomputed from the text, so checkpoints from older runs are filed the same way
+            total  = parse_total(r["text"])
+            vendor = next((line.strip() for line in r["text"].splitlines()
+                           if sum(c.isalpha() for c in line) >= 3), "")[:100]
+            description = "Batch import" if total is not None else "Batch import: no total found, check the receipt"
+            if su.add_expense_item(report_id, r["date"] or date.today(), vendor, description, total or 0.0,
+                                   receipt_path=receipt_path, ocr_text=r["text"]):
+                filed += total or 0.0
+                _append(checkpoint, {"sha256": r["sha256"], "report_id": report_id})
+    su.update_report_total(report_id, round(filed, 2))
+    return report_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR a folder or ZIP of receipts with Tesseract.")
+    parser.add_argument("source", help="folder (searched recursively) or .zip of PDFs and images")
+    parser.add_argument("--out", required=True, help="output folder; rerun with the same one to resume")
+    parser.add_argument("--workers", type=int, default=None, help="OCR processes (default: one per CPU)")
+    parser.add_argument("--dpi", type=int, default=200, help="render resolution for scanned PDFs")
+    parser.add_argument("--drafts", metavar="USERNAME", help="file new receipts as a Draft report for this user")
+    args = parser.parse_args(argv)
+
+    counts  = run_batch(args.source, args.out, args.workers, args.dpi)
+    results = write_outputs(args.out)
+    seconds = max(counts["seconds"], 1e-9)
+    ran     = counts["done"] + counts["failed"]
+    print(f"{counts['files']} files: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['skipped']} skipped (already processed)", file=sys.stderr)
+    print(f"{seconds:.1f} s, {ran / seconds:.2f} files/s, {counts['pages'] / seconds:.2f} pages/s, "
+          f"{counts['bytes'] / seconds / 2**20:.2f} MiB/s"
+          + (f", {counts['ocr_seconds'] / counts['done']:.2f} s OCR per file" if counts["done"] else ""),
+          file=sys.stderr)
+    if args.drafts:
+        report_id = create_drafts(args.source, args.out, results, args.drafts)
+        print(f"draft report {report_id}" if report_id else "no new receipts to draft", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    if st.runtime.exists():
+        app()
+    else:
+        sys.exit(main())
@@ -0,0 +1,53 @@
+# File: pages/11_Spend_Analytics.py
+
+import time
+import streamlit as st
+from utils.analytics_utils import DIMENSIONS, get_spend_cube
+from utils.page_utils import bootstrap_page, finish_page
+
+# Page config, nav, cached user context and auth guard
+bootstrap_page("Spend Analytics", roles=("admin",))
+
+st.title("Spend Analytics")
+
+# Every view below reads the pre-aggregated cube, never raw expense rows
+cube  = get_spend_cube()
+frame = cube.frame()
+if frame.empty:
+    st.info("No expenses to analyse yet.")
+    st.stop()
+
+# --- Filters ---
+with st.expander("Filters", expanded=False):
+    filters = {
+        column: st.multiselect(label, sorted(frame[column].astype(str).unique()), key=f"filter_{column}")
+        for label, column in DIMENSIONS.items()
+    }
+
+# --- Pivot ---
+col_rows, col_cols = st.columns(2)
+row_label = col_rows.selectbox("Rows", list(DIMENSIONS), index=1)
+col_label = col_cols.selectbox("Columns", ["(none)"] + [d for d in DIMENSIONS if d != row_label])
+rows      = DIMENSIONS[row_label]
+columns   = DIMENSIONS.get(col_label)
+
+pivot = cube.pivot(rows, columns, filters)
+st.subheader(f"Spend by {row_label}" + (f" and {col_label}" if columns else "") + f" ({cube.reporting})")
+st.bar_chart(pivot)
+st.dataframe(pivot.style.format("{:,.2f}"))
+
+# --- Drill-down ---
+st.subheader("Drill down")
+col_value, col_next = st.columns(2)
+value      = col_value.selectbox(f"{row_label}", list(pivot.index))
+next_label = col_next.selectbox("Break down by", [d for d in DIMENSIONS if d != row_label])
+detail     = cube.pivot(DIMENSIONS[next_label], filters={**filters, rows: [value]})
+st.dataframe(detail.style.format("{:,.2f}"))
+
+st.caption(
+    f"{int(frame['expenses'].sum()):,} expenses in {len(frame):,} cube cells; "
+    f"{int(frame['unconverted'].sum()):,} without a {cube.reporting} exchange rate are excluded from amounts; "
+    f"refreshed {int(time.time() - cube.refreshed_at)} s ago."
+)
+
+finish_page()
@@ -0,0 +1,32 @@
+# File: pages/12_Audit_Log.py
+
+import streamlit as st
+from utils.audit_utils import get_audit_events, get_audit_writer
+from utils.page_utils import bootstrap_page, finish_page
+
+# Page config, nav, cached user context and auth guard
+bootstrap_page("Audit Log", roles=("admin",))
+
+st.title("Audit Log")
+
+# Each filter maps onto one of the audit_log indexes (entity or actor)
+col_entity, col_id, col_actor = st.columns(3)
+entity    = col_entity.selectbox("Entity", ["(any)", "report", "expense", "user", "category", "department"])
+entity_id = col_id.text_input("Entity id")
+actor_id  = col_actor.text_input("Actor (user id)")
+limit     = st.slider("Show latest", 50, 1000, 200, step=50)
+
+events = get_audit_events(
+    entity=None if entity == "(any)" else entity,
+    entity_id=entity_id or None,
+    actor_id=actor_id or None,
+    limit=limit,
+)
+if events.empty:
+    st.info("No matching audit events.")
+else:
+    st.dataframe(events[["created_at", "actor_id", "action", "entity", "entity_id", "changes"]], hide_index=True)
+
+st.caption("Writer: {queued} queued, {written} written, {dropped} dropped since start.".format(**get_audit_writer().stats()))
+
+finish_page()
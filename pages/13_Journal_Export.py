@@ -0,0 +1,48 @@
+# File: pages/13_Journal_Export.py
+
+import tempfile
+from datetime import date
+
+import streamlit as st
+from utils.journal_utils import export_journal
+from utils.page_utils import bootstrap_page, finish_page
+
+# Page config, nav, cached user context and auth guard
+bootstrap_page("GL Journal Export", roles=("admin",))
+
+st.title("GL Journal Export")
+st.caption(
+    "One journal entry per approved report submitted in the period: line items and taxes "
+    "debited to their GL accounts, the total credited to employee payables."
+)
+
+today       = date.today()
+first_of_mo = today.replace(day=1)
+col_start, col_end, col_fmt = st.columns(3)
+start = col_start.date_input("From (inclusive)", value=first_of_mo)
+end   = col_end.date_input("To (exclusive)", value=today)
+fmt   = col_fmt.selectbox("Format", ["csv", "xml"], format_func=str.upper)
+
+if st.button("Build journal", type="primary", disabled=end <= start):
+    # Written entry by entry into a spooled file: kept in memory while small,
+    # moved to disk once it passes 8 MB
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as out:
+        try:
+            with st.spinner("Paging through approved reports…"):
+                entries = export_journal(out, start.isoformat(), end.isoformat(), fmt)
+        except Exception as e:
+            st.error(f"Journal export failed: {e}")
+        else:
+            out.seek(0)
+            st.success(f"{entries:,} journal entries for {start} to {end}.")
+            st.download_button(
+                f"Download journal (.{fmt})",
+                data=out.read(),
+                file_name=f"journal_{start}_{end}.{fmt}",
+                mime="text/csv" if fmt == "csv" else "application/xml",
+            )
+
+st.caption("For very large periods run `python -m utils.journal_utils START END --format xml --out FILE`, "
+           "which writes straight to disk.")
+
+finish_page()
@@ -1,33 +1,16 @@
 # File: pages/1_Login.py
 
 import streamlit as st
-from utils import supabase_utils as su
-from streamlit_authenticator import Authenticate
-from utils.ui_utils import hide_streamlit_pages_nav
+from utils.page_utils import bootstrap_page, get_authenticator, get_user_context
 
-# Hide Streamlit’s built-in pages nav immediately
-hide_streamlit_pages_nav()
-
-# Page configuration
-st.set_page_config(page_title="Login", layout="wide")
+# Page config, hidden built-in nav and sidebar nav
+bootstrap_page("Login", require_auth=False)
 
 st.title("Employee Expense Reporting")
 st.write("Please log in to access your dashboard.")
 
-# --- AUTH SETUP ---
-if "authenticator" not in st.session_state:
-    creds = su.fetch_all_users_for_auth()
-    cfg   = st.secrets.get("cookie", {})
-    auth  = Authenticate(
-        creds,
-        cfg.get("name",        "cookie_name"),
-        cfg.get("key",         "random_key"),
-        cfg.get("expiry_days", 30),
-    )
-    st.session_state["authenticator"]    = auth
-    st.session_state["user_credentials"] = creds
-
-authenticator = st.session_state["authenticator"]
+# --- AUTH SETUP (shared with app.py) ---
+authenticator = get_authenticator()
 
 # Render the login form in the main area
 authenticator.login(location="main")
@@ -38,14 +21,10 @@ name        = st.session_state.get("name")
 username    = st.session_state.get("username")
 
 if auth_status:
-    creds_map = st.session_state["user_credentials"]["usernames"]
-    user_entry = creds_map.get(username, {})
-
     st.session_state["name"]                  = name
     st.session_state["username"]              = username
     st.session_state["authentication_status"] = True
-    st.session_state["role"]                  = user_entry.get("role")
-    st.session_state["user_id"]               = user_entry.get("id")
+    get_user_context()
 
     st.success(f"Welcome, {name}! Redirecting…")
     st.switch_page("pages/2_Dashboard.py")
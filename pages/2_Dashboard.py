@@ -1,36 +1,15 @@
 # File: pages/2_Dashboard.py
 
+import os
 import streamlit as st
 from utils import supabase_utils as su
-from utils.ui_utils import hide_streamlit_pages_nav
-from utils.nav_utils import PAGES_FOR_ROLES
-
-# Page configuration
-st.set_page_config(page_title="Dashboard", layout="wide")
-
-# Hide Streamlit’s built-in multipage nav & apply global CSS
-hide_streamlit_pages_nav()
-
-# --- Sidebar Navigation (role‐based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if fname.startswith("_"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
-
-# --- Authentication Guard ---
-if not st.session_state.get("authentication_status"):
-    st.warning("Please log in to access the dashboard.")
-    st.stop()
+from utils.fx_utils import convert_amounts, fx_settings
+from utils.page_utils import bootstrap_page, finish_page
 
-user_id = st.session_state.get("user_id")
-if not user_id:
-    st.error("User profile not found in session.")
-    st.stop()
+# Page config, nav, cached user context and auth guard
+ctx     = bootstrap_page("Dashboard")
+role    = ctx["role"]
+user_id = ctx["id"]
 
 # --- Dashboard Metrics ---
 metrics = []
@@ -51,12 +30,29 @@ except Exception as e:
     st.stop()
 
 total_reports = len(user_reports_df)
-total_amount  = user_reports_df["total_amount"].sum() if not user_reports_df.empty else 0.0
+
+# Expenses can be in CAD or USD; total them in the reporting currency
+reporting   = fx_settings()["reporting"]
+expenses_df = su.get_expense_amounts_for_user(user_id)
+unconverted = 0
+if not expenses_df.empty:
+    converted    = convert_amounts(expenses_df, reporting)
+    unconverted  = int(converted.isna().sum())
+    total_amount = converted.sum()
+else:
+    total_amount = user_reports_df["total_amount"].sum() if not user_reports_df.empty else 0.0
 
 metrics.append(("Total Reports Submitted", total_reports))
-metrics.append(("Total Expenses Claimed", f"${total_amount:,.2f}"))
+metrics.append((f"Total Expenses Claimed ({reporting})", f"${total_amount:,.2f}"))
 
 # Render metrics in equally spaced columns
 cols = st.columns(len(metrics))
 for col, (label, value) in zip(cols, metrics):
     col.metric(label, value)
+
+if unconverted:
+    st.caption(f"{unconverted} expense(s) have no {reporting} exchange rate for their date and are not included in the total.")
+    if not os.path.exists(fx_settings()["path"]):
+        st.caption(f"No FX rate file at {fx_settings()['path']} (format: data/fx_rates.example.csv).")
+
+finish_page()
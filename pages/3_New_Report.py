@@ -1,115 +1,194 @@
 # File: pages/3_New_Report.py
 
 import streamlit as st
-from utils import ocr_utils, supabase_utils as su
-from utils.nav_utils import PAGES_FOR_ROLES
-from utils.ui_utils import hide_streamlit_pages_nav
-
-# Page config
-st.set_page_config(page_title="Create New Expense Report", layout="wide")
-
-# Hide Streamlit’s built-in multipage nav
-hide_streamlit_pages_nav()
-
-# --- Sidebar Navigation (role-based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):  # :contentReference[oaicite:4]{index=4}
-    # Never show Add/Edit User in the sidebar
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
-
-# --- Authentication Guard ---
-if not st.session_state.get("authentication_status"):
-    st.warning("Please log in to access this page.")
-    st.stop()
-
-username = st.session_state["username"]
-user_id  = st.session_state["user_id"]
-
-if not user_id:
-    st.error("User profile not found in session.")
-    st.stop()
+import pandas as pd
+from utils import supabase_utils as su
+from utils.classifier_utils import get_vendor_classifier
+from utils.job_utils import content_hash, get_ocr_job_queue
+from utils.page_utils import bootstrap_page, finish_page
+from utils.policy_utils import check_expenses, render_violations
+from utils.perf_utils import timed
+
+# Page config, nav, cached user context and auth guard
+ctx      = bootstrap_page("Create New Expense Report")
+username = ctx["username"]
+user_id  = ctx["id"]
 
 # --- Main New-Report Form ---
+# The page is split into fragments (receipt upload/processing, line-item
+# editor, verification form). Interacting with one only reruns that
+# fragment; full reruns happen when a new receipt is queued or its OCR
+# result arrives, since both change what the other fragments display.
 if 'current_report_items' not in st.session_state:
     st.session_state.current_report_items = []
 
-# Load categories
-try:
-    cats      = su.get_all_categories()
-    cat_names = [""] + [c["name"] for c in cats]
-    cat_map   = {c["name"]: c["id"] for c in cats}
-except Exception as e:
-    st.error(f"Could not load categories: {e}")
-    cats, cat_names, cat_map = [], [""], {}
+EMPTY_PARSED = {"date": None, "vendor": "", "total_amount": 0.0,
+                "gst_amount": 0.0, "pst_amount": 0.0, "hst_amount": 0.0,
+                "line_items": []}
+
+# Categories are loaded once per session; fragment reruns reuse them
+if "new_report_categories" not in st.session_state:
+    try:
+        st.session_state.new_report_categories = su.get_all_categories()
+    except Exception as e:
+        st.error(f"Could not load categories: {e}")
+        st.session_state.new_report_categories = []
+cats      = st.session_state.new_report_categories
+cat_names = [""] + [c["name"] for c in cats]
+cat_map   = {c["name"]: c["id"] for c in cats}
+
+ocr_queue = get_ocr_job_queue()
+
+def suggest_categories(parsed):
+    """Prefills overall and line-item categories from past expenses (no LLM call)."""
+    if parsed.get("error"):
+        return parsed
+    model   = get_vendor_classifier()
+    names   = {c["id"]: c["name"] for c in cats}
+    overall = model.predict(parsed.get("vendor"))[0]
+    parsed["suggested_category_id"] = overall
+    for item in parsed.get("line_items") or []:
+        if not item.get("category"):
+            item_cat, _ = model.predict_item(item.get("description"))
+            item["category"] = names.get(item_cat or overall, "")
+    return parsed
+
+def current_ocr_result():
+    """Returns (raw_text, parsed) for the current receipt, or empty values."""
+    raw_text, parsed = st.session_state.get("ocr_result") or ("", EMPTY_PARSED)
+    if parsed.get("error"):
+        return raw_text, EMPTY_PARSED
+    return raw_text, parsed
+
+@st.fragment
+def receipt_fragment():
+    """Receipt upload; OCR runs on the process-wide job queue."""
+    with timed("fragment: receipt"):
+        uploaded = st.file_uploader("Upload Receipt (Image or PDF)", type=["png","jpg","jpeg","pdf"])
+        if uploaded:
+            file_bytes = uploaded.getvalue()
+            if st.session_state.get("ocr_job_id") != content_hash(file_bytes):
+                st.session_state.ocr_job_id   = ocr_queue.submit(file_bytes, uploaded.type)
+                st.session_state.ocr_result   = None
+                st.session_state.receipt_path = su.upload_receipt(uploaded, username)
+                st.rerun()
+        elif st.session_state.get("ocr_job_id"):
+            for key in ("ocr_job_id", "ocr_result", "receipt_path", "edited_line_items"):
+                st.session_state.pop(key, None)
+            st.rerun()
+
+        if st.session_state.get("ocr_job_id"):
+            if st.session_state.get("receipt_path"):
+                st.success("Receipt uploaded successfully!")
+            else:
+                st.error("Failed to upload receipt.")
+                # Resumes the interrupted upload from the last part the server has
+                if uploaded and st.button("Retry upload"):
+                    st.session_state.receipt_path = su.upload_receipt(uploaded, username)
+                    st.rerun(scope="fragment")
+
+        result = st.session_state.get("ocr_result")
+        if result and result[1].get("error"):
+            st.error(result[1]["error"])
+
+        # Show raw OCR
+        with st.expander("View Raw Extracted Text"):
+            st.text_area("OCR Output", current_ocr_result()[0], height=200)
+
+@st.fragment(run_every=1)
+def poll_ocr_job():
+    """Polls the OCR job and triggers a full rerun to fill in the form once it is done."""
+    status, result = ocr_queue.poll(st.session_state.get("ocr_job_id"))
+    if result is not None:
+        raw_text, parsed = result
+        st.session_state.ocr_result = (raw_text, suggest_categories(dict(parsed)))
+        st.rerun()
+    if status is None:
+        st.session_state.ocr_result = ("", {"error": "The OCR job was lost; please re-upload the receipt."})
+        st.rerun()
+    st.info(f"Processing receipt in the background ({status})… you can keep filling in the report.")
+
+@st.fragment
+def line_items_fragment(cat_names):
+    """Line-item grid; cell edits rerun only this fragment and touch no backend."""
+    with timed("fragment: line items"):
+        line_items = current_ocr_result()[1].get("line_items", [])
+        if not line_items:
+            return
+        df = st.data_editor(
+            pd.DataFrame(line_items),
+            column_config={
+                "category": st.column_config.SelectboxColumn("Category", options=cat_names),
+                "price":    st.column_config.NumberColumn("Price", format="$%.2f")
+            },
+            hide_index=True,
+            key=f"line_item_editor_{st.session_state.get('ocr_job_id')}"
+        )
+        st.session_state.edited_line_items = df.to_dict("records")
+
+@st.fragment
+def expense_form_fragment(cat_names, cat_map):
+    """Verification form; only the submit button triggers a (fragment) rerun."""
+    with timed("fragment: verification form"):
+        raw_text, parsed = current_ocr_result()
+        parsed_date = pd.to_datetime(parsed.get("date"), errors="coerce") if parsed.get("date") else None
+        with st.form("expense_item_form"):
+            st.subheader("Verify Extracted Data")
+            suggested   = parsed.get("suggested_category_id") or ctx["default_category_id"]
+            default_cat = next((c["name"] for c in cats if c["id"] == suggested), "")
+            overall_cat = st.selectbox("Overall Expense Category*", options=cat_names, index=cat_names.index(default_cat))
+            currency    = st.radio("Currency*", ["CAD","USD"], horizontal=True)
+            expense_date = st.date_input("Expense Date", value=(parsed_date.date() if not pd.isna(parsed_date) else "today"))
+            vendor       = st.text_input("Vendor Name", value=parsed.get("vendor",""))
+            description  = st.text_area("Description", value=parsed.get("description",""))
+            amount       = st.number_input("Amount", value=float(parsed.get("total_amount",0.0)), format="%.2f")
+            save_anyway  = st.checkbox("Save even if policy checks report errors")
+            submitted    = st.form_submit_button("Add Expense to Report")
+
+            if submitted:
+                # Checked before saving: a saved expense cannot be edited from this page
+                violations = check_expenses(pd.DataFrame([{
+                    "expense_date": str(expense_date), "amount": amount, "currency": currency,
+                    "category_id": cat_map.get(overall_cat), "gst_amount": parsed.get("gst_amount"),
+                    "pst_amount": parsed.get("pst_amount"), "hst_amount": parsed.get("hst_amount"),
+                }]), cats)
+                if not violations.empty:
+                    render_violations(violations)
+                if (violations["severity"] == "error").any() and not save_anyway:
+                    st.error("Not saved: correct the fields above, or tick the box to save it anyway.")
+                    return
+                line_items = [
+                    {**item, "category_id": cat_map.get(item.get("category"))}
+                    for item in st.session_state.get("edited_line_items", [])
+                ]
+                item_ok = su.add_expense_item(
+                    report_id=None,
+                    expense_date=expense_date,
+                    vendor=vendor,
+                    description=description,
+                    amount=amount,
+                    currency=currency,
+                    category_id=cat_map.get(overall_cat),
+                    receipt_path=st.session_state.get("receipt_path"),
+                    ocr_text=raw_text,
+                    gst_amount=parsed.get("gst_amount"),
+                    pst_amount=parsed.get("pst_amount"),
+                    hst_amount=parsed.get("hst_amount"),
+                    line_items=line_items
+                )
+                if item_ok:
+                    st.success("Expense added to your session report buffer.")
+                else:
+                    st.error("Failed to save expense item.")
 
 st.header("Create New Expense Report")
 report_name = st.text_input("Report Name/Purpose*", placeholder="e.g., Office Supplies – June")
-uploaded    = st.file_uploader("Upload Receipt (Image or PDF)", type=["png","jpg","jpeg","pdf"])
-
-parsed, raw_text, path_db = {}, "", None
-if uploaded:
-    with st.spinner("Processing OCR and uploading receipt..."):
-        raw_text, parsed = ocr_utils.extract_and_parse_file(uploaded)
-        path_db = su.upload_receipt(uploaded, username)
-        if path_db:
-            st.success("Receipt uploaded successfully!")
-        else:
-            st.error("Failed to upload receipt.")
-else:
-    parsed = {"date": None, "vendor": "", "total_amount": 0.0,
-              "gst_amount": 0.0, "pst_amount": 0.0, "hst_amount": 0.0,
-              "line_items": []}
-
-# Show raw OCR
-with st.expander("View Raw Extracted Text"):
-    st.text_area("OCR Output", raw_text, height=200)
-
-# Edit line items if any
-line_items = parsed.get("line_items", [])
-if line_items:
-    df = st.data_editor(
-        pd.DataFrame(line_items),
-        column_config={
-            "category": st.column_config.SelectboxColumn("Category", options=cat_names),
-            "price":    st.column_config.NumberColumn("Price", format="$%.2f")
-        },
-        hide_index=True,
-        key="line_item_editor"
-    )
-    st.session_state.edited_line_items = df.to_dict("records")
-
-with st.form("expense_item_form"):
-    st.subheader("Verify Extracted Data")
-    overall_cat = st.selectbox("Overall Expense Category*", options=cat_names)
-    currency    = st.radio("Currency*", ["CAD","USD"], horizontal=True)
-    expense_date = st.date_input("Expense Date", value=(pd.to_datetime(parsed.get("date"), errors="coerce").date() 
-                                                        if parsed.get("date") else st.session_state.get("expense_date", st.session_state.current_report_items)))
-    vendor       = st.text_input("Vendor Name", value=parsed.get("vendor",""))
-    description  = st.text_area("Description", value=parsed.get("description",""))
-    amount       = st.number_input("Amount", value=float(parsed.get("total_amount",0.0)), format="%.2f")
-    submitted    = st.form_submit_button("Add Expense to Report")
-
-    if submitted:
-        item_ok = su.add_expense_item(
-            report_id=None,
-            expense_date=expense_date,
-            vendor=vendor,
-            description=description,
-            amount=amount,
-            currency=currency,
-            category_id=cat_map.get(overall_cat),
-            receipt_path=path_db,
-            ocr_text=raw_text,
-            gst_amount=parsed.get("gst_amount"),
-            pst_amount=parsed.get("pst_amount"),
-            hst_amount=parsed.get("hst_amount"),
-            line_items=st.session_state.get("edited_line_items", [])
-        )
-        if item_ok:
-            st.success("Expense added to your session report buffer.")
-        else:
-            st.error("Failed to save expense item.")
+
+receipt_fragment()
+if st.session_state.get("ocr_job_id") and st.session_state.get("ocr_result") is None:
+    poll_ocr_job()
+line_items_fragment(cat_names)
+expense_form_fragment(cat_names, cat_map)
+
+# Records the full rerun next to the fragment-local reruns (shown to admins)
+finish_page()
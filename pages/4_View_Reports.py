@@ -8,28 +8,12 @@ import os
 import json
 
 from utils import supabase_utils as su
-from utils.nav_utils import PAGES_FOR_ROLES
-from utils.ui_utils import hide_streamlit_pages_nav
-
-# Page configuration
-st.set_page_config(page_title="View Reports", layout="wide")
-
-# Hide built-in nav & apply global CSS
-hide_streamlit_pages_nav()
-
-# --- Sidebar Navigation (role-based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
-
-# --- Authentication Guard ---
-if not st.session_state.get("authentication_status"):
-    st.warning("Please log in to access this page.")
-    st.stop()
+from utils.policy_utils import check_expenses, flag_counts, render_violations
+from utils.report_pdf_utils import get_report_pdf, report_version
+from utils.page_utils import bootstrap_page, finish_page
+
+# Page config, nav, cached user context and auth guard
+ctx = bootstrap_page("View Reports")
 
 # Load all reports
 try:
@@ -42,6 +26,62 @@ if all_reports.empty:
     st.info("No reports found.")
     st.stop()
 
+# --- Bulk approval (approvers see their team's queue, admins see everything) ---
+if ctx["role"] in ("approver", "admin"):
+    queue = su.get_reports_for_approver(ctx["id"]) if ctx["role"] == "approver" else all_reports
+    if not queue.empty:
+        queue = queue[queue["status"] == "Submitted"]
+    with st.expander(f"Awaiting approval ({len(queue)})", expanded=not queue.empty):
+        if queue.empty:
+            st.write("Nothing awaiting approval.")
+        else:
+            # Policy/tax issues for the whole queue: one query, one vectorised pass
+            try:
+                queue_expenses = pd.DataFrame(su.get_expenses_for_reports(queue["id"].tolist(), line_items=False))
+            except Exception as e:
+                st.warning(f"Could not check the queue for policy issues, so Flags shows 0: {e}")
+                queue_expenses = pd.DataFrame()
+            flags = flag_counts(queue_expenses, "report_id")
+            # One form: ticking boxes does not rerun the page, submitting sends one update
+            with st.form("bulk_approval"):
+                picked = st.data_editor(
+                    pd.DataFrame({
+                        "Select":    False,
+                        "Report":    queue["report_name"],
+                        "Submitter": queue["user"].map(lambda u: u.get("name", "Unknown") if isinstance(u, dict) else "Unknown"),
+                        "Submitted": queue["submission_date"],
+                        "Total":     queue["total_amount"],
+                        "Flags":     queue["id"].map(flags).fillna(0).astype(int),
+                        "id":        queue["id"],
+                    }).reset_index(drop=True),
+                    column_config={"id": None,
+                                   "Flags": st.column_config.NumberColumn("Flags", help="Policy and tax issues")},
+                    disabled=["Report", "Submitter", "Submitted", "Total", "Flags"],
+                    hide_index=True,
+                    key="bulk_approval_grid",
+                )
+                comment = st.text_input("Comment (applied to every selected report)")
+                col_approve, col_reject = st.columns(2)
+                approve = col_approve.form_submit_button("Approve selected", type="primary")
+                reject  = col_reject.form_submit_button("Reject selected")
+
+            if approve or reject:
+                selected = picked.loc[picked["Select"], "id"].tolist()
+                if not selected:
+                    st.warning("Select at least one report.")
+                else:
+                    results = su.bulk_update_report_status(selected, "Approved" if approve else "Rejected", comment)
+                    outcome = pd.Series(results).value_counts()
+                    st.session_state["bulk_approval_result"] = (
+                        f"{outcome.get('updated', 0)} report(s) {'approved' if approve else 'rejected'}; "
+                        f"{outcome.get('skipped', 0)} skipped (already actioned by someone else); "
+                        f"{outcome.get('error', 0)} failed."
+                    )
+                    st.rerun()
+
+    if "bulk_approval_result" in st.session_state:
+        st.success(st.session_state.pop("bulk_approval_result"))
+
 # Select a report
 records = all_reports.to_dict("records")
 report_choices = [
@@ -76,13 +116,24 @@ if not df.empty:
 else:
     st.write("No expense items for this report.")
 
-# Line-items breakdown
+# Policy and tax checks for the whole report
+if not df.empty:
+    st.subheader("Policy Checks")
+    render_violations(check_expenses(df), df)
+
+# Line-items breakdown; each expander loads its expense's line items and OCR text when opened
 st.subheader("Line Items Breakdown")
 for _, row in df.iterrows():
     date = row["expense_date"]
     vendor = row["vendor"]
-    with st.expander(f"{date} – {vendor}"):
-        raw_li = row.get("line_items")
+    expander = st.expander(f"{date} – {vendor}", key=f"line_items_{row['id']}", on_change="rerun")
+    with expander:
+        if not expander.open:
+            continue
+        details = su.get_expense_details([row["id"]]).get(row["id"], {})
+        if details.get("ocr_text"):
+            st.text_area("Receipt text", details["ocr_text"], height=120, disabled=True, key=f"ocr_text_{row['id']}")
+        raw_li = details.get("line_items")
         if not raw_li:
             st.write("No line items")
             continue
@@ -108,17 +159,18 @@ for _, row in df.iterrows():
         )
 
 # --- Export Options ---
-col_download_excel, col_download_zip = st.columns(2)
+col_download_excel, col_download_zip, col_download_pdf = st.columns(3)
 
 # Excel export
 with col_download_excel:
     if st.button("Download as Excel"):
+        full_df = su.with_expense_details(df)
         to_excel = io.BytesIO()
         with pd.ExcelWriter(to_excel, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Expenses")
+            full_df.to_excel(writer, index=False, sheet_name="Expenses")
             # Flatten all line items into one sheet
             all_li = []
-            for _, row in df.iterrows():
+            for _, row in full_df.iterrows():
                 li = row.get("line_items")
                 if isinstance(li, str):
                     try:
@@ -163,3 +215,25 @@ with col_download_zip:
             file_name=f"{report['report_name'].replace(' ', '_')}_receipts.zip",
             mime="application/zip"
         )
+
+# Consolidated PDF (summary, line items and every receipt), cached until the report changes
+with col_download_pdf:
+    if st.button("Download as PDF"):
+        with st.spinner("Building PDF..."):
+            try:
+                full_df = su.with_expense_details(df)
+                pdf_bytes, skipped = get_report_pdf(report["id"], report_version(report, full_df), report, full_df)
+            except Exception as ex:
+                st.error(f"Could not build the PDF: {ex}")
+                pdf_bytes, skipped = None, []
+        for path in skipped:
+            st.warning(f"Could not include '{path}'")
+        if pdf_bytes:
+            st.download_button(
+                label="Download .pdf",
+                data=pdf_bytes,
+                file_name=f"{report['report_name'].replace(' ', '_')}.pdf",
+                mime="application/pdf"
+            )
+
+finish_page()
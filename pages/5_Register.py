@@ -2,12 +2,10 @@
 
 import streamlit as st
 from utils import supabase_utils as su
-from utils.ui_utils import hide_streamlit_pages_nav
+from utils.page_utils import bootstrap_page
 
-# *First thing* on the page:
-hide_streamlit_pages_nav()
-
-st.set_page_config(page_title="Register", layout="wide")
+# Page config, hidden built-in nav and sidebar nav (public page)
+bootstrap_page("Register", require_auth=False)
 
 import re
 import bcrypt
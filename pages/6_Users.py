@@ -1,33 +1,11 @@
 # File: pages/6_Users.py
 
 import streamlit as st
-from utils.supabase_utils import get_all_users
-from utils.ui_utils import hide_streamlit_pages_nav
-from utils.nav_utils import PAGES_FOR_ROLES  # role-based pages mapping :contentReference[oaicite:2]{index=2}
+from utils.directory_utils import user_directory_page, user_label
+from utils.page_utils import bootstrap_page, finish_page
 
-# Page configuration
-st.set_page_config(page_title="User Management", layout="wide")
-
-# Hide default multipage nav and apply global CSS
-hide_streamlit_pages_nav()
-
-# --- Sidebar Navigation (role‐based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    # Exclude the Add User and Edit User pages from the sidebar
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    # Exclude any hidden pages (prefixed with underscore)
-    if fname.startswith("_"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
-
-# --- Authentication Guard ---
-if not st.session_state.get("authentication_status"):
-    st.warning("Please log in to access this page.")
-    st.stop()
+# Page config, nav, cached user context and auth guard
+bootstrap_page("User Management", roles=("admin",))
 
 # --- Main User Management Content ---
 st.title("User Management")
@@ -36,16 +14,17 @@ st.title("User Management")
 if st.button("➕ Add User"):
     st.switch_page("pages/7_Add_User.py")
 
-# List existing users
-users_df = get_all_users()
-users    = users_df.to_dict("records") if hasattr(users_df, "to_dict") else users_df
+# One page of users matching the search, fetched server-side
+users, total = user_directory_page("user_directory")
 
 if not users:
     st.info("No users found.")
 else:
     for u in users:
         col_name, col_role = st.columns([4, 1])
-        if col_name.button(f"✏️ {u['name']} (`{u['username']}`)", key=f"edit_{u['id']}"):
+        if col_name.button(f"✏️ {user_label(u)}", key=f"edit_{u['id']}"):
             st.session_state["selected_user_id"] = u["id"]
             st.switch_page("pages/8_Edit_User.py")
         col_role.markdown(f"**Role:** `{u.get('role', '')}`")
+
+finish_page()
@@ -1,30 +1,24 @@
 # File: pages/_7_Add_User.py
 
 import streamlit as st
-from utils.supabase_utils import init_connection, get_all_approvers, get_all_categories
-from utils.ui_utils import hide_streamlit_pages_nav
-from utils.nav_utils import PAGES_FOR_ROLES  # role‐based page definitions :contentReference[oaicite:4]{index=4}
-
-# Page config
-st.set_page_config(page_title="Add User", layout="wide")
-# Hide Streamlit’s built-in nav & apply global CSS
-hide_streamlit_pages_nav()  # :contentReference[oaicite:5]{index=5}
-
-# --- Sidebar Navigation (role‐based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    # Never show Add User or Edit User in the sidebar
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
+from utils.supabase_utils import init_connection, get_all_approvers, get_all_categories, load_concurrently
+from utils.audit_utils import audit
+from utils.change_feed_utils import changed
+from utils.directory_utils import cached_search_users
+from utils.page_utils import bootstrap_page, finish_page
+
+# Only these fields of a new user go into the audit log (never the password hash)
+AUDITED_FIELDS = ("username", "name", "email", "role", "approver_id", "default_category_id")
+
+# Page config, nav, cached user context and auth guard
+bootstrap_page("Add User", roles=("admin",))
 
 st.title("Add User")
 
 supabase  = init_connection()
-approvers = get_all_approvers()
-cats      = get_all_categories()
+loaded, _ = load_concurrently({"approvers": get_all_approvers, "categories": get_all_categories})
+approvers = loaded["approvers"]
+cats      = loaded["categories"]
 
 username = st.text_input("Username")
 name     = st.text_input("Full Name")
@@ -38,10 +32,8 @@ if st.button("Create User"):
     if not username or not password:
         st.error("Username and password required.")
     else:
-        import bcrypt
-        pwd_b = password.encode("utf-8")
-        salt  = bcrypt.gensalt()
-        hsh   = bcrypt.hashpw(pwd_b, salt).decode("utf-8")
+        from utils.hash_utils import hash_password
+        hsh   = hash_password(password)
         new_u = {
             "username": username,
             "name":     name,
@@ -49,11 +41,46 @@ if st.button("Create User"):
             "role":     role_sel,
             "approver_id": next(a["id"] for a in approvers if a["name"] == approver),
             "default_category_id": next(c["id"] for c in cats if c["name"] == category),
-            "password": hsh,
+            "hashed_password": hsh,
         }
         res = supabase.table("users").insert(new_u).execute()
         if getattr(res, "error", None):
             st.error(f"Error: {res.error.message}")
         else:
+            changed("users", "INSERT")
+            audit("create", "user", res.data[0]["id"],
+                  {k: new_u[k] for k in AUDITED_FIELDS})
+            cached_search_users.clear()
             st.success("User created.")
-            st.experimental_rerun()
+            st.rerun()
+
+# --- Bulk import ---
+st.markdown("---")
+st.header("Import Users from CSV")
+st.caption(
+    "Columns: username, name, email, password, and optionally role (user/approver/admin), "
+    "approver and default_category (by name). Valid rows are created; every row gets a result below."
+)
+upload = st.file_uploader("CSV file", type=["csv"], key="user_import_csv")
+if upload is not None and st.button("Import users", type="primary"):
+    from utils.user_import_utils import import_users, read_import_csv
+    try:
+        frame = read_import_csv(upload)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        bar    = st.progress(0.0, text=f"Importing {len(frame):,} rows…")
+        report = import_users(frame, progress=lambda fraction, text: bar.progress(fraction, text=text))
+        cached_search_users.clear()
+        counts = report["status"].value_counts()
+        st.success(
+            f"{counts.get('created', 0):,} created, {counts.get('invalid', 0):,} invalid, "
+            f"{counts.get('failed', 0):,} failed to insert."
+        )
+        problems = report[report["status"] != "created"]
+        if not problems.empty:
+            st.dataframe(problems, hide_index=True)
+        st.download_button("Download full report", report.to_csv(index=False),
+                           file_name="user_import_report.csv", mime="text/csv")
+
+finish_page()
@@ -6,24 +6,16 @@ from utils.supabase_utils import (
     get_single_user_details,
     get_all_categories,
     get_all_approvers,
+    get_all_departments,
+    load_concurrently,
 )
-from utils.ui_utils import hide_streamlit_pages_nav
-from utils.nav_utils import PAGES_FOR_ROLES  # role‐based page definitions :contentReference[oaicite:7]{index=7}
+from utils.audit_utils import audit
+from utils.change_feed_utils import changed
+from utils.directory_utils import cached_search_users
+from utils.page_utils import bootstrap_page, finish_page
 
-# Page config
-st.set_page_config(page_title="Edit User", layout="wide")
-# Hide Streamlit’s built-in nav & apply global CSS
-hide_streamlit_pages_nav()  # :contentReference[oaicite:8]{index=8}
-
-# --- Sidebar Navigation (role‐based) ---
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    # Never show Add User or Edit User in the sidebar
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
+# Page config, nav, cached user context and auth guard
+bootstrap_page("Edit User", roles=("admin",))
 
 st.title("Edit User")
 
@@ -33,9 +25,17 @@ if not uid:
     st.error("No user selected.")
     st.stop()
 
-details    = get_single_user_details(uid)
-approvers  = get_all_approvers()
-categories = get_all_categories()
+# Independent lookups run concurrently; the page waits for the slowest one
+loaded, _ = load_concurrently({
+    "details":     lambda: get_single_user_details(uid),
+    "approvers":   get_all_approvers,
+    "categories":  get_all_categories,
+    "departments": get_all_departments,
+})
+details     = loaded["details"] or {}
+approvers   = loaded["approvers"]
+categories  = loaded["categories"]
+departments = loaded["departments"]
 
 # Build dropdown options with “(None)” entries
 approver_names = ["(None)"] + [a["name"] for a in approvers]
@@ -72,7 +72,7 @@ category = st.selectbox(
 
 department = st.selectbox(
     "Department",
-    options=["(None)"] + [d["name"] for d in supabase.table("departments").select("name,id").execute().data],
+    options=["(None)"] + [d["name"] for d in departments],
     index=0  # default to “(None)”; adjust similarly if persisting
 )
 
@@ -89,6 +89,11 @@ if st.button("Save changes"):
         # Include department_id if desired:
         # update["department_id"] = selected_department_id
         supabase.table("users").update(update).eq("id", uid).execute()
+        changed("users", "UPDATE")
+        audit("update", "user", uid, update)
+        cached_search_users.clear()
         st.success("User updated successfully.")
     except Exception as e:
         st.error(f"Error updating user: {e}")
+
+finish_page()
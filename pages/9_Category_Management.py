@@ -1,98 +1,74 @@
 # File: pages/9_Category_Management.py
 
+import pandas as pd
 import streamlit as st
-from utils.supabase_utils import init_connection, get_all_users, get_single_user_details, update_user_details
-from utils.ui_utils import hide_streamlit_pages_nav
-from utils.nav_utils import PAGES_FOR_ROLES
-
-# Page setup
-st.set_page_config(page_title="Category Management", layout="wide")
-hide_streamlit_pages_nav()
-
-# Sidebar – role‐based nav
-role = st.session_state.get("role", "logged_out")
-st.sidebar.header("Navigation")
-for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
-    if fname in ("7_Add_User.py", "8_Edit_User.py"):
-        continue
-    if st.sidebar.button(label):
-        st.switch_page(f"pages/{fname}")
-
-# Auth guard
-if not st.session_state.get("authentication_status"):
-    st.warning("Please log in to access this page.")
-    st.stop()
-
-supabase = init_connection()
+from utils.directory_utils import cached_search_users, user_picker
+from utils.grid_utils import diff_grid, duplicate_values
+from utils.supabase_utils import (
+    apply_grid_diff,
+    get_all_categories,
+    get_single_user_details,
+    update_user_details,
+)
+from utils.page_utils import bootstrap_page, finish_page
+
+# Page config, nav, cached user context and auth guard
+bootstrap_page("Category Management", roles=("admin",))
+
+# Rows that keep a category from being deleted, counted in one query
+CATEGORY_REFERENCES = {
+    "expenses": "expenses(count)",
+    "users":    "users!default_category_id(count)",
+}
+
+# Users are searched on demand by the picker below, so only categories load up front
+categories = get_all_categories()
 
 # --- 1) CATEGORY CRUD ---
 st.header("Manage Categories")
-try:
-    resp       = supabase.table("categories").select("id, name, gl_account").order("name", desc=False).execute()
-    categories = resp.data
-except Exception as e:
-    st.error(f"Error loading categories: {e}")
-    st.stop()
-
-for cat in categories:
-    col_name, col_gl, col_update, col_delete = st.columns([3, 3, 1, 1])
-    new_name = col_name.text_input("Category Name", value=cat["name"], key=f"cat_name_{cat['id']}")
-    new_gl   = col_gl.text_input  ("GL Account",     value=cat.get("gl_account",""), key=f"cat_gl_{cat['id']}")
-
-    # Update button
-    if col_update.button("Update", key=f"update_cat_{cat['id']}"):
-        try:
-            supabase.table("categories") \
-                    .update({"name": new_name, "gl_account": new_gl}) \
-                    .eq("id", cat["id"]) \
-                    .execute()
-            st.success(f"Updated '{cat['name']}' → '{new_name}' (GL {new_gl}).")
-            st.experimental_rerun()
-        except Exception as ex:
-            st.error(f"Error updating category: {ex}")
-
-    # Delete button with dependency checks
-    if col_delete.button("Delete", key=f"delete_cat_{cat['id']}"):
-        # 1) Used in any expense items?
-        used = supabase.table("expenses") \
-                       .select("id", count="exact") \
-                       .eq("category_id", cat["id"]) \
-                       .execute().count
-        if used > 0:
-            st.error("Cannot delete: this category has been used in expense items.")
-            continue
-
-        # 2) Assigned as default to any user?
-        assigned = supabase.table("users") \
-                           .select("id", count="exact") \
-                           .eq("default_category_id", cat["id"]) \
-                           .execute().count
-        if assigned > 0:
-            st.error("Cannot delete: this category is the default for one or more users.")
-            continue
-
-        # Safe to delete
-        try:
-            supabase.table("categories").delete().eq("id", cat["id"]).execute()
-            st.success(f"Deleted category '{cat['name']}'.")
-            st.experimental_rerun()
-        except Exception as ex:
-            st.error(f"Error deleting category: {ex}")
+st.caption("Edit names and GL accounts in place, add rows at the bottom, select rows and press Delete to remove them; then save once.")
+
+edited = st.data_editor(
+    pd.DataFrame(categories, columns=["id", "name", "gl_account"]),
+    column_config={
+        "id":         None,
+        "name":       st.column_config.TextColumn("Category Name", required=True),
+        "gl_account": st.column_config.TextColumn("GL Account"),
+    },
+    num_rows="dynamic",
+    hide_index=True,
+    key="category_grid",
+)
+
+diff = diff_grid(categories, edited, ["name", "gl_account"])
+if st.button(f"Save changes ({diff.summary()})", disabled=not diff, type="primary"):
+    duplicates = duplicate_values(edited, "name")
+    if duplicates:
+        st.error(f"Category names must be unique: {', '.join(duplicates)}")
+    else:
+        ok, blocked = apply_grid_diff("categories", "category", diff, CATEGORY_REFERENCES)
+        if ok:
+            names = {c["id"]: c["name"] for c in categories}
+            st.session_state["category_grid_blocked"] = [
+                f"Cannot delete '{names.get(cat_id, cat_id)}': used by {counts['expenses']} expense item(s) "
+                f"and the default for {counts['users']} user(s)." if counts is not None else
+                f"Did not delete '{names.get(cat_id, cat_id)}': could not check whether it is still in use. Try again."
+                for cat_id, counts in blocked.items()
+            ]
+            # Reload the grid from the saved state
+            st.session_state.pop("category_grid", None)
+            st.rerun()
+
+for message in st.session_state.pop("category_grid_blocked", []):
+    st.error(message)
 
 st.markdown("---")
 
 # --- 2) ASSIGN DEFAULT CATEGORY TO USER ---
 st.header("Assign Default Category to User")
-users_df = get_all_users()
-users    = users_df.to_dict("records") if hasattr(users_df, "to_dict") else users_df
-
-if not users:
-    st.info("No users to assign.")
-else:
-    user_labels    = [f"{u['name']} ({u['username']})" for u in users]
-    sel_user_label = st.selectbox("Select User", options=user_labels, key="assign_user")
-    sel_user       = users[user_labels.index(sel_user_label)]
+sel_user = user_picker("assign_user", "User")
 
+if sel_user:
     cat_labels     = [c["name"] for c in categories]
     sel_cat_name   = st.selectbox("Select Default Category", options=cat_labels, key="assign_cat")
     sel_cat_id     = next(c["id"] for c in categories if c["name"] == sel_cat_name)
@@ -107,8 +83,11 @@ else:
                 default_category_id=sel_cat_id,
             )
             if ok:
+                cached_search_users.clear()
                 st.success(f"Set default category for '{sel_user['name']}' → '{sel_cat_name}'.")
             else:
                 st.error("Failed to update user.")
         except Exception as e:
             st.error(f"Error assigning default category: {e}")
+
+finish_page()
@@ -0,0 +1,20 @@
+-- Audit trail written in bulk by utils/audit_utils.py (write-behind).
+-- Ids are stored as text so the log does not depend on each table's key type.
+
+create table if not exists audit_log (
+    id          bigint generated always as identity primary key,
+    created_at  timestamptz not null default now(),
+    actor_id    text,
+    action      text not null,
+    entity      text not null,
+    entity_id   text,
+    changes     jsonb not null default '{}'::jsonb
+);
+
+-- "History of this report/user/category", newest first
+create index if not exists audit_log_entity_idx
+    on audit_log (entity, entity_id, created_at desc);
+
+-- "What did this user do", newest first
+create index if not exists audit_log_actor_idx
+    on audit_log (actor_id, created_at desc);
@@ -0,0 +1,11 @@
+-- Indexes behind supabase_utils.search_users(): case-insensitive prefix
+-- search (ILIKE 'term%') on username, name and email, ordered by name.
+
+create extension if not exists pg_trgm;
+
+create index if not exists users_username_trgm_idx on users using gin (username gin_trgm_ops);
+create index if not exists users_name_trgm_idx     on users using gin (name gin_trgm_ops);
+create index if not exists users_email_trgm_idx    on users using gin (email gin_trgm_ops);
+
+-- Pages are read in (name, id) order
+create index if not exists users_name_id_idx on users (name, id);
@@ -0,0 +1,8 @@
+-- Change feed behind change_feed_utils: Supabase Realtime only streams
+-- postgres_changes for tables in the supabase_realtime publication.
+
+alter publication supabase_realtime add table users, reports, expenses, categories, departments;
+
+-- DELETE events carry the primary key only unless the full old row is logged
+alter table reports  replica identity full;
+alter table expenses replica identity full;
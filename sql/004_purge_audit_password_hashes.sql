@@ -0,0 +1,7 @@
+-- Add User audited the whole new row, bcrypt hash included, until its
+-- audit changes became an allowlist. Drop the hashes already logged.
+
+update audit_log
+   set changes = changes - 'hashed_password' - 'password'
+ where entity = 'user'
+   and (changes ? 'hashed_password' or changes ? 'password');
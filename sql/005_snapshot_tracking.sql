@@ -0,0 +1,45 @@
+-- What utils/snapshot_utils.py needs to sync reports and expenses
+-- incrementally: an updated_at watermark that moves on every edit, and a
+-- tombstone per deleted row (deletes leave nothing behind to watermark).
+
+alter table reports  add column if not exists updated_at timestamptz not null default now();
+alter table expenses add column if not exists updated_at timestamptz not null default now();
+
+create or replace function set_updated_at() returns trigger language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end $$;
+
+drop trigger if exists reports_updated_at on reports;
+create trigger reports_updated_at before update on reports
+    for each row execute function set_updated_at();
+
+drop trigger if exists expenses_updated_at on expenses;
+create trigger expenses_updated_at before update on expenses
+    for each row execute function set_updated_at();
+
+create index if not exists reports_updated_at_idx  on reports  (updated_at, id);
+create index if not exists expenses_updated_at_idx on expenses (updated_at, id);
+
+-- One row per deleted report or expense, read in id order by the sync
+create table if not exists deleted_rows (
+    id          bigint generated always as identity primary key,
+    deleted_at  timestamptz not null default now(),
+    table_name  text not null,
+    row_id      bigint not null
+);
+
+create or replace function record_deleted_row() returns trigger language plpgsql as $$
+begin
+    insert into deleted_rows (table_name, row_id) values (tg_table_name, old.id);
+    return old;
+end $$;
+
+drop trigger if exists reports_deleted on reports;
+create trigger reports_deleted after delete on reports
+    for each row execute function record_deleted_row();
+
+drop trigger if exists expenses_deleted on expenses;
+create trigger expenses_deleted after delete on expenses
+    for each row execute function record_deleted_row();
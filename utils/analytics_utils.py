@@ -0,0 +1,185 @@
+# File: utils/analytics_utils.py
+
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from utils import supabase_utils as su
+from utils.fx_utils import convert_amounts, fx_settings
+
+# Reports whose expenses count as spend (not drafts or rejected ones)
+SPEND_STATUSES = ("Submitted", "Approved")
+
+# Stored grain of the cube; everything else is joined on at query time
+GRAIN    = ["month", "category_id", "user_id"]
+MEASURES = ["amount", "gst", "pst", "hst", "expenses", "unconverted"]
+
+# Dimensions a pivot can group by, and the column that holds each one
+DIMENSIONS = {
+    "Month":      "month",
+    "Category":   "category",
+    "GL Account": "gl_account",
+    "Department": "department",
+    "User":       "user",
+}
+
+
+def _empty_cells() -> pd.DataFrame:
+    return pd.DataFrame({
+        **{column: pd.Series(dtype="object") for column in GRAIN},
+        **{column: pd.Series(dtype="float64") for column in MEASURES},
+    })
+
+
+# Expense columns the cube aggregates
+FACT_COLUMNS = ["id", "report_id", "expense_date", "amount", "currency", "category_id",
+                "gst_amount", "pst_amount", "hst_amount"]
+
+
+def _spend_facts() -> pd.DataFrame:
+    """
+    Every expense on a SPEND_STATUSES report, with its submitter, from the
+    local Parquet snapshot plus whatever changed since its last sync.
+    """
+    from utils.snapshot_utils import load_live
+
+    tables  = load_live({"reports": ["id", "user_id", "status"], "expenses": FACT_COLUMNS})
+    reports = tables["reports"]
+    reports = reports[reports["status"].isin(SPEND_STATUSES)]
+    return tables["expenses"].merge(reports[["id", "user_id"]].rename(columns={"id": "report_id"}),
+                                    on="report_id", how="inner")
+
+
+def _aggregate(facts: pd.DataFrame, reporting: str) -> pd.DataFrame:
+    """
+    Collapses raw expense rows to the cube grain, in the reporting currency.
+    Expenses without an exchange rate count towards `unconverted`, not `amount`.
+    """
+    if facts.empty:
+        return _empty_cells()
+    amount = convert_amounts(facts, reporting)
+    frame = pd.DataFrame({
+        "month":       pd.to_datetime(facts["expense_date"], errors="coerce").dt.strftime("%Y-%m").fillna("unknown"),
+        "category_id": facts["category_id"],
+        "user_id":     facts["user_id"] if "user_id" in facts else facts["report"].map(lambda r: (r or {}).get("user_id")),
+        "amount":      amount,
+        "gst":         pd.to_numeric(facts["gst_amount"], errors="coerce"),
+        "pst":         pd.to_numeric(facts["pst_amount"], errors="coerce"),
+        "hst":         pd.to_numeric(facts["hst_amount"], errors="coerce"),
+        "expenses":    1.0,
+        "unconverted": amount.isna().astype("float64"),
+    })
+    return frame.groupby(GRAIN, dropna=False, as_index=False)[MEASURES].sum()
+
+
+class SpendCube:
+    """
+    Pre-aggregated spend at month x category x user grain, over expenses
+    on SPEND_STATUSES reports. New expenses (ids above the watermark) are
+    aggregated and merged into the existing cells, so refreshes cost
+    O(new rows) and pivots read only the cube. Anything the watermark
+    cannot see (an edited or deleted expense, a report changing status)
+    arrives as a change event and marks the cube stale; the next read
+    rebuilds it from the Parquet snapshot (utils/snapshot_utils.py), so a
+    rebuild only fetches what changed since the last sync.
+    """
+
+    def __init__(self, reporting: str):
+        self.reporting    = reporting
+        self.cells        = _empty_cells()
+        self.categories   = pd.DataFrame(columns=["category_id", "category", "gl_account"])
+        self.users        = pd.DataFrame(columns=["user_id", "user", "department"])
+        self.watermark    = None
+        self.refreshed_at = 0.0
+        self.stale        = False   # set from the change feed
+        self.epoch        = None    # bus epoch the cells were built under
+        self._lock        = threading.Lock()
+
+    def on_change(self, event):
+        """Change feed listener: everything but a new expense needs a rebuild."""
+        if event.table in ("reports", "expenses") and event.type.upper() != "INSERT":
+            self.stale = True
+
+    def refresh(self, rebuild: bool = False, epoch=None):
+        """
+        Folds in expenses added since the last refresh and reloads the small
+        dimensions; rebuild=True aggregates every expense again from scratch.
+        """
+        if rebuild:
+            self.stale = False   # cleared first: an event during the rebuild marks it stale again
+            facts = _spend_facts()
+        else:
+            facts = pd.DataFrame(su.get_expense_facts_since(self.watermark, report_statuses=SPEND_STATUSES))
+        categories = pd.DataFrame(su.get_all_categories(), columns=["id", "name", "gl_account"])
+        users = pd.DataFrame(su.get_users_for_analytics(), columns=["id", "name", "department"])
+        with self._lock:
+            if rebuild:
+                self.cells, self.watermark = _empty_cells(), None
+            if not facts.empty:
+                fresh  = _aggregate(facts, self.reporting)
+                merged = fresh if self.cells.empty else pd.concat([self.cells, fresh], ignore_index=True)
+                self.cells = merged.groupby(GRAIN, dropna=False, as_index=False)[MEASURES].sum()
+                self.watermark = facts["id"].max()
+            self.categories = categories.rename(columns={"id": "category_id", "name": "category"})
+            self.users      = users.rename(columns={"id": "user_id", "name": "user"})
+            self.refreshed_at = time.time()
+            self.epoch        = epoch
+
+    def frame(self) -> pd.DataFrame:
+        """Cube cells with category, GL account, user and department labels joined on."""
+        with self._lock:
+            cells, categories, users = self.cells, self.categories, self.users
+        frame = cells.merge(categories, on="category_id", how="left").merge(users, on="user_id", how="left")
+        return frame.fillna({"category": "(uncategorised)", "gl_account": "(none)",
+                             "user": "(unknown)", "department": "(none)"})
+
+    def pivot(self, rows: str, columns: str = None, filters: dict = None, measure: str = "amount") -> pd.DataFrame:
+        """
+        Totals `measure` by the `rows` dimension (and optionally `columns`),
+        after keeping only cells whose dimension values are in `filters`.
+        """
+        frame = self.frame()
+        for dim, values in (filters or {}).items():
+            if values:
+                frame = frame[frame[dim].isin(values)]
+        if columns and columns != rows:
+            return frame.pivot_table(index=rows, columns=columns, values=measure,
+                                     aggfunc="sum", fill_value=0).sort_index()
+        return frame.groupby(rows)[[measure]].sum().sort_index()
+
+
+@st.cache_resource
+def _get_cube(reporting: str) -> SpendCube:
+    from utils.change_feed_utils import get_invalidation_bus
+
+    cube = SpendCube(reporting)
+    get_invalidation_bus().subscribe(cube.on_change)
+    return cube
+
+
+# Only one thread refreshes at a time; others read the current cells
+_refresh_lock = threading.Lock()
+
+
+def get_spend_cube(refresh_interval: int = 300) -> SpendCube:
+    """
+    Process-wide spend cube. New expenses are folded in every
+    `refresh_interval` seconds; a stale cube is rebuilt on the next call.
+    Without a live change feed (or after it reconnected, when events may
+    have been missed) every refresh is a rebuild.
+    """
+    from utils.change_feed_utils import get_change_feed
+
+    bus     = get_change_feed()
+    cube    = _get_cube(fx_settings()["reporting"])
+    epoch   = bus.versions(())[0]
+    rebuild = cube.stale or not bus.live or epoch != cube.epoch
+    due     = cube.stale or epoch != cube.epoch or time.time() - cube.refreshed_at >= refresh_interval
+    if due and _refresh_lock.acquire(blocking=False):
+        try:
+            cube.refresh(rebuild=rebuild, epoch=epoch)
+        finally:
+            _refresh_lock.release()
+    return cube
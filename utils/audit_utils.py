@@ -0,0 +1,169 @@
+# File: utils/audit_utils.py
+#
+# Write-behind audit log. Mutations call audit(...), which only enqueues a
+# compact event; a background thread bulk-inserts queued events into the
+# audit_log table (sql/001_audit_log.sql) every `batch_size` events or
+# `flush_interval` seconds, and once more when the process exits.
+
+import atexit
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+import streamlit as st
+
+# Overridable under [audit] in secrets.toml
+DEFAULT_SETTINGS = {
+    "batch_size":     100,    # events per bulk insert
+    "flush_interval": 2.0,    # seconds an event may wait before it is written
+    "max_queue":      10000,  # events held in memory before new ones are dropped
+    "max_retries":    3,      # failed flushes kept for retry before the batch is dropped
+}
+
+
+def audit_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict(st.secrets.get("audit", {})))
+    return settings
+
+
+class AuditWriter:
+    """Bounded in-memory queue of audit events drained by one flusher thread."""
+
+    def __init__(self, settings: dict, sink=None):
+        self.settings  = settings
+        self._sink     = sink or _insert_events
+        self._queue    = queue.Queue(maxsize=int(settings["max_queue"]))
+        self._wake     = threading.Event()
+        self._stopped  = threading.Event()
+        self._lock     = threading.Lock()   # one flush at a time
+        self._pending  = []                 # batch carried over after a failed insert
+        self._failures = 0
+        self.written   = 0
+        self.dropped   = 0
+        self._thread   = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, event: dict) -> bool:
+        """Queues one event without blocking; False (and counted) if the queue is full."""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.settings["batch_size"]:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Writes everything queued so far, in batches of `batch_size`."""
+        with self._lock:
+            while True:
+                batch, self._pending = self._pending, []
+                while len(batch) < self.settings["batch_size"]:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                try:
+                    self._sink(batch)
+                except Exception:
+                    self._failures += 1
+                    if self._failures <= self.settings["max_retries"]:
+                        self._pending = batch
+                    else:
+                        self.dropped  += len(batch)
+                        self._failures = 0
+                    return
+                self._failures = 0
+                self.written  += len(batch)
+
+    def close(self):
+        """Stops the flusher and writes whatever is still queued."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize() + len(self._pending), "written": self.written, "dropped": self.dropped}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.settings["flush_interval"])
+            self._wake.clear()
+            self.flush()
+
+
+def _insert_events(events: list):
+    from utils.supabase_utils import init_connection
+
+    init_connection().table("audit_log").insert(events).execute()
+
+
+@st.cache_resource
+def get_audit_writer() -> AuditWriter:
+    """Process-wide audit writer shared by every session."""
+    return AuditWriter(audit_settings())
+
+
+def _current_actor():
+    try:
+        return st.session_state.get("user_id")
+    except Exception:  # outside a Streamlit session (scripts, CLI)
+        return None
+
+
+def audit(action: str, entity: str, entity_id=None, changes: dict = None, actor_id=None):
+    """
+    Records that the current user (or `actor_id`) did `action` to
+    `entity`/`entity_id`. Never raises and never waits on the database.
+    """
+    try:
+        actor = actor_id if actor_id is not None else _current_actor()
+        get_audit_writer().enqueue({
+            "action":     action,
+            "entity":     entity,
+            "entity_id":  None if entity_id is None else str(entity_id),
+            "actor_id":   None if actor is None else str(actor),
+            "changes":    json.loads(json.dumps(changes or {}, default=str)),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+    except Exception:
+        pass
+
+
+def audit_many(action: str, entity: str, entity_ids, changes: dict = None, actor_id=None):
+    """One event per id, sharing the same change set (bulk operations)."""
+    for entity_id in entity_ids:
+        audit(action, entity, entity_id, changes, actor_id)
+
+
+def get_audit_events(entity: str = None, entity_id=None, actor_id=None, limit: int = 200):
+    """
+    Newest audit events, filtered by entity (and id) and/or actor; each
+    filter combination is served by an index on (filter, created_at).
+    """
+    import pandas as pd
+    from utils.supabase_utils import init_connection
+
+    get_audit_writer().flush()  # include this process's own recent events
+    try:
+        query = init_connection().table("audit_log").select("*")
+        if entity:
+            query = query.eq("entity", entity)
+        if entity_id is not None:
+            query = query.eq("entity_id", str(entity_id))
+        if actor_id:
+            query = query.eq("actor_id", str(actor_id))
+        resp = query.order("created_at", desc=True).limit(limit).execute()
+        return pd.DataFrame(resp.data)
+    except Exception as e:
+        st.error(f"Error fetching audit log: {e}")
+        return pd.DataFrame()
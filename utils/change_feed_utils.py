@@ -0,0 +1,256 @@
+# File: utils/change_feed_utils.py
+#
+# Event-driven cache invalidation. A process-wide InvalidationBus keeps a
+# version counter per table; every change event bumps its table. Queries
+# wrapped in @cached_query("reports", ...) are cached under the versions of
+# the tables they read, so an entry lives until one of those tables changes
+# and is never served after that (an event that lands while a query is
+# running leaves the result under the old version, where nothing finds it).
+#
+# Events come from the change feed:
+#   - Supabase Realtime (postgres_changes on TABLES), in a background
+#     thread with its own event loop. Events missed while the socket is
+#     down cannot be replayed, so the cache is bypassed until the channel is
+#     subscribed again, and then everything is invalidated once.
+#   - the in-memory local backend, which publishes its own writes.
+# Writes made through supabase_utils also publish straight away, so a
+# session sees its own change on the next rerun without waiting for the
+# Realtime echo.
+
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from functools import wraps
+
+import streamlit as st
+
+TABLES = ("users", "reports", "expenses", "categories", "departments")
+
+# Overridable under [change_feed] in secrets.toml
+DEFAULT_SETTINGS = {
+    "enabled":     True,       # False: no feed, cached queries always hit the database
+    "schema":      "public",
+    "max_entries": 256,        # cached results per query function
+    "retry_max":   60.0,       # seconds between Realtime reconnect attempts, at most
+}
+
+
+_cached_queries = []   # every @cached_query wrapper, for feed_stats()
+
+
+def feed_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict(st.secrets.get("change_feed", {})))
+    return settings
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    table:      str
+    type:       str = "*"      # INSERT, UPDATE, DELETE, or "*" when unknown
+    record:     dict = field(default=None, compare=False)
+    old_record: dict = field(default=None, compare=False)
+
+
+class InvalidationBus:
+    """Per-table versions, bumped by change events; listeners are told about each event."""
+
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self._versions  = Counter()
+        self._epoch     = 0           # bumped by invalidate_all()
+        self._listeners = []
+        self.live       = False       # a feed is delivering events
+        self.source     = None
+        self.status     = "not started"
+        self.events     = Counter()
+
+    def publish(self, event: ChangeEvent):
+        with self._lock:
+            self._versions[event.table] += 1
+            self.events[event.table]    += 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                pass   # a broken listener must not stop invalidation
+
+    def changed(self, table: str, type: str = "*", record: dict = None, old_record: dict = None):
+        self.publish(ChangeEvent(table, type, record, old_record))
+
+    def versions(self, tables) -> tuple:
+        with self._lock:
+            return (self._epoch,) + tuple(self._versions[t] for t in tables)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._epoch += 1
+
+    def set_live(self, live: bool, status: str):
+        """Marks the feed up or down; coming back up drops everything cached before."""
+        if live and not self.live:
+            self.invalidate_all()
+        self.live, self.status = live, status
+
+    def subscribe(self, listener):
+        """Calls listener(event) for every event (from the publishing thread)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"source": self.source, "live": self.live, "status": self.status,
+                    "events": dict(self.events)}
+
+
+@st.cache_resource
+def get_invalidation_bus() -> InvalidationBus:
+    """Process-wide invalidation bus."""
+    return InvalidationBus()
+
+
+def changed(table: str, type: str = "*", record: dict = None):
+    """Tells the bus that rows of `table` were written by this process."""
+    get_invalidation_bus().changed(table, type, record)
+
+
+class RealtimeFeed:
+    """Supabase Realtime postgres_changes for `tables`, published to the bus."""
+
+    def __init__(self, url: str, key: str, bus: InvalidationBus, tables=TABLES,
+                 schema: str = "public", retry_max: float = 60.0):
+        self.url       = f"{url.rstrip('/')}/realtime/v1"
+        self.key       = key
+        self.bus       = bus
+        self.tables    = tuple(tables)
+        self.schema    = schema
+        self.retry_max = retry_max
+        self._thread   = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                          name="change-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _on_change(self, payload):
+        data = payload.get("data", {})
+        self.bus.changed(data.get("table"), str(data.get("type", "*")),
+                         data.get("record"), data.get("old_record"))
+
+    def _on_state(self, state, error=None):
+        state = getattr(state, "value", state)
+        self.bus.set_live(state == "SUBSCRIBED", f"realtime: {state}" + (f" ({error})" if error else ""))
+
+    async def _run(self):
+        from realtime import AsyncRealtimeClient
+
+        backoff = 1.0
+        while True:
+            # Reconnects are done here, not by the client: every new
+            # subscription goes through _on_state and resets the cache
+            client = AsyncRealtimeClient(self.url, self.key, auto_reconnect=False)
+            try:
+                await client.connect()
+                channel = client.channel("cache-invalidation")
+                for table in self.tables:
+                    channel.on_postgres_changes("*", callback=self._on_change, table=table, schema=self.schema)
+                await channel.subscribe(self._on_state)
+                backoff = 1.0
+                # The client does not report a dropped socket; its listener task ends
+                while client._listen_task is not None and not client._listen_task.done():
+                    await asyncio.sleep(1.0)
+                self.bus.set_live(False, "realtime: connection closed")
+            except Exception as e:
+                self.bus.set_live(False, f"realtime: {e}")
+            try:
+                await client.close()
+            except Exception:
+                pass
+            await asyncio.sleep(backoff)
+            backoff = min(self.retry_max, backoff * 2)
+
+
+@st.cache_resource
+def get_change_feed() -> InvalidationBus:
+    """
+    Starts the process's change feed once (local backend publisher, or
+    Supabase Realtime) and returns the bus it publishes to.
+    """
+    from utils.local_backend_utils import get_local_client, local_backend_enabled
+
+    bus      = get_invalidation_bus()
+    settings = feed_settings()
+    if not settings["enabled"]:
+        bus.source, bus.status = "off", "disabled in [change_feed]"
+    elif local_backend_enabled():
+        get_local_client().db.listeners.append(bus.changed)
+        bus.source = "local"
+        bus.set_live(True, "local backend")
+    else:
+        try:
+            cfg = st.secrets["supabase"]
+            RealtimeFeed(cfg["url"], cfg["key"], bus, TABLES, settings["schema"],
+                         float(settings["retry_max"])).start()
+            bus.source, bus.status = "realtime", "connecting"
+        except Exception as e:
+            bus.source, bus.status = "off", f"could not start: {e}"
+    return bus
+
+
+def cached_query(*tables: str):
+    """
+    Caches a query function's result per arguments until any of `tables`
+    changes. Results are shared across sessions: return plain rows and
+    build DataFrames (or copies) outside. While no feed is live, calls go
+    straight to the database. The wrapper has .clear() and .stats().
+    """
+    def decorator(fn):
+        entries = OrderedDict()
+        lock    = threading.Lock()
+        counts  = Counter()
+        limit   = []   # max_entries, read on first use (secrets are not loaded at import)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            bus = get_change_feed()
+            if not bus.live:
+                counts["bypassed"] += 1
+                return fn(*args, **kwargs)
+            key      = (args, tuple(sorted(kwargs.items())))
+            versions = bus.versions(tables)   # read before the query runs
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] == versions:
+                    entries.move_to_end(key)
+                    counts["hits"] += 1
+                    return entry[1]
+            value = fn(*args, **kwargs)
+            if not limit:
+                limit.append(int(feed_settings()["max_entries"]))
+            with lock:
+                counts["misses"] += 1
+                entries[key] = (versions, value)
+                entries.move_to_end(key)
+                while len(entries) > limit[0]:
+                    entries.popitem(last=False)
+            return value
+
+        def clear():
+            with lock:
+                entries.clear()
+
+        def stats() -> dict:
+            with lock:
+                return {"entries": len(entries), **counts}
+
+        wrapper.clear, wrapper.stats, wrapper.tables = clear, stats, tables
+        _cached_queries.append(wrapper)
+        return wrapper
+    return decorator
+
+
+def feed_stats() -> dict:
+    """Feed source and state, event counts per table and hits/misses per cached query."""
+    return {**get_invalidation_bus().stats(),
+            "queries": {q.__name__: q.stats() for q in _cached_queries}}
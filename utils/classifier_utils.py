@@ -0,0 +1,207 @@
+# File: utils/classifier_utils.py
+
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import streamlit as st
+
+from utils import supabase_utils as su
+
+# Words that say nothing about what was bought
+STOPWORDS = {
+    "the", "and", "de", "du", "des", "la", "le", "les", "et",
+    "inc", "ltd", "ltee", "llc", "corp", "co", "company", "limited", "enr",
+    "store", "stores", "shop", "no", "www", "com", "ca",
+}
+
+
+def tokenize(text) -> list:
+    """Lower-cases, strips accents, drops digits/punctuation and stopwords."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return [t for t in re.findall(r"[a-z]+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def vendor_key(vendor) -> str:
+    """Normalised vendor key: 'TIM HORTONS #1234' and 'Tim Hortons' map alike."""
+    return " ".join(tokenize(vendor))
+
+
+def _parse_line_items(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    return raw if isinstance(raw, list) else []
+
+
+class VendorClassifier:
+    """
+    Suggests a category from expense history without an LLM call.
+
+    Vendors are looked up by normalised key in a dict; unseen vendors (and
+    line-item descriptions) fall back to per-token category frequencies.
+    New expenses are folded in with update(); an edited or deleted expense
+    arrives as a change event and marks the model stale, and rebuild()
+    replaces it with one trained on the whole history.
+    """
+
+    def __init__(self):
+        self._by_vendor      = defaultdict(Counter)  # vendor key -> category counts
+        self._by_token       = defaultdict(Counter)  # vendor token -> category counts
+        self._by_item_token  = defaultdict(Counter)  # line-item token -> category counts
+        self._lock           = threading.Lock()
+        self.watermark       = None                  # highest expense id folded in
+        self.refreshed_at    = 0.0
+        self.size            = 0
+        self.stale           = False                 # set from the change feed
+        self.epoch           = None                  # bus epoch the model was built under
+
+    def add(self, vendor, category_id, line_items=None):
+        """Folds one expense (and its categorised line items) into the model."""
+        if category_id is not None:
+            key = vendor_key(vendor)
+            if key:
+                self._by_vendor[key][category_id] += 1
+                for token in set(key.split()):
+                    self._by_token[token][category_id] += 1
+                self.size += 1
+        for item in _parse_line_items(line_items):
+            item_cat = item.get("category_id") if isinstance(item, dict) else None
+            if item_cat is None:
+                continue
+            for token in set(tokenize(item.get("description"))):
+                self._by_item_token[token][item_cat] += 1
+
+    def update(self, rows):
+        """Folds expense rows (id, vendor, category_id, line_items) in, advancing the watermark."""
+        with self._lock:
+            for row in rows:
+                self.add(row.get("vendor"), row.get("category_id"), row.get("line_items"))
+                if row.get("id") is not None and (self.watermark is None or row["id"] > self.watermark):
+                    self.watermark = row["id"]
+            self.refreshed_at = time.time()
+
+    def rebuild(self, rows, epoch=None):
+        """Trains a fresh model on `rows` and swaps it in; readers see the old one until then."""
+        self.stale = False   # cleared first: an event during the rebuild marks it stale again
+        fresh = VendorClassifier()
+        fresh.update(rows)
+        with self._lock:
+            self._by_vendor, self._by_token, self._by_item_token = \
+                fresh._by_vendor, fresh._by_token, fresh._by_item_token
+            self.watermark, self.size = fresh.watermark, fresh.size
+            self.refreshed_at = time.time()
+            self.epoch        = epoch
+
+    def on_change(self, event):
+        """Change feed listener: an edited or deleted expense needs a rebuild."""
+        if event.table == "expenses" and event.type.upper() != "INSERT":
+            self.stale = True
+
+    def predict(self, vendor):
+        """Returns (category_id, confidence) for a vendor, or (None, 0.0)."""
+        key = vendor_key(vendor)
+        # Held while reading: update() mutates the counters from another session's thread
+        with self._lock:
+            counts = self._by_vendor.get(key)
+            if counts:
+                category_id, hits = counts.most_common(1)[0]
+                return category_id, hits / sum(counts.values())
+            return self._vote(key.split(), self._by_token)
+
+    def predict_item(self, description):
+        """Returns (category_id, confidence) for a line-item description."""
+        tokens = tokenize(description)
+        with self._lock:
+            return self._vote(tokens, self._by_item_token)
+
+    @staticmethod
+    def _vote(tokens, index):
+        """Each known token casts one vote split across its categories."""
+        scores = Counter()
+        for token in tokens:
+            counts = index.get(token)
+            if not counts:
+                continue
+            total = sum(counts.values())
+            for category_id, n in counts.items():
+                scores[category_id] += n / total
+        if not scores:
+            return None, 0.0
+        category_id, score = scores.most_common(1)[0]
+        return category_id, score / len(tokens)
+
+
+def evaluate_holdout(rows, test_fraction: float = 0.2, seed: int = 42) -> dict:
+    """
+    Trains on a random split of expense rows and scores the rest.
+    Accuracy is over all held-out rows; coverage is how many got a guess.
+    """
+    rows = [r for r in rows if r.get("category_id") is not None and vendor_key(r.get("vendor"))]
+    rng  = random.Random(seed)
+    rng.shuffle(rows)
+    cut  = int(len(rows) * (1 - test_fraction))
+    train, test = rows[:cut], rows[cut:]
+
+    model = VendorClassifier()
+    model.update(train)
+    correct = covered = 0
+    start = time.perf_counter()
+    for row in test:
+        guess, _ = model.predict(row["vendor"])
+        covered += guess is not None
+        correct += guess == row["category_id"]
+    elapsed = time.perf_counter() - start
+    return {
+        "train_rows":        len(train),
+        "test_rows":         len(test),
+        "accuracy":          correct / len(test) if test else 0.0,
+        "coverage":          covered / len(test) if test else 0.0,
+        "us_per_prediction": 1e6 * elapsed / len(test) if test else 0.0,
+    }
+
+
+@st.cache_resource
+def _get_classifier() -> VendorClassifier:
+    from utils.change_feed_utils import get_invalidation_bus
+
+    model = VendorClassifier()
+    get_invalidation_bus().subscribe(model.on_change)
+    return model
+
+
+# Only one thread pulls new history at a time; others use the model as is
+_refresh_lock = threading.Lock()
+
+
+def get_vendor_classifier(refresh_interval: int = 300) -> VendorClassifier:
+    """
+    Process-wide classifier. Every `refresh_interval` seconds it pulls only
+    the expenses added since its watermark and folds them in; a stale model
+    is rebuilt on the next call. Without a live change feed (or after it
+    reconnected, when events may have been missed) every refresh is a rebuild.
+    """
+    from utils.change_feed_utils import get_change_feed
+
+    bus     = get_change_feed()
+    model   = _get_classifier()
+    epoch   = bus.versions(())[0]
+    rebuild = model.stale or not bus.live or epoch != model.epoch
+    due     = model.stale or epoch != model.epoch or time.time() - model.refreshed_at >= refresh_interval
+    if due and _refresh_lock.acquire(blocking=False):
+        try:
+            if rebuild:
+                model.rebuild(su.get_expense_categories_since(None), epoch)
+            else:
+                model.update(su.get_expense_categories_since(model.watermark))
+        finally:
+            _refresh_lock.release()
+    return model
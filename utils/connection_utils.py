@@ -0,0 +1,217 @@
+# File: utils/connection_utils.py
+#
+# Imported lazily by supabase_utils.init_connection(), so httpx and the
+# supabase SDK stay out of the cold start of pages that never query.
+
+import itertools
+import random
+import threading
+import time
+
+import httpx
+import streamlit as st
+from supabase import ClientOptions, create_client
+
+# Overridable under [supabase.http] in secrets.toml
+DEFAULT_SETTINGS = {
+    "pool_size":        20,     # max open connections shared by all sessions
+    "keepalive":        10,     # idle keep-alive connections kept open
+    "keepalive_expiry": 30.0,   # seconds an idle connection is kept
+    "connect_timeout":  5.0,
+    "read_timeout":     30.0,
+    "pool_timeout":     10.0,   # wait for a free connection before failing
+    "max_retries":      3,
+    "backoff_base":     0.25,   # seconds; doubles per attempt, full jitter
+    "backoff_max":      4.0,
+    "clients":          4,      # Supabase client objects handed out per thread
+}
+
+# Only these methods are retried after the request may have reached the
+# server; POST/PATCH are retried only when the connection never opened
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES     = {429, 500, 502, 503, 504}
+
+
+def connection_settings(cfg=None) -> dict:
+    """Merges [supabase.http] secrets over DEFAULT_SETTINGS."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict((cfg or {}).get("http", {})))
+    return settings
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(response, cap: float):
+    """Parses a numeric Retry-After header, capped; None if absent or a date."""
+    value = response.headers.get("retry-after")
+    try:
+        return min(cap, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+class PoolMetrics:
+    """Thread-safe counters describing connection pool usage."""
+
+    def __init__(self, pool_size: int):
+        self._lock          = threading.Lock()
+        self.pool_size      = pool_size
+        self.in_flight      = 0
+        self.peak_in_flight = 0
+        self.requests       = 0
+        self.retries        = 0
+        self.failures       = 0
+        self.total_seconds  = 0.0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests  += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, seconds: float, failed: bool = False):
+        with self._lock:
+            self.in_flight     -= 1
+            self.total_seconds += seconds
+            self.failures      += int(failed)
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size":        self.pool_size,
+                "in_flight":        self.in_flight,
+                "peak_in_flight":   self.peak_in_flight,
+                "utilization":      round(self.in_flight / self.pool_size, 3),
+                "peak_utilization": round(self.peak_in_flight / self.pool_size, 3),
+                "requests":         self.requests,
+                "retries":          self.retries,
+                "failures":         self.failures,
+                "avg_ms":           round(1000 * self.total_seconds / self.requests, 1) if self.requests else 0.0,
+            }
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    HTTP/1.1 keep-alive transport (one shared connection pool) that retries
+    transient failures with jittered exponential backoff and feeds PoolMetrics.
+    """
+
+    def __init__(self, settings: dict, metrics: PoolMetrics):
+        super().__init__(
+            http2=False,
+            limits=httpx.Limits(
+                max_connections=settings["pool_size"],
+                max_keepalive_connections=settings["keepalive"],
+                keepalive_expiry=settings["keepalive_expiry"],
+            ),
+        )
+        self._settings = settings
+        self._metrics  = metrics
+
+    def handle_request(self, request):
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempt    = 0
+        while True:
+            self._metrics.started()
+            start = time.perf_counter()
+            try:
+                response = super().handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # Nothing reached the server, so any method is safe to retry
+                self._metrics.finished(time.perf_counter() - start, failed=True)
+                if attempt >= self._settings["max_retries"]:
+                    raise
+                delay = None
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError):
+                self._metrics.finished(time.perf_counter() - start, failed=True)
+                if not idempotent or attempt >= self._settings["max_retries"]:
+                    raise
+                delay = None
+            else:
+                self._metrics.finished(time.perf_counter() - start, failed=response.status_code >= 500)
+                if (not idempotent
+                        or response.status_code not in RETRY_STATUSES
+                        or attempt >= self._settings["max_retries"]):
+                    return response
+                delay = retry_after_seconds(response, self._settings["backoff_max"])
+                response.close()
+
+            if delay is None:
+                delay = backoff_delay(attempt, self._settings["backoff_base"], self._settings["backoff_max"])
+            self._metrics.retried()
+            time.sleep(delay)
+            attempt += 1
+
+
+class SupabaseClientPool:
+    """
+    A small set of Supabase clients over one shared, instrumented connection
+    pool. Each thread keeps the client it was first given, so concurrent
+    sessions do not contend on a single client object.
+    """
+
+    def __init__(self, url: str, key: str, settings: dict):
+        self.settings  = settings
+        self.metrics   = PoolMetrics(settings["pool_size"])
+        self.transport = RetryTransport(settings, self.metrics)
+        self._url      = url
+        self._key      = key
+        self._clients  = [None] * max(1, int(settings["clients"]))
+        self._next     = itertools.count()
+        self._lock     = threading.Lock()
+        self._local    = threading.local()
+
+    def client(self):
+        """Returns the client assigned to the calling thread."""
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._local.slot = next(self._next) % len(self._clients)
+        if self._clients[slot] is None:
+            with self._lock:
+                if self._clients[slot] is None:
+                    self._clients[slot] = self._build_client()
+        return self._clients[slot]
+
+    def _build_client(self):
+        timeout = httpx.Timeout(
+            self.settings["read_timeout"],
+            connect=self.settings["connect_timeout"],
+            pool=self.settings["pool_timeout"],
+        )
+        client = create_client(self._url, self._key, options=ClientOptions(
+            postgrest_client_timeout=timeout,
+            storage_client_timeout=int(self.settings["read_timeout"]),
+        ))
+        # Route PostgREST calls through the shared pool. The old session's
+        # base URL and headers (apikey, auth) carry over; later auth changes
+        # still land on .session.headers.
+        postgrest = client.postgrest
+        old       = postgrest.session
+        postgrest.session = httpx.Client(
+            base_url=old.base_url,
+            headers=old.headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=self.transport,
+        )
+        old.close()
+        return client
+
+
+@st.cache_resource
+def get_client_pool() -> SupabaseClientPool:
+    """Process-wide Supabase client pool (raises KeyError without credentials)."""
+    cfg = st.secrets["supabase"]
+    return SupabaseClientPool(cfg["url"], cfg["key"], connection_settings(cfg))
+
+
+def connection_metrics() -> dict:
+    """Current pool utilisation, request, retry and failure counters."""
+    return get_client_pool().metrics.snapshot()
@@ -0,0 +1,64 @@
+# File: utils/directory_utils.py
+#
+# Search-driven user pickers for the admin pages: only the page of users
+# matching what was typed is fetched, never the whole users table.
+
+import streamlit as st
+
+from utils import supabase_utils as su
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def cached_search_users(query: str, page: int, page_size: int):
+    """search_users() memoised briefly, so reruns while typing reuse results."""
+    return su.search_users(query, page, page_size)
+
+
+def user_label(user: dict) -> str:
+    return f"{user['name']} ({user['username']})"
+
+
+def user_picker(key: str, label: str = "User", page_size: int = 20):
+    """
+    Search box plus a selectbox over the first `page_size` matches.
+    Returns the chosen user dict (id, username, name, email, role,
+    default_category_id), or None when nothing matches.
+    """
+    query = st.text_input(f"Search {label.lower()}", key=f"{key}_query",
+                          placeholder="Start of username, name or email")
+    users, total = cached_search_users(query.strip(), 0, page_size)
+    if not users:
+        st.caption("No matching users.")
+        return None
+    by_id  = {u["id"]: u for u in users}
+    chosen = st.selectbox(label, list(by_id), format_func=lambda i: user_label(by_id[i]), key=f"{key}_select")
+    if total > len(users):
+        st.caption(f"Showing the first {len(users)} of {total:,} matches; type more to narrow them down.")
+    return by_id.get(chosen)
+
+
+def user_directory_page(key: str, page_size: int = 25):
+    """
+    Search box and one page of matching users with Previous/Next controls.
+    Returns (users_on_page, total_matches).
+    """
+    query = st.text_input("Search users", key=f"{key}_query",
+                          placeholder="Start of username, name or email").strip()
+    # A new search starts again from the first page
+    if st.session_state.get(f"{key}_last_query") != query:
+        st.session_state[f"{key}_last_query"] = query
+        st.session_state[f"{key}_page"] = 0
+    page = st.session_state.get(f"{key}_page", 0)
+
+    users, total = cached_search_users(query, page, page_size)
+    pages = max(1, -(-total // page_size))
+
+    col_prev, col_info, col_next = st.columns([1, 3, 1])
+    if col_prev.button("◀ Previous", key=f"{key}_prev", disabled=page == 0):
+        st.session_state[f"{key}_page"] = page - 1
+        st.rerun()
+    col_info.caption(f"Page {page + 1} of {pages} · {total:,} user(s)")
+    if col_next.button("Next ▶", key=f"{key}_next", disabled=page + 1 >= pages):
+        st.session_state[f"{key}_page"] = page + 1
+        st.rerun()
+    return users, total
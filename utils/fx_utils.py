@@ -0,0 +1,119 @@
+# File: utils/fx_utils.py
+#
+# Daily FX rates from a CSV file (default data/fx_rates.csv, set `path`
+# under [fx] in secrets.toml) with columns date, currency, rate: how many
+# units of the base currency one unit of `currency` bought that day, e.g.
+#
+#   date,currency,rate
+#   2025-01-02,USD,1.4389
+#
+# data/fx_rates.example.csv shows the format. Without a rate file only
+# base-currency amounts convert; every other row comes back unconverted.
+# pandas is imported inside the functions, so pages importing this module
+# (the dashboard) do not pay for it at load time.
+
+import os
+from typing import TYPE_CHECKING
+
+import streamlit as st
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Overridable under [fx] in secrets.toml
+DEFAULT_RATES_PATH   = "data/fx_rates.csv"
+DEFAULT_BASE         = "CAD"   # currency the rate file is quoted in
+DEFAULT_REPORTING    = "CAD"   # currency dashboards/exports total in
+
+
+def fx_settings() -> dict:
+    cfg = st.secrets.get("fx", {})
+    return {
+        "path":      cfg.get("path", DEFAULT_RATES_PATH),
+        "base":      cfg.get("base_currency", DEFAULT_BASE),
+        "reporting": cfg.get("reporting_currency", DEFAULT_REPORTING),
+    }
+
+
+class FxRates:
+    """
+    Daily FX table: `rate` is how many units of the base currency one unit
+    of `currency` buys on `date`. `table` is sorted by date for merge_asof.
+    """
+
+    def __init__(self, frame: "pd.DataFrame", base: str):
+        import pandas as pd
+
+        frame = frame.assign(
+            date=pd.to_datetime(frame["date"]).astype("datetime64[ns]"),
+            currency=frame["currency"].astype(str).str.upper(),
+            rate=frame["rate"].astype("float64"),
+        )
+        self.base  = base
+        self.table = frame[["date", "currency", "rate"]].sort_values("date", kind="stable").reset_index(drop=True)
+
+    def to_base_rates(self, dates: "pd.Series", currencies: "pd.Series") -> "pd.Series":
+        """
+        Vectorised rate lookup for aligned date/currency columns: one
+        merge_asof per call, using the last rate on or before each date
+        (or the first known rate for dates before the table starts).
+        """
+        import pandas as pd
+
+        left = pd.DataFrame({
+            "date":     pd.to_datetime(dates, errors="coerce").astype("datetime64[ns]").to_numpy(),
+            "currency": currencies.astype(str).str.upper().to_numpy(),
+            "_pos":     range(len(dates)),
+        })
+        known = left["date"].notna()
+        rates = pd.Series(float("nan"), index=left.index)
+        if known.any() and not self.table.empty:
+            ordered = left[known].sort_values("date", kind="stable")
+            for direction in ("backward", "forward"):
+                missing = ordered[rates.loc[ordered["_pos"]].isna().to_numpy()]
+                if missing.empty:
+                    break
+                merged = pd.merge_asof(missing, self.table, on="date", by="currency", direction=direction)
+                rates.loc[merged["_pos"].to_numpy()] = merged["rate"].to_numpy()
+        rates[left["currency"].to_numpy() == self.base] = 1.0
+        rates.index = dates.index
+        return rates
+
+
+@st.cache_resource
+def _load_fx_rates(path: str, base: str, mtime: float) -> FxRates:
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return FxRates(pd.DataFrame({"date": [], "currency": [], "rate": []}), base)
+    return FxRates(pd.read_csv(path, usecols=["date", "currency", "rate"]), base)
+
+
+def get_fx_rates() -> FxRates:
+    """The process-wide rate table; reloaded only when the rate file changes."""
+    cfg   = fx_settings()
+    mtime = os.path.getmtime(cfg["path"]) if os.path.exists(cfg["path"]) else 0.0
+    return _load_fx_rates(cfg["path"], cfg["base"], mtime)
+
+
+def convert_amounts(df: "pd.DataFrame", to_currency: str = None, amount_col: str = "amount",
+                    currency_col: str = "currency", date_col: str = "expense_date", rates: FxRates = None) -> "pd.Series":
+    """
+    Converts a whole column of amounts into `to_currency` (the reporting
+    currency by default) in one vectorised pass. Rows without a usable rate
+    come back as NaN so callers can flag rather than silently mis-total them.
+    """
+    import pandas as pd
+
+    rates       = rates or get_fx_rates()
+    to_currency = (to_currency or fx_settings()["reporting"]).upper()
+    if df.empty:
+        return pd.Series(dtype="float64", index=df.index)
+
+    amounts  = pd.to_numeric(df[amount_col], errors="coerce")
+    to_base  = rates.to_base_rates(df[date_col], df[currency_col].fillna(rates.base))
+    in_base  = amounts * to_base
+    if to_currency == rates.base:
+        return in_base
+    target = rates.to_base_rates(df[date_col], pd.Series(to_currency, index=df.index))
+    return in_base / target
@@ -0,0 +1,60 @@
+# File: utils/grid_utils.py
+
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+@dataclass
+class GridDiff:
+    """Changes an edited grid makes to the rows it was loaded from."""
+    inserts: list = field(default_factory=list)   # new rows, without ids
+    updates: list = field(default_factory=list)   # changed rows, with ids
+    deletes: list = field(default_factory=list)   # ids of removed rows
+
+    def __bool__(self):
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def summary(self) -> str:
+        return f"{len(self.inserts)} added, {len(self.updates)} changed, {len(self.deletes)} deleted"
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return value.strip() if isinstance(value, str) else value
+
+
+def diff_grid(original: list, edited: pd.DataFrame, fields: list, key: str = "id") -> GridDiff:
+    """
+    Compares the rows a st.data_editor was loaded with against what it
+    returned (num_rows="dynamic"): rows without a key are inserts, keyed rows
+    whose `fields` changed are updates, keys that disappeared are deletes.
+    Blank rows added and left empty are ignored.
+    """
+    before = {row[key]: row for row in original}
+    diff   = GridDiff()
+    seen   = set()
+    for row in edited.to_dict("records"):
+        values = {f: _clean(row.get(f)) for f in fields}
+        row_key = _clean(row.get(key))
+        if isinstance(row_key, float) and row_key.is_integer():
+            row_key = int(row_key)  # blank new rows turn an integer id column into floats
+        if row_key is None:
+            if any(v not in (None, "") for v in values.values()):
+                diff.inserts.append(values)
+            continue
+        seen.add(row_key)
+        old = before.get(row_key)
+        if old is not None and any(values[f] != _clean(old.get(f)) for f in fields):
+            diff.updates.append({key: row_key, **values})
+    diff.deletes = [k for k in before if k not in seen]
+    return diff
+
+
+def duplicate_values(edited: pd.DataFrame, column: str) -> list:
+    """Non-blank values that appear more than once in `column` (case-insensitive)."""
+    values = edited[column].dropna().astype(str).str.strip()
+    values = values[values != ""]
+    lowered = values.str.lower()
+    return sorted(values[lowered.duplicated(keep=False)].unique())
@@ -0,0 +1,18 @@
+# File: utils/hash_utils.py
+#
+# Kept free of streamlit/pandas imports: this module is what password
+# hashing worker processes import.
+
+import bcrypt
+
+BCRYPT_MAX_BYTES = 72   # bcrypt ignores (5.x: rejects) anything longer
+
+
+def hash_password(password: str, rounds: int = 12) -> str:
+    """bcrypt hash of `password` as a UTF-8 string."""
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def hash_passwords(passwords: list, rounds: int = 12) -> list:
+    """Hashes a chunk of passwords in one worker call (amortises IPC)."""
+    return [hash_password(p, rounds) for p in passwords]
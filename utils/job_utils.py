@@ -0,0 +1,113 @@
+# File: utils/job_utils.py
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils import ocr_utils
+from utils.quota_utils import current_caller, quota_context
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE    = "done"
+JOB_FAILED  = "failed"
+
+
+def content_hash(file_bytes) -> str:
+    """SHA-256 of the receipt bytes; identical uploads share one OCR job."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class OcrJobQueue:
+    """
+    Process-wide queue that runs extract_and_parse_bytes on a small worker
+    pool, so OCR survives Streamlit reruns instead of blocking the script.
+
+    Jobs are keyed by content hash. A finished job keeps its result until
+    every session that submitted it has fetched it (or until result_ttl
+    seconds pass, so abandoned uploads do not pile up).
+    """
+
+    def __init__(self, max_workers: int = 2, result_ttl: int = 3600):
+        self._executor   = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-job")
+        self._jobs       = {}
+        self._lock       = threading.Lock()
+        self._result_ttl = result_ttl
+
+    def submit(self, file_bytes, mime_type: str) -> str:
+        """
+        Queue a receipt for OCR and return its job id immediately. Its API
+        calls are charged to the submitting session.
+        """
+        job_id = content_hash(file_bytes)
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] != JOB_FAILED:
+                job["waiters"] += 1
+                return job_id
+            self._jobs[job_id] = {
+                "status":       JOB_PENDING,
+                "submitted_at": time.time(),
+                "finished_at":  None,
+                "waiters":      1,
+                "result":       None,
+                "error":        None,
+            }
+        self._executor.submit(self._run, job_id, bytes(file_bytes), mime_type, current_caller())
+        return job_id
+
+    def poll(self, job_id: str) -> tuple:
+        """
+        (status, result) in one step under the queue lock: (None, None) if
+        the job is unknown (fetched by every submitter, or expired), (status,
+        None) while it runs, and (status, (raw_text, parsed)) once it has
+        finished. The result is released once all submitters have polled it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, None
+            if job["status"] not in (JOB_DONE, JOB_FAILED):
+                return job["status"], None
+            job["waiters"] -= 1
+            if job["waiters"] <= 0:
+                del self._jobs[job_id]
+        if job["status"] == JOB_FAILED:
+            return JOB_FAILED, (job["error"], {"error": job["error"]})
+        return JOB_DONE, job["result"]
+
+    def _run(self, job_id, file_bytes, mime_type, session):
+        with self._lock:
+            self._jobs[job_id]["status"] = JOB_RUNNING
+        try:
+            with quota_context(session):
+                result, status, error = ocr_utils.extract_and_parse_bytes(file_bytes, mime_type), JOB_DONE, None
+        except BaseException as e:  # st.stop() inside the OCR clients raises a BaseException
+            result, status, error = None, JOB_FAILED, f"A critical error occurred: {e}"
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, finished_at=time.time())
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [
+            jid for jid, job in self._jobs.items()
+            if job["finished_at"] and now - job["finished_at"] > self._result_ttl
+        ]
+        for jid in expired:
+            del self._jobs[jid]
+
+
+@st.cache_resource
+def get_ocr_job_queue() -> OcrJobQueue:
+    """Returns the process-wide OCR job queue."""
+    cfg = st.secrets.get("ocr", {})
+    return OcrJobQueue(
+        max_workers=int(cfg.get("workers", 2)),
+        result_ttl=int(cfg.get("result_ttl", 3600)),
+    )
@@ -0,0 +1,201 @@
+# File: utils/journal_utils.py
+#
+# GL journal export for period close. One journal entry per approved
+# report: a debit per line item (or per expense when it has none) to its
+# category's GL account, a debit per tax, and one credit to the employee
+# payable account. Reports are paged from Supabase and every entry is
+# written as soon as it is built, so memory does not grow with the period.
+#
+#   python -m utils.journal_utils 2025-01-01 2025-02-01 --format xml --out jan.xml
+
+import argparse
+import csv
+import io
+import json
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+from xml.sax.saxutils import XMLGenerator
+
+import streamlit as st
+
+from utils import supabase_utils as su
+
+# Overridable under [journal] in secrets.toml. PST is not recoverable, so
+# by default it is expensed to the same account as the purchase.
+DEFAULT_ACCOUNTS = {
+    "payable_account":       "2100",   # due to employees
+    "gst_account":           "1180",   # GST input tax credits
+    "hst_account":           "1180",   # HST input tax credits
+    "pst_account":           "",       # "" = expense with the purchase
+    "uncategorised_account": "9999",   # expenses without a category/GL account
+}
+
+CSV_COLUMNS = ["entry", "date", "report", "employee", "expense_id", "account", "debit", "credit", "currency", "memo"]
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def journal_settings() -> dict:
+    settings = dict(DEFAULT_ACCOUNTS)
+    settings.update(dict(st.secrets.get("journal", {})))
+    return settings
+
+
+def _money(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENT, ROUND_HALF_UP)
+
+
+def _line_items(raw) -> list:
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    return [item for item in raw if isinstance(item, dict)] if isinstance(raw, list) else []
+
+
+def expense_postings(expense: dict, gl_accounts: dict, accounts: dict) -> list:
+    """
+    Debit postings for one expense as (account, amount, memo). Line items
+    are posted at their price; whatever of the pre-tax amount they do not
+    cover goes to the expense's own category.
+    """
+    fallback = accounts["uncategorised_account"]
+    account  = gl_accounts.get(expense.get("category_id")) or fallback
+    vendor   = expense.get("vendor") or "expense"
+    taxes    = {name: _money(expense.get(f"{name}_amount")) for name in ("gst", "pst", "hst")}
+    net      = _money(expense.get("amount")) - sum(taxes.values())
+
+    postings = []
+    for item in _line_items(expense.get("line_items")):
+        price = _money(item.get("price"))
+        if price:
+            item_account = gl_accounts.get(item.get("category_id")) or account
+            postings.append((item_account, price, f"{vendor}: {item.get('description') or 'line item'}"))
+    remainder = net - sum(p[1] for p in postings)
+    if remainder:
+        postings.append((account, remainder, f"{vendor}: {expense.get('description') or 'unitemised'}"))
+    for name, amount in taxes.items():
+        if amount:
+            postings.append((accounts[f"{name}_account"] or account, amount, f"{vendor}: {name.upper()}"))
+    return postings
+
+
+def iter_journal_entries(start, end, page_size: int = 200, accounts: dict = None):
+    """
+    Yields one balanced entry per approved report submitted in [start, end):
+    {"entry", "date", "report", "employee", "lines": [...]}. Holds one page
+    of reports and their expenses in memory at a time.
+    """
+    accounts    = accounts or journal_settings()
+    gl_accounts = {c["id"]: c.get("gl_account") for c in su.get_all_categories()}
+    after_id    = None
+    while True:
+        reports = su.get_approved_reports_page(start, end, after_id, page_size)
+        if not reports:
+            return
+        by_report = {}
+        for expense in su.get_expenses_for_reports([r["id"] for r in reports]):
+            by_report.setdefault(expense["report_id"], []).append(expense)
+
+        for report in reports:
+            lines = []
+            for expense in by_report.get(report["id"], []):
+                currency = expense.get("currency") or "CAD"
+                total    = Decimal(0)
+                for account, amount, memo in expense_postings(expense, gl_accounts, accounts):
+                    lines.append({"expense_id": expense["id"], "account": account, "debit": amount,
+                                  "credit": ZERO, "currency": currency, "memo": memo})
+                    total += amount
+                if total:
+                    lines.append({"expense_id": expense["id"], "account": accounts["payable_account"],
+                                  "debit": ZERO, "credit": total, "currency": currency,
+                                  "memo": f"{expense.get('vendor') or 'expense'}: due to employee"})
+            if lines:
+                yield {
+                    "entry":    f"EXP-{report['id']}",
+                    "date":     str(report.get("submission_date") or "")[:10],
+                    "report":   report.get("report_name") or "",
+                    "employee": (report.get("user") or {}).get("name") or "",
+                    "lines":    lines,
+                }
+        if len(reports) < page_size:
+            return
+        after_id = reports[-1]["id"]
+
+
+def write_journal_csv(out, entries) -> int:
+    """Writes entries to a text stream as flat CSV postings; returns the entry count."""
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for entry in entries:
+        for line in entry["lines"]:
+            writer.writerow([entry["entry"], entry["date"], entry["report"], entry["employee"],
+                             line["expense_id"], line["account"], line["debit"], line["credit"],
+                             line["currency"], line["memo"]])
+        count += 1
+    return count
+
+
+def write_journal_xml(out, entries, start=None, end=None) -> int:
+    """
+    Writes entries to a binary stream as XML, element by element
+    (XMLGenerator), so no document tree is ever built. Returns the entry count.
+    """
+    xml = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement("Journal", {"periodStart": str(start or ""), "periodEnd": str(end or "")})
+    count = 0
+    for entry in entries:
+        xml.ignorableWhitespace("\n  ")
+        xml.startElement("JournalEntry", {k: entry[k] for k in ("entry", "date", "report", "employee")})
+        for line in entry["lines"]:
+            xml.ignorableWhitespace("\n    ")
+            xml.startElement("Line", {
+                "account":   str(line["account"]),
+                "debit":     str(line["debit"]),
+                "credit":    str(line["credit"]),
+                "currency":  line["currency"],
+                "expenseId": str(line["expense_id"]),
+            })
+            xml.characters(line["memo"])
+            xml.endElement("Line")
+        xml.ignorableWhitespace("\n  ")
+        xml.endElement("JournalEntry")
+        count += 1
+    xml.ignorableWhitespace("\n")
+    xml.endElement("Journal")
+    xml.endDocument()
+    return count
+
+
+def export_journal(out, start, end, fmt: str = "csv", page_size: int = 200) -> int:
+    """
+    Streams the journal for [start, end) to `out` (binary stream) as "csv"
+    or "xml"; returns the number of journal entries written.
+    """
+    entries = iter_journal_entries(start, end, page_size)
+    if fmt == "xml":
+        return write_journal_xml(out, entries, start, end)
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    try:
+        return write_journal_csv(text, entries)
+    finally:
+        text.detach()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export approved reports as GL journal entries.")
+    parser.add_argument("start", help="first day of the period (YYYY-MM-DD)")
+    parser.add_argument("end", help="day after the period (YYYY-MM-DD)")
+    parser.add_argument("--format", choices=("csv", "xml"), default="csv")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    if args.out:
+        with open(args.out, "wb") as f:
+            n = export_journal(f, args.start, args.end, args.format)
+    else:
+        n = export_journal(sys.stdout.buffer, args.start, args.end, args.format)
+    print(f"{n} journal entries", file=sys.stderr)
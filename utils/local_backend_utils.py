@@ -0,0 +1,666 @@
+# File: utils/local_backend_utils.py
+#
+# In-memory stand-in for the Supabase client, for load tests and offline
+# development. It implements the part of the supabase-py query builder this
+# app uses: select with embedded resources (aliases, !inner / !left, fk
+# hints, (count)), eq/neq/gt/gte/lt/lte/in_/is_/not_/or_ filters, order,
+# limit/range, count="exact", maybe_single, insert/update/upsert/delete,
+# and a storage bucket. Every executed query is counted, per process and
+# per Streamlit session (st.session_state["_query_count"]).
+#
+# Enabled with backend = "local" under [supabase] in secrets.toml, or
+# EXPENSE_BACKEND=local. [supabase.local] sizes the seeded demo data and
+# adds an artificial per-query latency (latency_ms) to mimic the network.
+
+import copy
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import streamlit as st
+
+# Many-to-one foreign keys: table -> {referenced table: fk column}
+RELATIONS = {
+    "reports":  {"users": "user_id"},
+    "expenses": {"reports": "report_id", "categories": "category_id"},
+    "users":    {"categories": "default_category_id", "departments": "department_id"},
+}
+UNIQUE = {"users": ("username",), "categories": ("name",), "departments": ("name",)}
+# Tables with an updated_at column and a deleted_rows tombstone trigger (sql/005_snapshot_tracking.sql)
+TRACKED = ("reports", "expenses")
+# Query action -> change event type published for each written row
+WRITE_EVENTS = {"insert": "INSERT", "upsert": "UPDATE", "update": "UPDATE", "delete": "DELETE"}
+
+# Overridable under [supabase.local] in secrets.toml
+DEFAULT_SETTINGS = {
+    "users":               50,
+    "reports_per_user":    6,
+    "expenses_per_report": 4,
+    "password":            "password",   # every seeded user's password
+    "latency_ms":          0,
+    "seed":                0,
+}
+
+
+def local_backend_enabled() -> bool:
+    backend = os.environ.get("EXPENSE_BACKEND") or st.secrets.get("supabase", {}).get("backend", "")
+    return backend == "local"
+
+
+class LocalAPIError(Exception):
+    """Mirrors postgrest.APIError closely enough for the app's error messages."""
+
+    def __init__(self, message: str, code: str = None):
+        super().__init__(message)
+        self.message = message
+        self.code    = code
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data  = data
+        self.count = count
+
+
+# --- select parsing ---
+
+_EMBED = re.compile(r"^(?:(\w+):)?(\w+)(?:!(\w+))?\((.*)\)$", re.S)
+
+
+def _split_top(text: str) -> list:
+    """Splits on commas outside parentheses."""
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_select(text: str) -> list:
+    """
+    ("*",), ("col", alias, name), ("count",) or
+    ("embed", alias, table, hint, subfields) per selected item.
+    """
+    fields = []
+    for part in _split_top(text or "*"):
+        match = _EMBED.match(part)
+        if part == "*":
+            fields.append(("*",))
+        elif part == "count":
+            fields.append(("count",))
+        elif match:
+            alias, table, hint, inner = match.groups()
+            fields.append(("embed", alias or table, table, hint, _parse_select(inner)))
+        else:
+            alias, _, name = part.rpartition(":")
+            fields.append(("col", alias or name, name))
+    return fields
+
+
+# --- comparisons ---
+
+def _coerce(value, like):
+    """Coerces a filter value to the type of the column value, as PostgREST does."""
+    if value is None or like is None or isinstance(value, type(like)):
+        return value
+    if isinstance(like, bool):
+        return str(value).lower() in ("true", "t", "1")
+    if isinstance(like, (int, float)):
+        try:
+            return type(like)(float(value)) if isinstance(like, int) and float(value).is_integer() else float(value)
+        except (TypeError, ValueError):
+            return value
+    return str(value)
+
+
+def _ilike(pattern: str):
+    """LIKE pattern (with * for %) as a regex; a backslash makes the next character literal."""
+    regex, escaped = [], False
+    for ch in str(pattern):
+        if escaped or ch not in "*%_\\":
+            regex.append(re.escape(ch))
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        else:
+            regex.append("." if ch == "_" else ".*")
+    return re.compile(f"^{''.join(regex)}$", re.I | re.S)
+
+
+def _compare(op: str, actual, value) -> bool:
+    if op == "is":
+        wanted = {"null": None, "true": True, "false": False}.get(str(value).lower(), value)
+        return actual is wanted if wanted in (None, True, False) else actual == wanted
+    if op == "in":
+        return any(actual == _coerce(v, actual) for v in value)
+    if op in ("ilike", "like"):
+        return actual is not None and bool(_ilike(value).match(str(actual)))
+    if actual is None:
+        return False
+    value = _coerce(value, actual)
+    try:
+        return {
+            "eq":  lambda: actual == value,
+            "neq": lambda: actual != value,
+            "gt":  lambda: actual > value,
+            "gte": lambda: actual >= value,
+            "lt":  lambda: actual < value,
+            "lte": lambda: actual <= value,
+        }[op]()
+    except TypeError:
+        return False
+
+
+def _parse_or(text: str) -> list:
+    """"a.eq.1,b.ilike.x*" -> [("a", "eq", "1"), ("b", "ilike", "x*")]."""
+    conditions = []
+    for part in _split_top(text):
+        column, op, value = part.split(".", 2)
+        if op == "in":
+            value = [v.strip().strip('"') for v in value.strip("()").split(",")]
+        conditions.append((column, op, value))
+    return conditions
+
+
+# --- the database ---
+
+class LocalDatabase:
+    """Tables of dict rows keyed by id, guarded by one lock."""
+
+    def __init__(self, latency_ms: float = 0):
+        self.tables   = {}
+        self.buckets  = {}
+        self.uploads  = {}   # resumable uploads in progress, by URL
+        self.listeners = []  # listener(table, type, record) per written row, like a change feed
+        self.latency  = latency_ms / 1000.0
+        self.lock     = threading.RLock()
+        self._ids     = {}
+        self.queries  = 0
+        self.counting = True
+
+    def rows(self, table: str) -> dict:
+        return self.tables.setdefault(table, {})
+
+    def next_id(self, table: str) -> int:
+        counter = self._ids.get(table)
+        if counter is None:
+            counter = self._ids[table] = itertools.count(max(self.rows(table), default=0) + 1)
+        return next(counter)
+
+    def count_query(self):
+        """Counts a round trip and waits out the simulated network latency (outside the lock)."""
+        if not self.counting:
+            return
+        with self.lock:
+            self.queries += 1
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            if get_script_run_ctx(suppress_warning=True) is not None:
+                st.session_state["_query_count"] = st.session_state.get("_query_count", 0) + 1
+        except Exception:
+            pass
+        if self.latency:
+            time.sleep(self.latency)
+
+    def notify(self, table: str, type: str, rows: list):
+        """Publishes written rows to the listeners (outside the lock)."""
+        for row in rows:
+            for listener in list(self.listeners):
+                listener(table, type, row)
+
+    # --- embeds ---
+
+    def _relation(self, table: str, target: str, hint: str):
+        """("one", fk) when `table` points at `target`, ("many", fk) when `target` points back."""
+        hint = hint if hint not in (None, "inner", "left") else None
+        if target in RELATIONS.get(table, {}) and (hint is None or hint == RELATIONS[table][target]):
+            return "one", RELATIONS[table][target]
+        if table in RELATIONS.get(target, {}):
+            return "many", hint or RELATIONS[target][table]
+        raise LocalAPIError(f"Could not find a relationship between '{table}' and '{target}'", "PGRST200")
+
+    def project(self, table: str, row: dict, fields: list) -> dict:
+        out = {}
+        for field in fields:
+            if field[0] == "*":
+                out.update(row)
+            elif field[0] == "col":
+                out[field[1]] = row.get(field[2])
+            elif field[0] == "embed":
+                _, alias, target, hint, sub = field
+                kind, fk = self._relation(table, target, hint)
+                if kind == "one":
+                    parent = self.rows(target).get(row.get(fk))
+                    out[alias] = self.project(target, parent, sub) if parent else None
+                else:
+                    children = [r for r in self.rows(target).values() if r.get(fk) == row.get("id")]
+                    if sub == [("count",)]:
+                        out[alias] = [{"count": len(children)}]
+                    else:
+                        out[alias] = [self.project(target, c, sub) for c in children]
+        return out
+
+
+class LocalQuery:
+    """One chained request against a table; `execute()` runs it."""
+
+    def __init__(self, db: LocalDatabase, table: str):
+        self.db       = db
+        self.table    = table
+        self.action   = "select"
+        self.fields   = _parse_select("*")
+        self.payload  = None
+        self.count    = None
+        self.filters  = []   # (column, op, value, negated) or ("or", conditions)
+        self.orders   = []
+        self.offset   = 0
+        self.limit_n  = None
+        self._single  = None
+        self._negate  = False
+        self.on_conflict = "id"
+
+    # --- actions ---
+
+    def select(self, columns: str = "*", count: str = None):
+        self.fields = _parse_select(columns)
+        self.count  = count
+        return self
+
+    def insert(self, rows, **_):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", **_):
+        self.action, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values: dict, **_):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self, **_):
+        self.action = "delete"
+        return self
+
+    # --- filters ---
+
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value, self._negate))
+        self._negate = False
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def eq(self, column, value):    return self._filter(column, "eq", value)
+    def neq(self, column, value):   return self._filter(column, "neq", value)
+    def gt(self, column, value):    return self._filter(column, "gt", value)
+    def gte(self, column, value):   return self._filter(column, "gte", value)
+    def lt(self, column, value):    return self._filter(column, "lt", value)
+    def lte(self, column, value):   return self._filter(column, "lte", value)
+    def in_(self, column, values):  return self._filter(column, "in", list(values))
+    def is_(self, column, value):   return self._filter(column, "is", value)
+    def ilike(self, column, value): return self._filter(column, "ilike", value)
+    def like(self, column, value):  return self._filter(column, "like", value)
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def or_(self, filters: str, **_):
+        self.filters.append(("or", _parse_or(filters)))
+        return self
+
+    # --- modifiers ---
+
+    def order(self, column: str, desc: bool = False, **_):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int, **_):
+        self.limit_n = n
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self.offset, self.limit_n = start, end - start + 1
+        return self
+
+    def maybe_single(self):
+        self._single = "maybe"
+        return self
+
+    def single(self):
+        self._single = "one"
+        return self
+
+    # --- execution ---
+
+    def _matches(self, row: dict, projected: dict = None) -> bool:
+        """Whether `row` passes every filter; embedded columns are read from `projected`."""
+        for f in self.filters:
+            if f[0] == "or":
+                if not any(_compare(op, row.get(column), value) for column, op, value in f[1]):
+                    return False
+                continue
+            column, op, value, negated = f
+            if "." in column:
+                embed, _, sub = column.partition(".")
+                parent = (projected or {}).get(embed)
+                ok = parent is not None and _compare(op, parent.get(sub), value)
+            else:
+                ok = _compare(op, row.get(column), value)
+            if ok == negated:
+                return False
+        return True
+
+    def _inner_embeds(self) -> list:
+        return [f[1] for f in self.fields if f[0] == "embed" and f[3] == "inner"]
+
+    def _selected(self) -> list:
+        db, out = self.db, []
+        inner = self._inner_embeds()
+        # Filters on embedded columns ("report.user_id") need the projected row
+        on_embeds = any(f[0] != "or" and "." in f[0] for f in self.filters)
+        for row in db.rows(self.table).values():
+            if not on_embeds and not self._matches(row):
+                continue
+            projected = db.project(self.table, row, self.fields)
+            if on_embeds and not self._matches(row, projected):
+                continue
+            if any(not projected.get(alias) for alias in inner):
+                continue
+            out.append((row, projected))
+        for column, desc in reversed(self.orders):
+            present = [p for p in out if p[0].get(column) is not None]
+            missing = [p for p in out if p[0].get(column) is None]
+            present.sort(key=lambda p: p[0][column], reverse=desc)
+            out = missing + present if desc else present + missing
+        return out
+
+    def _check_unique(self, row: dict, ignore_id=None):
+        for column in UNIQUE.get(self.table, ()):
+            value = row.get(column)
+            if value is None:
+                continue
+            for other in self.db.rows(self.table).values():
+                if other["id"] != ignore_id and other.get(column) == value:
+                    raise LocalAPIError(
+                        f'duplicate key value violates unique constraint "{self.table}_{column}_key"', "23505")
+
+    def _insert(self, rows: list) -> list:
+        table, stored = self.db.rows(self.table), []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", self.db.next_id(self.table))
+            row.setdefault("created_at", datetime.now().isoformat())
+            if self.table in TRACKED:
+                row.setdefault("updated_at", row["created_at"])
+            self._check_unique(row)
+            table[row["id"]] = row
+            stored.append(copy.deepcopy(row))
+        return stored
+
+    def _touch(self, row: dict):
+        if self.table in TRACKED:
+            row["updated_at"] = datetime.now().isoformat()
+
+    def _run(self):
+        db, table = self.db, self.db.rows(self.table)
+        if self.action == "insert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            snapshot = dict(table)
+            try:
+                return self._insert(rows), None
+            except LocalAPIError:
+                table.clear()
+                table.update(snapshot)   # all-or-nothing, like one INSERT statement
+                raise
+        if self.action == "upsert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            out = []
+            for row in rows:
+                existing = table.get(row.get(self.on_conflict)) if self.on_conflict == "id" else next(
+                    (r for r in table.values() if r.get(self.on_conflict) == row.get(self.on_conflict)), None)
+                if existing is None:
+                    out += self._insert([row])
+                else:
+                    self._check_unique({**existing, **row}, existing["id"])
+                    existing.update(row)
+                    self._touch(existing)
+                    out.append(copy.deepcopy(existing))
+            return out, None
+        if self.action == "update":
+            out = []
+            for row in [r for r in table.values() if self._matches(r)]:
+                self._check_unique({**row, **self.payload}, row["id"])
+                row.update(self.payload)
+                self._touch(row)
+                out.append(copy.deepcopy(row))
+            return out, None
+        if self.action == "delete":
+            doomed = [r for r in table.values() if self._matches(r)]
+            for row in doomed:
+                del table[row["id"]]
+            if self.table in TRACKED:
+                tombstones = db.rows("deleted_rows")
+                for row in doomed:
+                    tomb_id = db.next_id("deleted_rows")
+                    tombstones[tomb_id] = {"id": tomb_id, "deleted_at": datetime.now().isoformat(),
+                                           "table_name": self.table, "row_id": row["id"]}
+            return copy.deepcopy(doomed), None
+
+        selected = self._selected()
+        count    = len(selected) if self.count else None
+        end      = None if self.limit_n is None else self.offset + self.limit_n
+        data     = [p for _, p in selected[self.offset:end]]
+        fields   = self.fields
+        if fields == [("count",)]:
+            data = [{"count": len(selected)}]
+        return data, count
+
+    def execute(self) -> LocalResponse:
+        self.db.count_query()
+        with self.db.lock:
+            data, count = self._run()
+        if self.action in WRITE_EVENTS and data:
+            self.db.notify(self.table, WRITE_EVENTS[self.action], data)
+        if self._single is not None:
+            if len(data) > 1 or (self._single == "one" and not data):
+                raise LocalAPIError("JSON object requested, multiple (or no) rows returned", "PGRST116")
+            return LocalResponse(data[0] if data else None, count)
+        return LocalResponse(data, count)
+
+
+class LocalBucket:
+    def __init__(self, db: LocalDatabase, name: str):
+        self.db    = db
+        self.files = db.buckets.setdefault(name, {})
+        self.name  = name
+
+    def upload(self, path: str, file, file_options: dict = None):
+        self.db.count_query()
+        with self.db.lock:
+            if path in self.files:
+                raise LocalAPIError("The resource already exists", "409")
+            self.files[path] = bytes(file)
+        return {"path": path}
+
+    def download(self, path: str) -> bytes:
+        self.db.count_query()
+        with self.db.lock:
+            if path not in self.files:
+                raise LocalAPIError("Object not found", "404")
+            return self.files[path]
+
+    def remove(self, paths: list):
+        self.db.count_query()
+        with self.db.lock:
+            return [{"name": p} for p in paths if self.files.pop(p, None) is not None]
+
+    def get_public_url(self, path: str) -> str:
+        return f"local://{self.name}/{path}"
+
+    def resumable(self) -> "LocalResumable":
+        return LocalResumable(self)
+
+
+class LocalResumable:
+    """Resumable uploads with TUS semantics (see upload_utils.TusClient)."""
+
+    def __init__(self, bucket: LocalBucket):
+        self.bucket = bucket
+        self.db     = bucket.db
+
+    def create(self, bucket: str, path: str, size: int, content_type: str) -> str:
+        self.db.count_query()
+        with self.db.lock:
+            if path in self.bucket.files:
+                raise LocalAPIError("The resource already exists", "409")
+            url = f"local://{bucket}/upload/{len(self.db.uploads) + 1}"
+            self.db.uploads[url] = {"path": path, "size": size, "received": 0, "data": bytearray()}
+        return url
+
+    def offset(self, url: str) -> int:
+        self.db.count_query()
+        with self.db.lock:
+            return self.db.uploads[url]["received"]
+
+    def send(self, url: str, offset: int, part) -> int:
+        self.db.count_query()
+        with self.db.lock:
+            upload = self.db.uploads[url]
+            if offset != upload["received"]:
+                raise LocalAPIError("Upload-Offset does not match", "409")
+            upload["data"] += part
+            upload["received"] += len(part)
+            if upload["received"] >= upload["size"]:
+                self.bucket.files[upload["path"]] = bytes(upload["data"])
+                upload["data"] = None
+            return upload["received"]
+
+
+class LocalStorage:
+    def __init__(self, db: LocalDatabase):
+        self.db = db
+
+    def from_(self, bucket: str) -> LocalBucket:
+        return LocalBucket(self.db, bucket)
+
+
+class LocalClient:
+    """Drop-in for supabase.Client over a LocalDatabase."""
+
+    def __init__(self, db: LocalDatabase):
+        self.db      = db
+        self.storage = LocalStorage(db)
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self.db, name)
+
+    from_ = table
+
+
+# --- demo data ---
+
+CATEGORIES = [
+    ("Airfare", "6110"), ("Hotel", "6120"), ("Meals", "6130"), ("Ground Transport", "6140"),
+    ("Office Supplies", "6210"), ("Software", "6220"), ("Training", "6310"), ("Client Entertainment", "6410"),
+]
+DEPARTMENTS = ["Finance", "Engineering", "Sales", "Operations"]
+VENDORS = {
+    "Airfare":              ["Air Canada", "WestJet", "Porter Airlines"],
+    "Hotel":                ["Marriott", "Hilton", "Fairmont"],
+    "Meals":                ["Tim Hortons", "Starbucks", "The Keg"],
+    "Ground Transport":     ["Uber", "Lyft", "Enterprise"],
+    "Office Supplies":      ["Staples", "Best Buy"],
+    "Software":             ["Adobe", "Atlassian", "JetBrains"],
+    "Training":             ["Coursera", "Udemy"],
+    "Client Entertainment": ["Cineplex", "Earls"],
+}
+STATUSES = ["Submitted", "Submitted", "Approved", "Approved", "Approved", "Rejected"]
+
+
+def seed(db: LocalDatabase, users: int = 50, reports_per_user: int = 6, expenses_per_report: int = 4,
+         password: str = "password", seed: int = 0):
+    """
+    Fills `db` with a deterministic demo data set: categories, departments,
+    an "admin", one approver per category and `users` employees "user1"…
+    Every user shares one password hash. Seeding is not counted as queries.
+    """
+    from utils.hash_utils import hash_password
+    rng    = random.Random(seed)
+    hashed = hash_password(password)
+    client = LocalClient(db)
+    db.counting = False
+
+    cats  = client.table("categories").insert([{"name": n, "gl_account": gl} for n, gl in CATEGORIES]).execute().data
+    deps  = client.table("departments").insert([{"name": n} for n in DEPARTMENTS]).execute().data
+    admin = {"username": "admin", "name": "Avery Admin", "email": "admin@example.com",
+             "role": "admin", "hashed_password": hashed, "department_id": deps[0]["id"]}
+    approvers = client.table("users").insert([admin] + [
+        {"username": f"approver{i}", "name": f"Approver {c['name']}", "email": f"approver{i}@example.com",
+         "role": "approver", "hashed_password": hashed, "default_category_id": c["id"],
+         "department_id": deps[0]["id"]}
+        for i, c in enumerate(cats, 1)
+    ]).execute().data[1:]
+    employees = client.table("users").insert([
+        {"username": f"user{i}", "name": f"Employee {i}", "email": f"user{i}@example.com", "role": "user",
+         "hashed_password": hashed, "default_category_id": cats[i % len(cats)]["id"],
+         "approver_id": approvers[i % len(approvers)]["id"], "department_id": deps[i % len(deps)]["id"]}
+        for i in range(1, users + 1)
+    ]).execute().data
+
+    start = date.today() - timedelta(days=365)
+    for user in employees:
+        for n in range(reports_per_user):
+            when = start + timedelta(days=rng.randrange(365))
+            report = client.table("reports").insert({
+                "user_id": user["id"], "report_name": f"Trip {n + 1}", "total_amount": 0.0,
+                "submission_date": datetime.combine(when, datetime.min.time()).isoformat(),
+                "status": rng.choice(STATUSES),
+            }).execute().data[0]
+            rows, total = [], 0.0
+            for _ in range(expenses_per_report):
+                cat    = rng.choice(cats)
+                amount = round(rng.uniform(8, 900), 2)
+                gst    = round(amount * 0.05 / 1.05, 2)
+                price  = round(amount - gst, 2)
+                total += amount
+                rows.append({
+                    "report_id": report["id"], "expense_date": str(when - timedelta(days=rng.randrange(10))),
+                    "vendor": rng.choice(VENDORS[cat["name"]]), "description": cat["name"],
+                    "amount": amount, "currency": rng.choice(["CAD", "CAD", "CAD", "USD"]),
+                    "category_id": cat["id"], "gst_amount": gst, "pst_amount": 0.0, "hst_amount": 0.0,
+                    "receipt_path": None, "ocr_text": f"{cat['name']} receipt\nTOTAL {amount:.2f}",
+                    "line_items": json.dumps([{"description": cat["name"], "price": price,
+                                                "category": cat["name"], "category_id": cat["id"]}]),
+                })
+            client.table("expenses").insert(rows).execute()
+            client.table("reports").update({"total_amount": round(total, 2)}).eq("id", report["id"]).execute()
+    db.counting = True
+
+
+@st.cache_resource
+def get_local_client() -> LocalClient:
+    """The process-wide in-memory database, seeded per [supabase.local]."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict(st.secrets.get("supabase", {}).get("local", {})))
+    db = LocalDatabase(float(settings["latency_ms"]))
+    seed(db, int(settings["users"]), int(settings["reports_per_user"]), int(settings["expenses_per_report"]),
+         str(settings["password"]), int(settings["seed"]))
+    return LocalClient(db)
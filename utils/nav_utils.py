@@ -8,6 +8,9 @@ PAGES_FOR_ROLES = {
         ("User Management",       "6_Users.py"),
         ("Category Management",   "9_Category_Management.py"),
         ("Department Maintenance","10_Department_Maintenance.py"),
+        ("Spend Analytics",       "11_Spend_Analytics.py"),
+        ("Audit Log",             "12_Audit_Log.py"),
+        ("GL Journal Export",     "13_Journal_Export.py"),
         ("Add User",              "7_Add_User.py"),
         ("Edit User",             "8_Edit_User.py"),
     ],
@@ -27,6 +30,18 @@ PAGES_FOR_ROLES = {
     ],
 }
 
+# Reachable via st.switch_page only; never listed in the sidebar
+HIDDEN_PAGES = {"7_Add_User.py", "8_Edit_User.py"}
+
+def render_sidebar_nav(role: str):
+    """Renders the role-based navigation buttons in the sidebar."""
+    st.sidebar.header("Navigation")
+    for label, fname in PAGES_FOR_ROLES.get(role, PAGES_FOR_ROLES["logged_out"]):
+        if fname in HIDDEN_PAGES or fname.startswith("_"):
+            continue
+        if st.sidebar.button(label):
+            st.switch_page(f"pages/{fname}")
+
 def filter_pages_by_role():
     """
     Prune Streamlit's built-in pages list so that only pages in
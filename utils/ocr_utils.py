@@ -1,16 +1,19 @@
 import streamlit as st
-from google.cloud import vision
-import google.generativeai as genai
 import json
-import fitz  # PyMuPDF for PDF handling
-import io
-from PIL import Image
+import re
+import time
+import tracemalloc
+
+# The Google SDKs and PyMuPDF are imported inside the functions that use
+# them: they are slow to import, and most pages (and every fresh worker
+# process) never run OCR.
 
 # --- GOOGLE VISION API SETUP (for OCR) ---
 @st.cache_resource
 def get_vision_client():
     """Initializes and returns a Google Vision API client."""
     try:
+        from google.cloud import vision
         credentials_dict = dict(st.secrets.google_credentials)
         client = vision.ImageAnnotatorClient.from_service_account_info(credentials_dict)
         return client
@@ -23,6 +26,7 @@ def get_vision_client():
 def get_gemini_client():
     """Initializes and returns a Gemini API client."""
     try:
+        import google.generativeai as genai
         api_key = st.secrets.gemini.api_key
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-1.5-flash')
@@ -37,29 +41,130 @@ def extract_text_from_file(uploaded_file):
     Extracts text from an image or PDF file using Google Cloud Vision AI.
     If the file is a PDF, it converts each page to an image before sending.
     """
-    client = get_vision_client()
-    file_bytes = uploaded_file.getvalue()
-    mime_type = uploaded_file.type
+    return extract_text_from_bytes(uploaded_file.getvalue(), uploaded_file.type)
+
+# PDF rasterisation settings, overridable under [ocr] in secrets.toml
+DEFAULT_PDF_SETTINGS = {
+    "dpi":        200,     # Vision reads receipts fine well below 300 dpi
+    "encoding":   "png",   # png | jpeg | raw (raw only for local recognisers)
+    "grayscale":  True,    # 1 byte per pixel instead of 3
+    "max_pages":  20,      # hard cap; later pages are ignored
+    "early_stop": True,    # stop once a grand total and a tax line were read
+}
+
+# A grand total and a tax line, each followed by an amount
+# (the amount may sit on the next line, as Vision often splits them).
+# Subtotals and tax totals ("Total GST") are not grand totals.
+TOTAL_LINE_RE = re.compile(r"(?im)^(?!.*(sub|gst|tps|pst|tvq|hst|qst|tax)).*\b(grand\s+total|total|montant\s+total)\b"
+                           r"[\s\S]{0,30}?\d+[.,]\d{2}")
+TAX_LINE_RE   = re.compile(r"(?im)^.*\b(gst|tps|pst|tvq|hst|qst|tax|taxe)\b[\s\S]{0,30}?\d+[.,]\d{2}")
+
+def pdf_settings() -> dict:
+    """Merges the [ocr] secrets over DEFAULT_PDF_SETTINGS."""
+    settings = dict(DEFAULT_PDF_SETTINGS)
+    cfg = st.secrets.get("ocr", {})
+    settings.update({k: cfg[k] for k in DEFAULT_PDF_SETTINGS if k in cfg})
+    return settings
+
+def has_totals(page_text: str) -> bool:
+    """
+    True when one page's text has a tax line followed by a grand total, as
+    at the end of a receipt. Only the newest page is checked: a statement's
+    per-page subtotal and taxes must not end the read early.
+    """
+    tax = TAX_LINE_RE.search(page_text)
+    return bool(tax and TOTAL_LINE_RE.search(page_text, tax.end()))
+
+def iter_pdf_page_images(file_bytes: bytes, dpi: int = 200, encoding: str = "png",
+                         grayscale: bool = True, max_pages: int = 20):
+    """
+    Yields (page_number, image) for each PDF page, rendering one page at a
+    time so only a single pixmap is alive. `image` is encoded PNG/JPEG bytes,
+    or for encoding="raw" a (width, height, channels, samples) tuple.
+    """
+    import fitz  # PyMuPDF for PDF handling
+
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        for page_num in range(min(doc.page_count, max_pages)):
+            pix = doc.load_page(page_num).get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+            if encoding == "raw":
+                image = (pix.width, pix.height, pix.n, pix.samples)
+            elif encoding == "jpeg":
+                image = pix.tobytes("jpeg", jpg_quality=85)
+            else:
+                image = pix.tobytes("png")
+            del pix
+            yield page_num + 1, image
+
+def recognize_image(image_bytes: bytes) -> str:
+    """
+    Runs Google Vision document text detection on one encoded image, within
+    the process-wide Vision quota.
+    """
+    from google.cloud import vision
+    from utils.quota_utils import RateLimited, get_quota_scheduler
+
+    def detect():
+        response = get_vision_client().document_text_detection(image=vision.Image(content=image_bytes))
+        if response.error.code == 8:  # RESOURCE_EXHAUSTED, reported in-band
+            raise RateLimited(response.error.message)
+        if response.error.message:
+            raise Exception(response.error.message)
+        return response.full_text_annotation.text
+
+    return get_quota_scheduler("vision").call(detect)
+
+def extract_text_from_bytes(file_bytes: bytes, mime_type: str, recognize=None, settings=None, stats=None):
+    """
+    Same as extract_text_from_file, but works on raw bytes so it can run
+    outside the script thread (e.g. from the OCR job queue).
+
+    PDFs are streamed page by page through `recognize` (Google Vision by
+    default), up to max_pages, stopping early once a grand total and a tax
+    line have been read on one page. If `stats` is a list, one dict per page
+    is appended with its time, image size and (when tracemalloc is tracing)
+    that page's peak of Python allocations; MuPDF's own pixmap memory is
+    not visible to tracemalloc.
+    """
+    recognize = recognize or recognize_image
     
     try:
         if mime_type == "application/pdf":
-            full_text = ""
-            with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                for page_num, page in enumerate(doc):
-                    pix = page.get_pixmap(dpi=300)
-                    img_bytes = pix.tobytes("png")
-                    image = vision.Image(content=img_bytes)
-                    response = client.document_text_detection(image=image)
-                    if response.error.message:
-                        raise Exception(f"Google Vision API error on page {page_num+1}: {response.error.message}")
-                    full_text += response.full_text_annotation.text + "\n"
-            return full_text
+            settings = settings or pdf_settings()
+            pages    = []
+            images   = iter_pdf_page_images(
+                file_bytes,
+                dpi=settings["dpi"],
+                encoding=settings["encoding"],
+                grayscale=settings["grayscale"],
+                max_pages=settings["max_pages"],
+            )
+            started = time.perf_counter()
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            for page_num, image in images:
+                try:
+                    pages.append(recognize(image))
+                except Exception as e:
+                    raise Exception(f"Google Vision API error on page {page_num}: {e}")
+                if stats is not None:
+                    stats.append({
+                        "page":        page_num,
+                        "seconds":     time.perf_counter() - started,
+                        "image_bytes": len(image[3]) if isinstance(image, tuple) else len(image),
+                        "peak_bytes":  tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+                    })
+                del image
+                if settings["early_stop"] and has_totals(pages[-1]):
+                    images.close()
+                    break
+                started = time.perf_counter()
+                if tracemalloc.is_tracing():
+                    tracemalloc.reset_peak()   # the next page's peak, not the running one
+            return "\n".join(pages) + "\n"
         elif mime_type in ["image/png", "image/jpeg", "image/jpg"]:
-            image = vision.Image(content=file_bytes)
-            response = client.document_text_detection(image=image)
-            if response.error.message:
-                raise Exception(response.error.message)
-            return response.full_text_annotation.text
+            return recognize(file_bytes)
         else:
             return "Unsupported file type."
     except Exception as e:
@@ -92,8 +197,12 @@ def parse_text_with_gemini(ocr_text: str):
     """
     
     try:
+        import google.generativeai as genai
+        from utils.quota_utils import get_quota_scheduler
         generation_config = genai.GenerationConfig(response_mime_type="application/json")
-        response = model.generate_content(prompt, generation_config=generation_config)
+        response = get_quota_scheduler("gemini").call(
+            model.generate_content, prompt, generation_config=generation_config
+        )
         
         parsed_data = json.loads(response.text)
         # Ensure all keys exist to prevent errors in the Streamlit UI
@@ -114,8 +223,12 @@ def parse_text_with_gemini(ocr_text: str):
 # --- Main Entry Point Function ---
 def extract_and_parse_file(uploaded_file):
     """Main pipeline function using Google Vision for OCR and Gemini for parsing."""
+    return extract_and_parse_bytes(uploaded_file.getvalue(), uploaded_file.type)
+
+def extract_and_parse_bytes(file_bytes: bytes, mime_type: str):
+    """Bytes-based variant of extract_and_parse_file, used by the OCR job queue."""
     try:
-        raw_text = extract_text_from_file(uploaded_file)
+        raw_text = extract_text_from_bytes(file_bytes, mime_type)
         if "Error" in raw_text or "Unsupported" in raw_text:
              return raw_text, {"error": raw_text}
         
@@ -0,0 +1,118 @@
+# File: utils/page_utils.py
+
+import time
+
+import streamlit as st
+
+from utils import supabase_utils as su
+from utils.nav_utils import render_sidebar_nav
+from utils.perf_utils import record_timing, render_timings
+from utils.ui_utils import hide_streamlit_pages_nav
+
+
+def get_authenticator():
+    """Builds the streamlit-authenticator object once per session and reuses it."""
+    if "authenticator" not in st.session_state:
+        from streamlit_authenticator import Authenticate
+        creds = su.fetch_all_users_for_auth()
+        cfg   = st.secrets.get("cookie", {})
+        auth  = Authenticate(
+            creds,
+            cfg.get("name",        "cookie_name"),
+            cfg.get("key",         "random_key"),
+            cfg.get("expiry_days", 30),
+        )
+        st.session_state["authenticator"]    = auth
+        st.session_state["user_credentials"] = creds
+    return st.session_state["authenticator"]
+
+
+def get_user_context():
+    """
+    Resolves the logged-in user's id, role, approver and default category.
+    Looked up once per session and cached in st.session_state["user_context"];
+    returns None while nobody is logged in.
+    """
+    if not st.session_state.get("authentication_status"):
+        st.session_state.pop("user_context", None)
+        return None
+
+    username = st.session_state.get("username")
+    ctx = st.session_state.get("user_context")
+    if ctx and ctx["username"] == username:
+        return ctx
+
+    creds = st.session_state.get("user_credentials", {}).get("usernames", {}).get(username, {})
+    user_id = creds.get("id") or st.session_state.get("user_id")
+    details = (su.get_single_user_details(user_id) if user_id else None) or {}
+    ctx = {
+        "id":                  user_id,
+        "username":            username,
+        "name":                details.get("name") or creds.get("name") or st.session_state.get("name"),
+        "role":                details.get("role") or creds.get("role"),
+        "approver_id":         details.get("approver_id"),
+        "default_category_id": details.get("default_category_id"),
+    }
+    st.session_state["user_context"] = ctx
+    # Older code reads these keys directly
+    st.session_state["user_id"] = ctx["id"]
+    st.session_state["role"]    = ctx["role"]
+    return ctx
+
+
+def bootstrap_page(page_title: str, require_auth: bool = True, roles=None, layout: str = "wide"):
+    """
+    Shared setup for every page: page config, hidden built-in nav, the
+    cached user context, role-based sidebar nav and the auth guard.
+    Returns the user context (None on public pages when logged out).
+
+    The time spent here is recorded as "bootstrap" and the rerun start is
+    remembered so finish_page() can record the whole rerun.
+    """
+    start = time.perf_counter()
+    st.session_state["_rerun_started_at"] = start
+    st.session_state["_rerun_page"]       = page_title
+
+    st.set_page_config(page_title=page_title, layout=layout)
+    hide_streamlit_pages_nav()
+
+    ctx = get_user_context()
+    render_sidebar_nav(ctx["role"] if ctx else "logged_out")
+    record_timing("bootstrap", time.perf_counter() - start)
+
+    if require_auth:
+        if ctx is None:
+            st.warning("Please log in to access this page.")
+            st.stop()
+        if not ctx["id"]:
+            st.error("User profile not found in session.")
+            st.stop()
+        if roles and ctx["role"] not in roles:
+            st.error("You do not have permission to view this page.")
+            st.stop()
+    return ctx
+
+
+def finish_page():
+    """
+    Per-rerun timing hook: records the full rerun of the current page and
+    shows the session's timings to admins. Call at the end of a page.
+    """
+    start = st.session_state.get("_rerun_started_at")
+    if start is None:
+        return
+    record_timing(f"full rerun: {st.session_state.get('_rerun_page')}", time.perf_counter() - start)
+    ctx = st.session_state.get("user_context")
+    if ctx and ctx["role"] == "admin":
+        render_timings()
+        from utils.local_backend_utils import local_backend_enabled
+        if not local_backend_enabled():
+            from utils.connection_utils import connection_metrics
+            with st.expander("Connection pool"):
+                st.json(connection_metrics())
+        from utils.quota_utils import quota_stats
+        with st.expander("API quotas"):
+            st.json(quota_stats())
+        from utils.change_feed_utils import feed_stats
+        with st.expander("Query cache"):
+            st.json(feed_stats())
@@ -0,0 +1,64 @@
+# File: utils/perf_utils.py
+
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Keep the last N samples per label so long sessions do not grow unbounded
+MAX_SAMPLES = 200
+
+# Process-wide observers called as hook(label, seconds) for every sample,
+# e.g. to export per-rerun timings to a log or a load-test collector
+TIMING_HOOKS = []
+
+
+def add_timing_hook(hook):
+    """Registers a callable that receives every recorded (label, seconds)."""
+    if hook not in TIMING_HOOKS:
+        TIMING_HOOKS.append(hook)
+
+
+def record_timing(label: str, seconds: float):
+    """Stores one timing sample for the current session under `label`."""
+    timings = st.session_state.setdefault("_perf_timings", {})
+    samples = timings.setdefault(label, [])
+    samples.append(seconds)
+    del samples[:-MAX_SAMPLES]
+    for hook in TIMING_HOOKS:
+        hook(label, seconds)
+
+
+@contextmanager
+def timed(label: str):
+    """Context manager that records how long its body took (also on st.rerun/st.stop)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(label, time.perf_counter() - start)
+
+
+def timing_summary():
+    """Returns one row per label with run count, median and p95 in milliseconds."""
+    rows = []
+    for label, samples in st.session_state.get("_perf_timings", {}).items():
+        if not samples:
+            continue
+        ordered = sorted(samples)
+        rows.append({
+            "Scope":       label,
+            "Runs":        len(ordered),
+            "Median (ms)": round(ordered[len(ordered) // 2] * 1000, 1),
+            "p95 (ms)":    round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        })
+    return rows
+
+
+def render_timings(title: str = "Rerun timings"):
+    """Shows the session's timing summary in a collapsed expander."""
+    rows = timing_summary()
+    if not rows:
+        return
+    with st.expander(title):
+        st.dataframe(rows, hide_index=True)
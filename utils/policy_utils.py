@@ -0,0 +1,280 @@
+# File: utils/policy_utils.py
+#
+# Expense policy and tax checks. Each rule is a boolean expression over
+# expense columns, e.g. "gst > 0 and hst > 0". It is compiled once into
+# NumPy code: and/or/not become &, |, ~, so the rule applies element-wise.
+# One evaluation covers a whole frame of expenses (a report, an approval
+# queue or a month). Only whitelisted names, operators and functions are
+# accepted, so rules can safely come from secrets.toml.
+#
+#   python -m utils.policy_utils 2025-01-01 2025-02-01
+
+import argparse
+import ast
+import string
+import sys
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Overridable under [policy] in secrets.toml. Limits apply per expense, in
+# its own currency, by category name: [policy.limits] Meals = 75
+DEFAULT_SETTINGS = {
+    "gst_rate":      0.05,
+    "tax_tolerance": 0.05,   # rounding allowed on a tax amount, in dollars
+    "limits":        {},
+}
+
+# Add or override rules by id with [[policy.rules]] tables in secrets.toml
+# (`enabled = false` drops one). `when` sees the columns in COLUMNS, the
+# numeric settings above and the functions in FUNCTIONS.
+DEFAULT_RULES = [
+    {"id": "over_limit", "severity": "error",
+     "when": "amount > category_limit",
+     "message": "{amount:,.2f} is over the {category} limit of {category_limit:,.2f}"},
+    {"id": "gst_rate", "severity": "warning",
+     "when": "gst > 0 and abs(gst - gst_rate * pretax) > tax_tolerance",
+     "message": "GST of {gst:,.2f} is not {gst_rate:.0%} of the pre-tax {pretax:,.2f}"},
+    {"id": "gst_and_hst", "severity": "error",
+     "when": "gst > 0 and hst > 0",
+     "message": "Both GST ({gst:,.2f}) and HST ({hst:,.2f}) charged"},
+    {"id": "future_date", "severity": "error",
+     "when": "days_ahead > 0",
+     "message": "Dated {expense_date}, in the future"},
+    {"id": "weekend", "severity": "warning",
+     "when": "weekday >= 5",
+     "message": "Spent on a weekend ({expense_date})"},
+]
+
+COLUMNS = ("amount", "gst", "pst", "hst", "pretax", "category", "category_limit",
+           "currency", "expense_date", "days_ahead", "weekday")
+FUNCTIONS = {"abs": np.abs, "isna": pd.isna, "notna": pd.notna, "round": np.round}
+SEVERITIES = ("error", "warning")
+VIOLATION_COLUMNS = ["expense_id", "rule", "severity", "message"]
+
+_NODES = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call,
+          ast.Name, ast.Load, ast.Constant, ast.And, ast.Or, ast.Not, ast.USub, ast.UAdd,
+          ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow, ast.Eq, ast.NotEq,
+          ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def policy_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    cfg = st.secrets.get("policy", {})
+    settings.update({k: v for k, v in dict(cfg).items() if k != "rules"})
+    settings["limits"] = dict(settings["limits"])
+    rules = {r["id"]: dict(r) for r in DEFAULT_RULES}
+    for rule in cfg.get("rules", []):
+        rules[rule["id"]] = {**rules.get(rule["id"], {}), **dict(rule)}
+    settings["rules"] = [r for r in rules.values() if r.get("enabled", True)]
+    return settings
+
+
+class _Vectorise(ast.NodeTransformer):
+    """Rewrites boolean logic into element-wise operators."""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return ast.UnaryOp(op=ast.Invert(), operand=node.operand) if isinstance(node.op, ast.Not) else node
+
+    def visit_Compare(self, node):
+        # a < b < c -> (a < b) & (b < c)
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        parts, left = [], node.left
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return result
+
+
+@lru_cache(maxsize=256)
+def compile_rule(expression: str, names: frozenset):
+    """
+    Compiles a rule expression into a code object evaluated over column
+    arrays. Raises ValueError for syntax, names or constructs not allowed.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule {expression!r}: {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES):
+            raise ValueError(f"Invalid rule {expression!r}: {type(node).__name__} is not allowed")
+        if isinstance(node, ast.Name) and node.id not in names:
+            raise ValueError(f"Invalid rule {expression!r}: unknown name {node.id!r}")
+        if isinstance(node, ast.Call) and (node.keywords or not isinstance(node.func, ast.Name)
+                                           or node.func.id not in FUNCTIONS):
+            raise ValueError(f"Invalid rule {expression!r}: only {', '.join(FUNCTIONS)} may be called")
+    tree = ast.fix_missing_locations(_Vectorise().visit(tree))
+    return compile(tree, f"<rule {expression}>", "eval")
+
+
+def _numbers(expenses: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in expenses:
+        return np.zeros(len(expenses))
+    return pd.to_numeric(expenses[column], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+
+def rule_columns(expenses: pd.DataFrame, categories: list, settings: dict, today: date = None) -> dict:
+    """The arrays rules are evaluated over, one entry per expense."""
+    n        = len(expenses)
+    amount   = _numbers(expenses, "amount")
+    gst, pst, hst = (_numbers(expenses, f"{t}_amount") for t in ("gst", "pst", "hst"))
+    names    = {c["id"]: c["name"] for c in categories or []}
+    if "category_id" in expenses:
+        category = expenses["category_id"].map(names)
+    else:
+        category = pd.Series([None] * n, index=expenses.index)
+    limits   = category.map({k: float(v) for k, v in settings["limits"].items()})
+    dates    = pd.to_datetime(expenses["expense_date"], errors="coerce", format="ISO8601") \
+        if "expense_date" in expenses else pd.Series(pd.NaT, index=expenses.index)
+    days     = dates.to_numpy(dtype="datetime64[D]")
+    today    = np.datetime64(today or date.today(), "D")
+    return {
+        "amount":         amount,
+        "gst":            gst,
+        "pst":            pst,
+        "hst":            hst,
+        "pretax":         amount - gst - pst - hst,
+        "category":       category.to_numpy(dtype=object),
+        "category_limit": limits.to_numpy(dtype=float, na_value=np.nan),
+        "currency":       expenses["currency"].to_numpy(dtype=object) if "currency" in expenses
+                          else np.full(n, None, dtype=object),
+        "expense_date":   days,
+        "days_ahead":     np.where(np.isnat(days), np.nan, (days - today).astype(float)),
+        "weekday":        dates.dt.weekday.to_numpy(dtype=float, na_value=np.nan),
+    }
+
+
+def _evaluate(expenses: pd.DataFrame, categories: list, settings: dict, today: date = None):
+    """(flag matrix, rule columns) for `expenses`."""
+    columns  = rule_columns(expenses, categories, settings, today)
+    params   = {k: float(v) for k, v in settings.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    scope    = {**FUNCTIONS, **params, **columns}
+    names    = frozenset(scope)
+    flags    = {}
+    with np.errstate(invalid="ignore"):
+        for rule in settings["rules"]:
+            result = eval(compile_rule(rule["when"], names), {"__builtins__": {}}, scope)
+            flags[rule["id"]] = np.broadcast_to(np.asarray(result, dtype=bool), (len(expenses),))
+    return pd.DataFrame(flags, index=expenses.index, columns=[r["id"] for r in settings["rules"]]), columns
+
+
+def flag_matrix(expenses: pd.DataFrame, categories: list = None, settings: dict = None,
+                today: date = None) -> pd.DataFrame:
+    """
+    One boolean column per rule, one row per expense (same index): every
+    rule evaluated over the whole frame at once.
+    """
+    if categories is None:
+        from utils import supabase_utils as su
+        categories = su.get_all_categories()
+    return _evaluate(expenses, categories, settings or policy_settings(), today)[0]
+
+
+def _field_values(field: str, columns: dict, params: dict, rows: np.ndarray) -> list:
+    if field not in columns:
+        return [params.get(field)] * len(rows)
+    values = columns[field][rows]
+    if values.dtype.kind == "M":
+        return np.where(np.isnat(values), "unknown date", np.datetime_as_string(values, unit="D")).tolist()
+    return values.tolist()
+
+
+def _messages(message: str, columns: dict, params: dict, rows: np.ndarray) -> list:
+    """`message` formatted for each of `rows`; the template is parsed once."""
+    fields = list(dict.fromkeys(f for _, f, _, _ in string.Formatter().parse(message) if f))
+    values = [_field_values(f, columns, params, rows) for f in fields]
+    out    = []
+    for row in zip(*values) if fields else [()] * len(rows):
+        try:
+            out.append(message.format(**dict(zip(fields, row))))
+        except (ValueError, TypeError, KeyError):
+            out.append(message)
+    return out
+
+
+def check_expenses(expenses: pd.DataFrame, categories: list = None, settings: dict = None,
+                   today: date = None) -> pd.DataFrame:
+    """
+    Violations as rows of (expense_id, rule, severity, message), errors
+    first. expense_id is the expense's "id", or its index when it has none.
+    """
+    if expenses is None or len(expenses) == 0:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    settings = settings or policy_settings()
+    if categories is None:
+        from utils import supabase_utils as su
+        categories = su.get_all_categories()
+    flags, columns = _evaluate(expenses, categories, settings, today)
+    ids      = expenses["id"].to_numpy() if "id" in expenses else expenses.index.to_numpy()
+    rules    = {r["id"]: r for r in settings["rules"]}
+    parts    = []
+    for rule_id in flags.columns:
+        rule = rules[rule_id]
+        hits = np.flatnonzero(flags[rule_id].to_numpy())
+        parts.append(pd.DataFrame({
+            "expense_id": ids[hits],
+            "rule":       rule_id,
+            "severity":   rule.get("severity", "warning"),
+            "message":    _messages(rule.get("message", rule_id), columns, settings, hits),
+        }, columns=VIOLATION_COLUMNS))
+    out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=VIOLATION_COLUMNS)
+    order = out["severity"].map({s: n for n, s in enumerate(SEVERITIES)}).fillna(len(SEVERITIES))
+    return out.assign(_order=order).sort_values(["_order", "expense_id"], kind="stable") \
+        .drop(columns="_order").reset_index(drop=True)
+
+
+def flag_counts(expenses: pd.DataFrame, by: str, categories: list = None, settings: dict = None) -> pd.Series:
+    """Number of violations per value of `by` (e.g. report_id)."""
+    if expenses is None or len(expenses) == 0:
+        return pd.Series(dtype=int)
+    flags = flag_matrix(expenses, categories, settings)
+    return flags.sum(axis=1).groupby(expenses[by].to_numpy()).sum()
+
+
+def render_violations(violations: pd.DataFrame, expenses: pd.DataFrame = None):
+    """Shows violations as an error/warning summary and a table."""
+    if violations.empty:
+        st.success("No policy or tax issues found.")
+        return
+    counts = violations["severity"].value_counts()
+    summary = ", ".join(f"{counts[s]} {s}(s)" for s in SEVERITIES if s in counts)
+    (st.error if "error" in counts else st.warning)(f"Policy and tax checks: {summary}.")
+    table = violations[["severity", "rule", "message"]]
+    if expenses is not None and "id" in expenses and {"vendor", "expense_date"} <= set(expenses.columns):
+        table = violations.merge(expenses[["id", "expense_date", "vendor"]], left_on="expense_id",
+                                 right_on="id", how="left").drop(columns=["id"])
+        table = table[["expense_date", "vendor", "severity", "rule", "message"]]
+    st.dataframe(table.rename(columns={"expense_date": "Date", "vendor": "Vendor", "severity": "Severity",
+                                       "rule": "Rule", "message": "Message"}), hide_index=True)
+
+
+if __name__ == "__main__":
+    from utils import supabase_utils as su
+
+    parser = argparse.ArgumentParser(description="Check a period's expenses against the expense policy.")
+    parser.add_argument("start", help="first expense date (YYYY-MM-DD)")
+    parser.add_argument("end", help="day after the period (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    expenses = pd.DataFrame(su.get_expenses_in_period(args.start, args.end))
+    violations = check_expenses(expenses)
+    violations.to_csv(sys.stdout, index=False)
+    print(f"{len(expenses)} expenses, {len(violations)} violations", file=sys.stderr)
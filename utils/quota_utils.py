@@ -0,0 +1,204 @@
+# File: utils/quota_utils.py
+#
+# Process-wide rate limiting for the Vision and Gemini APIs. Every call
+# goes through QuotaScheduler.call(), which waits for a token from the
+# API's bucket. Waiting callers are served round-robin across sessions, so
+# one user's burst of uploads cannot starve everyone else. A 429 (or an in-band RESOURCE_EXHAUSTED) pauses the whole bucket
+# for the server's retry-after hint instead of letting each session retry.
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Overridable under [quota.vision] / [quota.gemini] in secrets.toml
+DEFAULT_QUOTAS = {
+    "vision": {"per_minute": 1800, "burst": 10},
+    "gemini": {"per_minute": 60,   "burst": 5},
+}
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF     = 5.0   # seconds, when a rate-limit error carries no hint
+
+_RETRY_HINTS = (
+    re.compile(r"retry[_ ]delay\s*\{\s*seconds:\s*(\d+)", re.I),
+    re.compile(r"retry (?:in|after) ([\d.]+)\s*s", re.I),
+)
+
+
+class RateLimited(Exception):
+    """Raised by API wrappers for in-band quota errors, with an optional hint."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rate_limit_delay(exc):
+    """
+    Seconds to back off if `exc` is a rate-limit error (None otherwise):
+    the Retry-After header or retry_delay hint when present, else a default.
+    """
+    if isinstance(exc, RateLimited):
+        return exc.retry_after if exc.retry_after is not None else DEFAULT_BACKOFF
+    if getattr(exc, "code", None) != 429 and type(exc).__name__ not in ("ResourceExhausted", "TooManyRequests"):
+        return None
+    response = getattr(exc, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        pass
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(str(exc))
+        if match:
+            return float(match.group(1))
+    return DEFAULT_BACKOFF
+
+
+# The session of the calling thread; OCR job workers set it from the
+# submitting session, script threads default to their own session
+_context = threading.local()
+
+
+@contextmanager
+def quota_context(session_id=None):
+    """Attributes API calls made in this block to `session_id`."""
+    previous = getattr(_context, "session", None)
+    _context.session = session_id
+    try:
+        yield
+    finally:
+        _context.session = previous
+
+
+def current_caller():
+    """Session id that API calls from this thread are charged to (None outside a session)."""
+    session = getattr(_context, "session", None)
+    if session is not None:
+        return session
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+
+class QuotaScheduler:
+    """Token bucket plus a fair (round-robin by session) wait queue for one API."""
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.name         = name
+        self.rate         = per_minute / 60.0
+        self.burst        = max(1, int(burst))
+        self.max_retries  = max_retries
+        self._tokens      = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_til  = 0.0
+        self._cond        = threading.Condition()
+        # session -> deque of waiting tickets; sessions rotate
+        self._waiting     = OrderedDict()
+        self._tickets     = 0
+        # metrics
+        self.calls        = 0
+        self.throttled    = 0
+        self.total_wait   = 0.0
+        self.max_wait     = 0.0
+
+    # --- queue ---
+
+    def _head(self):
+        """The ticket served next: the first session in rotation's oldest."""
+        for queue in self._waiting.values():
+            return queue[0]
+        return None
+
+    def _dequeue(self, ticket):
+        session, _ = ticket
+        queue = self._waiting.pop(session)
+        queue.popleft()
+        if queue:
+            self._waiting[session] = queue   # back of the rotation
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, session=None) -> float:
+        """Blocks until this caller's turn and a token are both available; returns seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            self._tickets += 1
+            ticket = (session, self._tickets)
+            self._waiting.setdefault(session, deque()).append(ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._head() == ticket and now >= self._paused_til and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._dequeue(ticket)
+                    self._cond.notify_all()
+                    break
+                delay = max(self._paused_til - now, (1 - self._tokens) / self.rate, 0.005)
+                self._cond.wait(timeout=delay)
+            waited = time.monotonic() - start
+            self.calls      += 1
+            self.total_wait += waited
+            self.max_wait    = max(self.max_wait, waited)
+        return waited
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for `seconds` (server asked everyone to back off)."""
+        with self._cond:
+            self.throttled  += 1
+            self._paused_til = max(self._paused_til, time.monotonic() + seconds)
+            self._tokens     = 0.0
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) under the quota, attributed to the calling
+        session. Rate-limit errors pause the bucket and retry up to
+        max_retries times; any other error propagates immediately.
+        """
+        session = current_caller()
+        for attempt in range(self.max_retries + 1):
+            self.acquire(session)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                self.pause(delay)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "waiting":             sum(len(q) for q in self._waiting.values()),
+                "sessions_waiting":    len(self._waiting),
+                "tokens":              round(self._tokens, 2),
+                "paused_for_s":        round(max(0.0, self._paused_til - time.monotonic()), 1),
+                "calls":               self.calls,
+                "throttled":           self.throttled,
+                "avg_wait_ms":         round(1000 * self.total_wait / self.calls, 1) if self.calls else 0.0,
+                "max_wait_ms":         round(1000 * self.max_wait, 1),
+            }
+
+
+@st.cache_resource
+def get_quota_scheduler(api: str) -> QuotaScheduler:
+    """Process-wide scheduler for "vision" or "gemini"."""
+    cfg = dict(DEFAULT_QUOTAS[api])
+    cfg.update(dict(st.secrets.get("quota", {}).get(api, {})))
+    return QuotaScheduler(api, float(cfg["per_minute"]), int(cfg["burst"]),
+                          int(cfg.get("max_retries", DEFAULT_MAX_RETRIES)))
+
+
+def quota_stats() -> dict:
+    """Queue depth, wait time and throttling counters for every API."""
+    return {api: get_quota_scheduler(api).stats() for api in DEFAULT_QUOTAS}
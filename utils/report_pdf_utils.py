@@ -0,0 +1,211 @@
+# File: utils/report_pdf_utils.py
+#
+# Consolidated, printable PDF per report: a summary table of the expenses,
+# the line-items breakdown, then every receipt. PDF receipts are merged
+# page for page (insert_pdf, no re-rasterising); image receipts are placed
+# on their own page, scaled to fit. PyMuPDF is imported lazily.
+#
+# PDFs are cached per (report id, version). The version is a hash of the
+# report and its expense rows, line items included (see
+# supabase_utils.with_expense_details), so any edit to an expense (or a
+# status change) builds a new PDF and an unchanged report is served from
+# the cache without downloading its receipts again.
+
+import hashlib
+import html
+import json
+import os
+
+import streamlit as st
+
+from utils import supabase_utils as su
+
+PAGE_SIZE   = (612, 792)   # US Letter, points
+MARGIN      = 36
+MAX_CACHED  = 16           # rendered PDFs kept in memory
+IMAGE_TYPES = {".png", ".jpg", ".jpeg"}
+
+REPORT_FIELDS  = ("id", "report_name", "status", "submission_date", "total_amount", "approver_comment")
+SUMMARY_FIELDS = [("expense_date", "Date"), ("vendor", "Vendor"), ("description", "Description"),
+                  ("category_name", "Category"), ("amount", "Amount"), ("gst_amount", "GST"),
+                  ("pst_amount", "PST"), ("hst_amount", "HST"), ("currency", "Cur.")]
+
+CSS = """
+* { font-family: sans-serif; font-size: 9px; }
+h1 { font-size: 16px; margin-bottom: 4px; }
+h2 { font-size: 12px; margin-top: 14px; margin-bottom: 4px; }
+h3 { font-size: 10px; margin-top: 8px; margin-bottom: 2px; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #999; padding: 2px 4px; text-align: left; }
+th { background-color: #dde6f0; }
+td.num { text-align: right; }
+"""
+
+
+def report_version(report: dict, expenses) -> str:
+    """
+    Short hash of the report's header fields and all of its expense rows;
+    changes whenever anything shown in the PDF (or the receipts) changes.
+    """
+    rows = expenses.to_dict("records") if hasattr(expenses, "to_dict") else list(expenses)
+    payload = {
+        "report":   {k: report.get(k) for k in REPORT_FIELDS},
+        "expenses": sorted(rows, key=lambda r: str(r.get("id"))),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _cell(value, numeric: bool = False) -> str:
+    if value is None or value != value:   # None / NaN
+        text = ""
+    elif numeric:
+        try:
+            text = f"{float(value):,.2f}"
+        except (TypeError, ValueError):
+            text = str(value)
+    else:
+        text = str(value)
+    return f'<td class="num">{html.escape(text)}</td>' if numeric else f"<td>{html.escape(text)}</td>"
+
+
+def _line_items(raw) -> list:
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    return [item for item in raw if isinstance(item, dict)] if isinstance(raw, list) else []
+
+
+def report_html(report: dict, rows: list, categories: dict) -> str:
+    """Summary table and line-items breakdown as HTML for fitz.Story."""
+    submitter = (report.get("user") or {}).get("name", "Unknown") if isinstance(report.get("user"), dict) else "Unknown"
+    parts = [
+        f"<h1>{html.escape(str(report.get('report_name') or 'Expense report'))}</h1>",
+        f"<p>Submitted by {html.escape(submitter)} on {html.escape(str(report.get('submission_date') or '')[:10])}"
+        f" &#8212; status: {html.escape(str(report.get('status') or ''))}"
+        f" &#8212; total: {float(report.get('total_amount') or 0):,.2f}</p>",
+    ]
+    if report.get("approver_comment"):
+        parts.append(f"<p>Approver comment: {html.escape(str(report['approver_comment']))}</p>")
+
+    parts.append("<h2>Expense Items</h2><table><tr>")
+    parts += [f"<th>{label}</th>" for _, label in SUMMARY_FIELDS]
+    parts.append("</tr>")
+    numeric = {"amount", "gst_amount", "pst_amount", "hst_amount"}
+    for row in rows:
+        parts.append("<tr>" + "".join(_cell(row.get(field), field in numeric) for field, _ in SUMMARY_FIELDS) + "</tr>")
+    parts.append("</table>")
+
+    parts.append("<h2>Line Items Breakdown</h2>")
+    for row in rows:
+        items = _line_items(row.get("line_items"))
+        parts.append(f"<h3>{html.escape(str(row.get('expense_date') or ''))} &#8211; {html.escape(str(row.get('vendor') or ''))}</h3>")
+        if not items:
+            parts.append("<p>No line items</p>")
+            continue
+        parts.append("<table><tr><th>Line Description</th><th>Line Price</th><th>Category</th><th>GL Account #</th></tr>")
+        for item in items:
+            category = categories.get(item.get("category_id"), {})
+            parts.append("<tr>" + _cell(item.get("description")) + _cell(item.get("price"), True)
+                         + _cell(category.get("name")) + _cell(category.get("gl_account")) + "</tr>")
+        parts.append("</table>")
+    return "".join(parts)
+
+
+def _story_pdf(body: str) -> bytes:
+    """Lays `body` out over as many Letter pages as it needs."""
+    import io
+    import fitz
+
+    out    = io.BytesIO()
+    writer = fitz.DocumentWriter(out)
+    story  = fitz.Story(html=body, user_css=CSS)
+    page   = fitz.Rect(0, 0, *PAGE_SIZE)
+    where  = page + (MARGIN, MARGIN, -MARGIN, -MARGIN)
+    more   = True
+    while more:
+        device = writer.begin_page(page)
+        more, _ = story.place(where)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+    return out.getvalue()
+
+
+def _is_pdf(path: str, data: bytes) -> bool:
+    return data[:5] == b"%PDF-" or os.path.splitext(path)[1].lower() == ".pdf"
+
+
+def _append_receipt(doc, path: str, data: bytes, caption: str):
+    """Merges a PDF receipt's pages, or places an image receipt on a new page."""
+    import fitz
+
+    if _is_pdf(path, data):
+        with fitz.open(stream=data, filetype="pdf") as receipt:
+            doc.insert_pdf(receipt)
+        return
+    page = doc.new_page(width=PAGE_SIZE[0], height=PAGE_SIZE[1])
+    page.insert_text((MARGIN, MARGIN), caption, fontsize=9)
+    page.insert_image(fitz.Rect(MARGIN, MARGIN + 12, PAGE_SIZE[0] - MARGIN, PAGE_SIZE[1] - MARGIN),
+                      stream=data, keep_proportion=True)
+
+
+def render_report_pdf(report: dict, expenses, download=None) -> tuple:
+    """
+    Builds the consolidated PDF for `report` and its expense rows (a
+    DataFrame or list of dicts). Receipts are fetched with download(path)
+    (default: the receipts bucket). Returns (pdf_bytes, skipped) where
+    skipped lists the receipt paths that could not be included.
+    """
+    import fitz
+
+    download   = download or su.download_receipt
+    rows       = expenses.to_dict("records") if hasattr(expenses, "to_dict") else list(expenses)
+    categories = {c["id"]: c for c in su.get_all_categories()}
+
+    doc = fitz.open(stream=_story_pdf(report_html(report, rows, categories)), filetype="pdf")
+    skipped, seen = [], set()
+    for row in rows:
+        path = row.get("receipt_path")
+        if not isinstance(path, str) or not path or path in seen:
+            continue
+        seen.add(path)
+        caption = f"Receipt: {row.get('expense_date') or ''} {row.get('vendor') or ''} ({os.path.basename(path)})"
+        try:
+            _append_receipt(doc, path, download(path), caption)
+        except Exception:
+            skipped.append(path)
+    doc.set_metadata({"title": str(report.get("report_name") or ""), "creator": "Expense reports"})
+    try:
+        return doc.tobytes(garbage=3, deflate=True), skipped
+    finally:
+        doc.close()
+
+
+class _IncompletePdf(Exception):
+    """Carries a PDF with missing receipts out of the cache (exceptions are not cached)."""
+
+    def __init__(self, pdf: bytes, skipped: list):
+        super().__init__(f"{len(skipped)} receipt(s) skipped")
+        self.pdf, self.skipped = pdf, skipped
+
+
+@st.cache_data(max_entries=MAX_CACHED, show_spinner=False)
+def _cached_report_pdf(report_id, version: str, _report: dict, _expenses) -> tuple:
+    pdf, skipped = render_report_pdf(_report, _expenses)
+    if skipped:
+        raise _IncompletePdf(pdf, skipped)
+    return pdf, skipped
+
+
+def get_report_pdf(report_id, version: str, report: dict, expenses) -> tuple:
+    """
+    render_report_pdf, cached by (report_id, version); pass the version from
+    report_version() for the same report and expenses. A PDF missing any
+    receipt is returned but not cached, so the next request tries again.
+    """
+    try:
+        return _cached_report_pdf(report_id, version, report, expenses)
+    except _IncompletePdf as e:
+        return e.pdf, e.skipped
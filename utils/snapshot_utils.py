@@ -0,0 +1,346 @@
+# File: utils/snapshot_utils.py
+#
+# Local Parquet snapshot of reports, expenses and expense line items.
+#
+#   <dir>/_watermarks.json
+#   <dir>/<table>/month=YYYY-MM/part-<batch>.parquet
+#   <dir>/<table>/month=deleted/part-<batch>.parquet   tombstones
+#
+# Each sync appends one part per touched month holding only the rows whose
+# updated_at is past the table's watermark, plus a tombstone for every row
+# deleted since (deleted_rows); readers keep the newest copy of each row and
+# drop tombstoned ones. Both need sql/005_snapshot_tracking.sql. Run
+# `python -m utils.snapshot_utils` (e.g. from cron) to sync and compact.
+#
+# load_live() is what readers such as the spend cube use: the snapshot with
+# whatever changed in Supabase since its last sync applied on top.
+
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+import streamlit as st
+
+from utils import supabase_utils as su
+
+# Overridable under [snapshot] in secrets.toml
+DEFAULT_DIR = "snapshots"
+
+# Timestamp watermarks are re-read this far back, for rows whose
+# transaction committed after a later one had already been synced
+DEFAULT_OVERLAP_SECONDS = 300
+
+# Table -> (date column used for the month partition, default watermark column)
+TABLES = {
+    "reports":  ("submission_date", "updated_at"),
+    "expenses": ("expense_date",    "updated_at"),
+}
+
+BATCH_COLUMN   = "_batch"     # time_ns of the sync that wrote the row; newest copy wins
+DELETED_COLUMN = "_deleted"   # true on tombstones
+UNKNOWN_MONTH  = "unknown"
+DELETED_MONTH  = "deleted"
+
+
+def snapshot_settings() -> dict:
+    cfg = st.secrets.get("snapshot", {})
+    watermarks = {table: column for table, (_, column) in TABLES.items()}
+    watermarks.update(dict(cfg.get("watermarks", {})))
+    return {"dir": cfg.get("dir", DEFAULT_DIR), "watermarks": watermarks,
+            "overlap_seconds": int(cfg.get("overlap_seconds", DEFAULT_OVERLAP_SECONDS))}
+
+
+def _key(table: str) -> str:
+    return "expense_id" if table == "line_items" else "id"
+
+
+def _since(value, column: str, overlap: int):
+    """Where to re-read a table from: timestamps step back `overlap` seconds."""
+    if value is None or column == "id":
+        return value
+    return (pd.Timestamp(value) - pd.Timedelta(seconds=overlap)).isoformat()
+
+
+def _scalar(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _month(dates: pd.Series) -> pd.Series:
+    return pd.to_datetime(dates, errors="coerce").dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+
+
+def _explode_line_items(expenses: pd.DataFrame) -> pd.DataFrame:
+    """One row per expense line item, tagged with its expense id and month."""
+    from utils.classifier_utils import _parse_line_items
+
+    rows = [
+        {
+            "expense_id":  expense_id,
+            "position":    position,
+            "description": item.get("description"),
+            "price":       pd.to_numeric(item.get("price"), errors="coerce"),
+            "category_id": item.get("category_id"),
+            "month":       month,
+        }
+        for expense_id, raw, month in zip(expenses["id"], expenses.get("line_items", pd.Series(dtype=object)), expenses["month"])
+        for position, item in enumerate(_parse_line_items(raw))
+        if isinstance(item, dict)
+    ]
+    items = pd.DataFrame(rows, columns=["expense_id", "position", "description", "price", "category_id", "month"])
+    # An expense left with no items gets a tombstone, so its older items stop being current
+    bare = expenses[~expenses["id"].isin(items["expense_id"])]
+    return pd.concat([items, _tombstones(bare["id"], "expense_id", bare["month"].tolist())], ignore_index=True)
+
+
+def _tombstones(ids, key: str = "id", month=DELETED_MONTH) -> pd.DataFrame:
+    return pd.DataFrame({key: list(ids), "month": month, DELETED_COLUMN: True})
+
+
+def _to_arrow(frame: pd.DataFrame) -> pa.Table:
+    # Nested JSON (line_items, embedded rows) is kept as text so every part
+    # of a table has the same flat schema
+    frame = frame.copy()
+    for column in frame.columns[frame.dtypes == object]:
+        if frame[column].map(lambda v: isinstance(v, (dict, list))).any():
+            frame[column] = frame[column].map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+class ParquetSnapshot:
+    """Append-only, month-partitioned Parquet store with per-table watermarks."""
+
+    def __init__(self, root: str):
+        self.root  = root
+        self._lock = threading.Lock()
+        self._fs   = fs.LocalFileSystem(use_mmap=True)
+
+    # --- watermarks ---
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.root, "_watermarks.json")
+
+    def watermarks(self) -> dict:
+        if not os.path.exists(self._state_path):
+            return {}
+        with open(self._state_path) as f:
+            return json.load(f)
+
+    def _save_watermarks(self, state: dict):
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self._state_path)
+
+    # --- writing ---
+
+    def append(self, table: str, frame: pd.DataFrame, batch: int) -> int:
+        """Writes `frame` (which must carry a `month` column) as one part per month."""
+        if frame.empty:
+            return 0
+        frame = frame.assign(**{BATCH_COLUMN: batch})
+        if DELETED_COLUMN not in frame:
+            frame[DELETED_COLUMN] = False
+        frame[DELETED_COLUMN] = frame[DELETED_COLUMN].fillna(False).astype(bool)
+        for month, part in frame.groupby("month", sort=False):
+            folder = os.path.join(self.root, table, f"month={month}")
+            os.makedirs(folder, exist_ok=True)
+            pq.write_table(_to_arrow(part.drop(columns="month")), os.path.join(folder, f"part-{batch}.parquet"))
+        return len(frame)
+
+    def changes(self, settings: dict = None, state: dict = None) -> tuple:
+        """
+        (rows, deleted, state) from Supabase: each table's rows changed since
+        the watermarks in `state` (the snapshot's own by default), the ids
+        deleted since, and the watermarks after them. Writes nothing.
+        """
+        settings = settings or snapshot_settings()
+        state    = dict(self.watermarks() if state is None else state)
+        rows, deleted = {}, {table: set() for table in TABLES}
+        for table in TABLES:
+            column = settings["watermarks"][table]
+            frame  = pd.DataFrame(su.get_table_rows_since(
+                table, column, _since(state.get(table), column, settings["overlap_seconds"])))
+            if not frame.empty:
+                # Offset paging can return a row twice when it is edited mid-read
+                frame = frame.drop_duplicates("id", keep="last")
+                state[table] = max(filter(None, [state.get(table), _scalar(frame[column].max())]))
+            rows[table] = frame
+        tombstones = su.get_table_rows_since("deleted_rows", "id", state.get("deleted_rows"))
+        for row in tombstones:
+            if row["table_name"] in deleted:
+                deleted[row["table_name"]].add(row["row_id"])
+        if tombstones:
+            state["deleted_rows"] = max(row["id"] for row in tombstones)
+        return rows, deleted, state
+
+    def sync(self, settings: dict = None) -> dict:
+        """
+        Appends what changed in Supabase since the watermarks: changed rows,
+        their line items re-derived, and tombstones for deleted rows.
+        Returns the number of rows written per table.
+        """
+        written = {}
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            rows, deleted, state = self.changes(settings)
+            batch = time.time_ns()
+            for table, (date_column, _) in TABLES.items():
+                frame = rows[table]
+                if not frame.empty:
+                    frame["month"] = _month(frame[date_column]) if date_column in frame else UNKNOWN_MONTH
+                written[table] = self.append(table, frame, batch) + self.append(table, _tombstones(deleted[table]), batch)
+                if table == "expenses":
+                    items = _explode_line_items(frame) if not frame.empty else pd.DataFrame()
+                    written["line_items"] = self.append("line_items", items, batch) + self.append(
+                        "line_items", _tombstones(deleted[table], "expense_id"), batch)
+            self._save_watermarks(state)
+        return written
+
+    def compact(self, table: str):
+        """
+        Rewrites each month of `table` as a single part holding only current
+        rows; copies superseded elsewhere and tombstones with nothing left to
+        hide are dropped.
+        """
+        dataset = self.dataset(table)
+        if dataset is None:
+            return
+        path, key = os.path.join(self.root, table), _key(table)
+        with self._lock:
+            current = _current(table, _index(dataset, table))
+            for folder in sorted(os.listdir(path)):
+                parts = [os.path.join(path, folder, p) for p in os.listdir(os.path.join(path, folder))
+                         if not p.startswith(".")]
+                if not parts:
+                    continue
+                frame = pd.concat([pq.read_table(p, memory_map=True).to_pandas() for p in parts], ignore_index=True)
+                keep  = frame.merge(current, on=[key, BATCH_COLUMN])
+                if len(parts) == 1 and len(keep) == len(frame):
+                    continue
+                if not keep.empty:
+                    tmp = os.path.join(path, folder, ".compact.tmp")   # dot files are skipped by readers
+                    pq.write_table(_to_arrow(keep), tmp)
+                for p in parts:
+                    os.remove(p)
+                if keep.empty:
+                    os.rmdir(os.path.join(path, folder))
+                else:
+                    os.replace(tmp, os.path.join(path, folder, f"part-{keep[BATCH_COLUMN].max()}.parquet"))
+
+    # --- reading ---
+
+    def dataset(self, table: str):
+        """Memory-mapped Arrow dataset over every part of `table` (None if never synced)."""
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return None
+        files = ds.dataset(path, format="parquet", partitioning="hive", filesystem=self._fs)
+        # Parts written by different syncs can disagree on all-null columns
+        schema = pa.unify_schemas([f.physical_schema for f in files.get_fragments()] + [files.schema],
+                                  promote_options="permissive")
+        return ds.dataset(path, format="parquet", partitioning="hive", filesystem=self._fs, schema=schema)
+
+    def load(self, table: str, columns: list = None, months: list = None) -> pd.DataFrame:
+        """
+        Current rows of `table` as a DataFrame, optionally restricted to some
+        columns and `months` ("YYYY-MM"); only matching partitions are read
+        in full.
+        """
+        dataset = self.dataset(table)
+        if dataset is None:
+            return pd.DataFrame(columns=columns or [])
+        key = _key(table)
+        # The current copy of a row is decided across every month: a row whose
+        # date moved, or its tombstone, sits in another partition
+        current = _current(table, _index(dataset, table))
+        wanted  = None if columns is None else [
+            c for c in dict.fromkeys([*columns, key, BATCH_COLUMN]) if c in dataset.schema.names
+        ]
+        # Tombstones are skipped in the scan: their null columns would turn ints into floats
+        flag    = ds.field(DELETED_COLUMN)
+        filter_ = (flag.is_null() | (flag == False)) if DELETED_COLUMN in dataset.schema.names else None  # noqa: E712
+        if months:
+            filter_ = ds.field("month").isin(months) if filter_ is None else filter_ & ds.field("month").isin(months)
+        frame   = dataset.to_table(columns=wanted, filter=filter_).to_pandas().merge(current, on=[key, BATCH_COLUMN])
+        frame   = frame.drop(columns=[BATCH_COLUMN, DELETED_COLUMN], errors="ignore")
+        frame   = frame.sort_values([c for c in (key, "position") if c in frame]).reset_index(drop=True)
+        # Columns the snapshot has never seen come back empty rather than raising
+        return frame.reindex(columns=columns) if columns else frame
+
+    def live(self, columns: dict, settings: dict = None) -> dict:
+        """
+        {table: rows} for the `columns` asked for ({"expenses": [...], ...},
+        None for all) as Supabase has them now: the snapshot with rows changed
+        since its last sync replacing their copies and deleted rows removed.
+        Only the changes come from Supabase; nothing is written. Nested
+        columns (line_items) are JSON text in snapshot rows, not in fresh ones.
+        """
+        rows, deleted, _ = self.changes(settings)
+        out = {}
+        for table, wanted in columns.items():
+            base  = self.load(table, wanted)
+            fresh = rows[table]
+            if fresh.empty:
+                out[table] = base[~base["id"].isin(deleted[table])].reset_index(drop=True)
+                continue
+            fresh = fresh.reindex(columns=base.columns) if wanted else fresh
+            gone  = deleted[table] | set(fresh["id"])
+            out[table] = pd.concat([base[~base["id"].isin(gone)], fresh[~fresh["id"].isin(deleted[table])]],
+                                   ignore_index=True).sort_values("id").reset_index(drop=True)
+        return out
+
+
+def _index(dataset, table: str) -> pd.DataFrame:
+    """Key, batch and tombstone flag of every stored copy (three narrow columns)."""
+    columns = [c for c in (_key(table), BATCH_COLUMN, DELETED_COLUMN) if c in dataset.schema.names]
+    return dataset.to_table(columns=columns).to_pandas()
+
+
+def _current(table: str, index: pd.DataFrame) -> pd.DataFrame:
+    """
+    (key, batch) of the newest copy of each row, leaving out rows whose
+    newest copy is a tombstone. A tombstone wins over a copy from its own batch.
+    """
+    key = _key(table)
+    if index.empty:
+        return pd.DataFrame({key: pd.Series(dtype="int64"), BATCH_COLUMN: pd.Series(dtype="int64")})
+    if DELETED_COLUMN not in index:
+        index = index.assign(**{DELETED_COLUMN: False})
+    newest = index[index[BATCH_COLUMN] == index.groupby(key)[BATCH_COLUMN].transform("max")]
+    dead   = newest.loc[newest[DELETED_COLUMN].fillna(False).astype(bool), key]
+    return newest.loc[~newest[key].isin(dead), [key, BATCH_COLUMN]].drop_duplicates().reset_index(drop=True)
+
+
+@st.cache_resource
+def _get_snapshot(root: str) -> ParquetSnapshot:
+    return ParquetSnapshot(root)
+
+
+def get_snapshot() -> ParquetSnapshot:
+    """Process-wide snapshot store rooted at [snapshot] dir."""
+    return _get_snapshot(snapshot_settings()["dir"])
+
+
+def load_snapshot(table: str, columns: list = None, months: list = None) -> pd.DataFrame:
+    """Shortcut for get_snapshot().load(...)."""
+    return get_snapshot().load(table, columns, months)
+
+
+def load_live(columns: dict) -> dict:
+    """Shortcut for get_snapshot().live(...)."""
+    return get_snapshot().live(columns)
+
+
+if __name__ == "__main__":
+    snapshot = get_snapshot()
+    counts = snapshot.sync()
+    for name in counts:
+        snapshot.compact(name)
+    print(json.dumps({"dir": snapshot.root, "written": counts, "watermarks": snapshot.watermarks()}, indent=2))
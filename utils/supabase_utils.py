@@ -1,20 +1,41 @@
 # File: utils/supabase_utils.py
 
 import streamlit as st
-from supabase import create_client, Client
-import pandas as pd
 from datetime import datetime
-import os
 import json
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-@st.cache_resource
-def init_connection() -> Client:
+from utils.audit_utils import audit, audit_many
+from utils.change_feed_utils import cached_query, changed
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# supabase and pandas are imported lazily: the client is only built on
+# first use and pandas only when a query result is turned into a DataFrame,
+# which keeps the cold start of the login page cheap.
+#
+# Read-mostly queries (reports, approver inbox, reference lists) are cached
+# process-wide with @cached_query until the tables they read change (see
+# change_feed_utils); every write here reports its table with changed().
+# Cached functions return plain rows, shared by all sessions: the public
+# wrappers build a fresh DataFrame or list from them.
+
+def init_connection() -> "Client":
+    """
+    Returns the calling thread's Supabase client from the process-wide pool
+    (keep-alive connections, timeouts and retries; see connection_utils),
+    or the in-memory stand-in when the local backend is enabled.
+    """
+    from utils.local_backend_utils import get_local_client, local_backend_enabled
+    if local_backend_enabled():
+        return get_local_client()
+    from utils.connection_utils import get_client_pool
     try:
-        url = st.secrets["supabase"]["url"]
-        key = st.secrets["supabase"]["key"]
-        return create_client(url, key)
+        return get_client_pool().client()
     except KeyError:
         st.error("Supabase credentials not found.")
         st.stop()
@@ -66,14 +87,17 @@ def register_user(username, name, email, hashed_password, role="user"):
         if supabase.table("users").select("id", count="exact").eq("username", username).execute().count > 0:
             st.error(f"Username '{username}' already taken.")
             return False
-        supabase.table("users").insert({
+        resp = supabase.table("users").insert({
             "username": username,
             "name":     name,
             "email":    email,
             "hashed_password": hashed_password,
             "role":     role
         }).execute()
-        return True
+        user_id = resp.data[0]["id"]
+        changed("users", "INSERT")
+        audit("create", "user", user_id, {"username": username, "name": name, "email": email, "role": role})
+        return user_id
     except Exception as e:
         st.error(f"Error during registration: {e}")
         return False
@@ -87,7 +111,17 @@ def get_user_role(username: str):
         st.error(f"Error fetching user role: {e}")
         return None
 
+def get_user_id(username: str):
+    supabase = init_connection()
+    try:
+        resp = supabase.table("users").select("id").eq("username", username).execute()
+        return resp.data[0]["id"] if resp.data else None
+    except Exception as e:
+        st.error(f"Error fetching user: {e}")
+        return None
+
 def get_all_users():
+    import pandas as pd
     supabase = init_connection()
     try:
         resp = supabase.table("users").select(
@@ -107,11 +141,64 @@ def get_all_users():
         st.error(f"Error fetching all users: {e}")
         return pd.DataFrame()
 
-def get_all_approvers():
+def search_users(query: str = "", page: int = 0, page_size: int = 25):
+    """
+    One page of users whose username, name or email starts with `query`
+    (case-insensitive; trigram indexes in sql/002_user_search.sql), ordered
+    by name. Returns (rows, total_matches).
+    """
     supabase = init_connection()
+    # Characters with a meaning in PostgREST or() syntax (and its * wildcard)
+    # are dropped; LIKE's own wildcards and escape character are escaped
+    term = "".join("\\" + ch if ch in "\\%_" else ch
+                   for ch in (query or "").strip() if ch not in ',()*"\'')
     try:
-        resp = supabase.table("users").select("id, name").in_("role", ["approver", "admin"]).execute()
-        return resp.data
+        request = supabase.table("users").select(
+            "id, username, name, email, role, default_category_id", count="exact"
+        )
+        if term:
+            request = request.or_(f"username.ilike.{term}*,name.ilike.{term}*,email.ilike.{term}*")
+        resp = request.order("name", desc=False).order("id", desc=False)\
+            .range(page * page_size, (page + 1) * page_size - 1).execute()
+        return resp.data, resp.count or 0
+    except Exception as e:
+        st.error(f"Error searching users: {e}")
+        return [], 0
+
+def get_existing_usernames(usernames, chunk_size: int = 200):
+    """
+    Which of `usernames` are already taken, compared case-insensitively and
+    returned lower-cased; chunked to keep URLs short. Only letters-and-digits
+    names are looked up (nothing else can be registered or imported), which
+    also keeps them free of or()/ilike syntax.
+    """
+    supabase = init_connection()
+    usernames = [u for u in dict.fromkeys(u.lower() for u in usernames) if u.isascii() and u.isalnum()]
+    taken = set()
+    try:
+        for i in range(0, len(usernames), chunk_size):
+            resp = supabase.table("users").select("username")\
+                .or_(",".join(f"username.ilike.{u}" for u in usernames[i:i + chunk_size])).execute()
+            taken.update(u["username"].lower() for u in resp.data)
+        return taken
+    except Exception as e:
+        st.error(f"Error checking usernames: {e}")
+        raise
+
+def insert_users_batch(rows: list):
+    """Inserts many users in one request; returns the created rows (raises on failure)."""
+    resp = init_connection().table("users").insert(rows).execute()
+    changed("users", "INSERT")
+    audit_many("create", "user", [r.get("id") for r in resp.data or []])
+    return resp.data or []
+
+@cached_query("users")
+def _fetch_approvers():
+    return init_connection().table("users").select("id, name").in_("role", ["approver", "admin"]).execute().data
+
+def get_all_approvers():
+    try:
+        return [dict(u) for u in _fetch_approvers()]
     except Exception as e:
         st.error(f"Error fetching approvers: {e}")
         return []
@@ -124,6 +211,9 @@ def update_user_details(user_id, role, approver_id, default_category_id):
             "approver_id":         approver_id,
             "default_category_id": default_category_id
         }).eq("id", user_id).execute()
+        changed("users", "UPDATE")
+        audit("update", "user", user_id, {"role": role, "approver_id": approver_id,
+                                          "default_category_id": default_category_id})
         return True
     except Exception as e:
         st.error(f"Error updating user details: {e}")
@@ -133,12 +223,14 @@ def delete_user(user_id):
     supabase = init_connection()
     try:
         supabase.table("users").delete().eq("id", user_id).execute()
+        changed("users", "DELETE")
+        audit("delete", "user", user_id)
         return True
     except Exception as e:
         st.error(f"Error deleting user: {e}")
         return False
 
-def add_report(user_id, report_name, total_amount):
+def add_report(user_id, report_name, total_amount, status="Submitted"):
     supabase = init_connection()
     try:
         resp = supabase.table("reports").insert({
@@ -146,9 +238,12 @@ def add_report(user_id, report_name, total_amount):
             "report_name":     report_name,
             "submission_date": datetime.now().isoformat(),
             "total_amount":    total_amount,
-            "status":          "Submitted"
+            "status":          status
         }).execute()
-        return resp.data[0]["id"] if resp.data else None
+        report_id = resp.data[0]["id"] if resp.data else None
+        changed("reports", "INSERT")
+        audit("create", "report", report_id, {"report_name": report_name, "total_amount": total_amount})
+        return report_id
     except Exception as e:
         st.error(f"Error adding report: {e}")
         return None
@@ -170,7 +265,7 @@ def add_expense_item(
 ):
     supabase = init_connection()
     try:
-        supabase.table("expenses").insert({
+        resp = supabase.table("expenses").insert({
             "report_id":   report_id,
             "expense_date": str(expense_date),
             "vendor":       vendor,
@@ -185,6 +280,9 @@ def add_expense_item(
             "hst_amount":   hst_amount,
             "line_items":   json.dumps(line_items) if line_items else None
         }).execute()
+        changed("expenses", "INSERT")
+        audit("create", "expense", resp.data[0]["id"] if resp.data else None, {"report_id": report_id, "vendor": vendor, "amount": amount,
+                                          "currency": currency, "category_id": category_id})
         return True
     except Exception as e:
         st.error(f"Error saving expense item: {e}")
@@ -194,81 +292,174 @@ def update_expense_item(expense_id, updates: dict):
     supabase = init_connection()
     try:
         supabase.table("expenses").update(updates).eq("id", expense_id).execute()
+        changed("expenses", "UPDATE")
+        audit("update", "expense", expense_id, {k: v for k, v in updates.items() if k not in ("ocr_text", "line_items")})
         return True
     except Exception as e:
         st.error(f"Error updating expense item: {e}")
         return False
 
-def get_reports_for_user(user_id: str):
-    """Fetch all reports submitted by a given user, newest first."""
-    supabase = init_connection()
-    resp = (
-        supabase
+@cached_query("reports", "users")
+def _fetch_reports_for_user(user_id: str):
+    return (
+        init_connection()
         .table("reports")
         .select("*, user:users!left(name)")
         .eq("user_id", user_id)
         .order("submission_date", desc=True)
         .execute()
-    )
-    return pd.DataFrame(resp.data)
+    ).data
+
+def get_reports_for_user(user_id: str):
+    """Fetch all reports submitted by a given user, newest first."""
+    import pandas as pd
+    return pd.DataFrame(_fetch_reports_for_user(user_id))
+
+@cached_query("expenses", "reports")
+def _fetch_expense_amounts_for_user(user_id: str):
+    return init_connection().table("expenses")\
+        .select("amount, currency, expense_date, report:reports!inner(user_id)")\
+        .eq("report.user_id", user_id)\
+        .execute().data
+
+def get_expense_amounts_for_user(user_id: str):
+    """Amount, currency and date of every expense on the user's reports (for FX-aware totals)."""
+    import pandas as pd
+    try:
+        return pd.DataFrame(_fetch_expense_amounts_for_user(user_id), columns=["amount", "currency", "expense_date"])
+    except Exception as e:
+        st.error(f"Error fetching expense amounts: {e}")
+        return pd.DataFrame(columns=["amount", "currency", "expense_date"])
+
+# Report listings leave out the heavy columns (ocr_text, line_items);
+# get_expense_details loads them for the rows a user opens or exports.
+EXPENSE_LIST_COLUMNS = ("id, report_id, expense_date, vendor, description, amount, currency, category_id, "
+                        "receipt_path, gst_amount, pst_amount, hst_amount")
+EXPENSE_DETAIL_COLUMNS = ("ocr_text", "line_items")
+
+@cached_query("expenses", "categories")
+def _fetch_expenses_for_report(report_id: str):
+    resp = init_connection().table("expenses").select(
+        f"{EXPENSE_LIST_COLUMNS}, category:categories!left(id, name, gl_account)"
+    ).eq("report_id", report_id).execute()
+    expenses = resp.data
+    for exp in expenses:
+        cat = exp.pop("category", None)
+        if isinstance(cat, dict):
+            exp["category_name"] = cat.get("name")
+            exp["gl_account"]    = cat.get("gl_account")
+        else:
+            exp["category_name"] = None
+            exp["gl_account"]    = None
+    return expenses
 
 def get_expenses_for_report(report_id: str):
-    supabase = init_connection()
+    """A report's expenses without ocr_text/line_items (see get_expense_details)."""
+    import pandas as pd
     try:
-        resp = supabase.table("expenses").select(
-            "*, category:categories!left(id, name, gl_account)"
-        ).eq("report_id", report_id).execute()
-        expenses = resp.data
-        for exp in expenses:
-            cat = exp.pop("category", None)
-            if isinstance(cat, dict):
-                exp["category_name"] = cat.get("name")
-                exp["gl_account"]    = cat.get("gl_account")
-            else:
-                exp["category_name"] = None
-                exp["gl_account"]    = None
-        return pd.DataFrame(expenses)
+        return pd.DataFrame(_fetch_expenses_for_report(report_id))
     except Exception as e:
         st.error(f"Error fetching expense items: {e}")
         return pd.DataFrame()
 
+@cached_query("expenses")
+def _fetch_expense_details(expense_ids: tuple):
+    return init_connection().table("expenses").select(
+        "id, " + ", ".join(EXPENSE_DETAIL_COLUMNS)
+    ).in_("id", list(expense_ids)).execute().data
+
+def get_expense_details(expense_ids) -> dict:
+    """{expense id: {"ocr_text", "line_items"}} for the given expenses."""
+    ids = tuple(sorted(set(expense_ids)))
+    if not ids:
+        return {}
+    try:
+        return {row["id"]: {c: row.get(c) for c in EXPENSE_DETAIL_COLUMNS} for row in _fetch_expense_details(ids)}
+    except Exception as e:
+        st.error(f"Error fetching expense details: {e}")
+        return {}
+
+def with_expense_details(expenses):
+    """The expenses DataFrame with ocr_text and line_items filled in, for exports."""
+    if expenses.empty:
+        return expenses
+    details = get_expense_details(expenses["id"].tolist())
+    return expenses.assign(**{
+        c: expenses["id"].map(lambda i, c=c: details.get(i, {}).get(c)) for c in EXPENSE_DETAIL_COLUMNS
+    })
+
 def get_receipt_public_url(path: str):
     supabase = init_connection()
     if not path:
         return ""
     return supabase.storage.from_("receipts").get_public_url(path)
 
-def get_reports_for_approver(approver_id: str):
+def download_receipt(path: str) -> bytes:
+    """Receipt file contents from the 'receipts' bucket (raises on failure)."""
+    return init_connection().storage.from_("receipts").download(path)
+
+def upload_receipt(uploaded_file, username: str):
+    """
+    Uploads a receipt to the 'receipts' bucket and returns its storage path.
+    Large files go up in resumable parts straight from the uploaded buffer
+    (see upload_utils); calling again with the same file after a failure
+    resumes the earlier upload.
+    """
+    from utils.perf_utils import record_timing
+    from utils.upload_utils import upload_file
+    try:
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        stats = upload_file(
+            "receipts",
+            f"{username}/{stamp}_{uploaded_file.name}",
+            uploaded_file,
+            uploaded_file.type,
+            key=getattr(uploaded_file, "file_id", None),
+        )
+        record_timing("receipt upload", stats.seconds)
+        return stats.path
+    except Exception as e:
+        st.error(f"Error uploading receipt: {e}")
+        return None
+
+@cached_query("users", "reports")
+def _fetch_reports_for_approver(approver_id: str):
     supabase = init_connection()
+    apr = supabase.table("users").select("default_category_id")\
+        .eq("id", approver_id).maybe_single().execute()
+    cat_id = apr.data.get("default_category_id") if apr and apr.data else None
+    if not cat_id:
+        return []
+    emps = supabase.table("users").select("id")\
+        .eq("default_category_id", cat_id)\
+        .neq("id", approver_id).execute()
+    emp_ids = [u["id"] for u in emps.data]
+    if not emp_ids:
+        return []
+    return supabase.table("reports")\
+        .select("*, user:users!left(name)")\
+        .in_("user_id", emp_ids)\
+        .order("submission_date", desc=True)\
+        .execute().data
+
+def get_reports_for_approver(approver_id: str):
+    import pandas as pd
     try:
-        apr = supabase.table("users").select("default_category_id")\
-            .eq("id", approver_id).maybe_single().execute()
-        cat_id = apr.data.get("default_category_id") if apr.data else None
-        if not cat_id:
-            return pd.DataFrame()
-        emps = supabase.table("users").select("id")\
-            .eq("default_category_id", cat_id)\
-            .neq("id", approver_id).execute()
-        emp_ids = [u["id"] for u in emps.data]
-        if not emp_ids:
-            return pd.DataFrame()
-        rep = supabase.table("reports")\
-            .select("*, user:users!left(name)")\
-            .in_("user_id", emp_ids)\
-            .order("submission_date", desc=True)\
-            .execute()
-        return pd.DataFrame(rep.data)
+        return pd.DataFrame(_fetch_reports_for_approver(approver_id))
     except Exception as e:
         st.error(f"Error fetching reports for approver: {e}")
         return pd.DataFrame()
 
+@cached_query("reports", "users")
+def _fetch_all_reports():
+    return init_connection().table("reports").select(
+        "*, user:users!left(name)"
+    ).order("submission_date", desc=True).execute().data
+
 def get_all_reports():
-    supabase = init_connection()
+    import pandas as pd
     try:
-        resp = supabase.table("reports").select(
-            "*, user:users!left(name)"
-        ).order("submission_date", desc=True).execute()
-        return pd.DataFrame(resp.data)
+        return pd.DataFrame(_fetch_all_reports())
     except Exception as e:
         st.error(f"Error fetching all reports: {e}")
         return pd.DataFrame()
@@ -280,17 +471,59 @@ def update_report_status(report_id, status, comment=None):
         if comment:
             updates["approver_comment"] = comment
         supabase.table("reports").update(updates).eq("id", report_id).execute()
+        changed("reports", "UPDATE")
+        audit("status", "report", report_id, updates)
         return True
     except Exception as e:
         st.error(f"Error updating report status: {e}")
         return False
 
-def get_all_categories():
+def update_report_total(report_id, total_amount):
     supabase = init_connection()
     try:
-        resp = supabase.table("categories").select("id, name, gl_account")\
-            .order("name", desc=False).execute()
-        return resp.data
+        supabase.table("reports").update({"total_amount": total_amount}).eq("id", report_id).execute()
+        changed("reports", "UPDATE")
+        audit("update", "report", report_id, {"total_amount": total_amount})
+        return True
+    except Exception as e:
+        st.error(f"Error updating report total: {e}")
+        return False
+
+def bulk_update_report_status(report_ids, status, comment=None, expected_status="Submitted"):
+    """
+    Moves many reports to `status` in one UPDATE ... WHERE id IN (...), but
+    only those still in `expected_status`, so a report someone else already
+    actioned is left alone. Returns {report_id: "updated" | "skipped" | "error"}.
+    """
+    report_ids = list(dict.fromkeys(report_ids))
+    if not report_ids:
+        return {}
+    supabase = init_connection()
+    try:
+        updates = {"status": status}
+        if comment:
+            updates["approver_comment"] = comment
+        resp = supabase.table("reports").update(updates)\
+            .in_("id", report_ids)\
+            .eq("status", expected_status)\
+            .execute()
+        updated = {row["id"] for row in resp.data or []}
+        if updated:
+            changed("reports", "UPDATE")
+        audit_many("status", "report", [rid for rid in report_ids if rid in updated], updates)
+        return {rid: "updated" if rid in updated else "skipped" for rid in report_ids}
+    except Exception as e:
+        st.error(f"Error updating report statuses: {e}")
+        return {rid: "error" for rid in report_ids}
+
+@cached_query("categories")
+def _fetch_categories():
+    return init_connection().table("categories").select("id, name, gl_account")\
+        .order("name", desc=False).execute().data
+
+def get_all_categories():
+    try:
+        return [dict(c) for c in _fetch_categories()]
     except Exception as e:
         st.error(f"Error fetching categories: {e}")
         return []
@@ -302,11 +535,14 @@ def add_category(name, gl_account):
             .eq("name", name).execute().count > 0:
             st.warning(f"Category '{name}' already exists.")
             return False
-        supabase.table("categories").insert({
+        resp = supabase.table("categories").insert({
             "name":       name,
             "gl_account": gl_account
         }).execute()
-        return True
+        category_id = resp.data[0]["id"]
+        changed("categories", "INSERT")
+        audit("create", "category", category_id, {"name": name, "gl_account": gl_account})
+        return category_id
     except Exception as e:
         st.error(f"Error adding category: {e}")
         return False
@@ -318,6 +554,8 @@ def update_category(category_id, name, gl_account):
             "name":       name,
             "gl_account": gl_account
         }).eq("id", category_id).execute()
+        changed("categories", "UPDATE")
+        audit("update", "category", category_id, {"name": name, "gl_account": gl_account})
         return True
     except Exception as e:
         st.error(f"Error updating category: {e}")
@@ -327,9 +565,271 @@ def delete_category(category_id):
     supabase = init_connection()
     try:
         supabase.table("categories").delete().eq("id", category_id).execute()
+        changed("categories", "DELETE")
+        audit("delete", "category", category_id)
         return True
     except Exception as e:
         st.error(f"Error deleting category: {e}")
         return False
 
-# (any XML‐generation helper functions follow…)
+def _get_expenses_since(columns: str, last_id=None, page_size: int = 1000, categorised_only: bool = False,
+                        report_statuses=None):
+    """
+    Pages through expenses with ids above `last_id`, oldest first. With
+    `report_statuses`, `columns` must embed the report as `report:reports!inner(...)`.
+    """
+    supabase = init_connection()
+    rows = []
+    try:
+        while True:
+            query = supabase.table("expenses").select(columns)
+            if categorised_only:
+                query = query.not_.is_("category_id", "null")
+            if report_statuses:
+                query = query.in_("report.status", list(report_statuses))
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id", desc=False).limit(page_size).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            last_id = page[-1]["id"]
+    except Exception as e:
+        st.error(f"Error fetching expense history: {e}")
+        return rows
+
+def get_expense_categories_since(last_id=None, page_size: int = 1000):
+    """
+    Categorised expense history (id, vendor, category_id, line_items) with
+    ids above `last_id`, oldest first. Feeds the vendor category classifier.
+    """
+    return _get_expenses_since("id, vendor, category_id, line_items", last_id, page_size, categorised_only=True)
+
+def get_expense_facts_since(last_id=None, page_size: int = 1000, report_statuses=("Submitted", "Approved")):
+    """
+    Amounts, taxes, category and submitter of expenses above `last_id` on
+    reports in `report_statuses` (spend cube input).
+    """
+    return _get_expenses_since(
+        "id, expense_date, amount, currency, category_id, gst_amount, pst_amount, hst_amount, "
+        "report:reports!inner(user_id, status)",
+        last_id, page_size, report_statuses=report_statuses,
+    )
+
+def get_table_rows_since(table: str, watermark_column: str = "id", last_value=None,
+                         columns: str = "*", page_size: int = 1000):
+    """
+    Rows of `table` whose `watermark_column` is past `last_value`, in
+    watermark order. Ids page by keyset (> last id); timestamps are matched
+    with >= and paged by offset, so rows sharing the boundary timestamp are
+    re-read and must be deduplicated by id by the caller.
+    """
+    supabase = init_connection()
+    rows = []
+    by_id = watermark_column == "id"
+    try:
+        while True:
+            query = supabase.table(table).select(columns)
+            if by_id:
+                if last_value is not None:
+                    query = query.gt("id", last_value)
+                page = query.order("id", desc=False).limit(page_size).execute().data
+            else:
+                if last_value is not None:
+                    query = query.gte(watermark_column, last_value)
+                page = query.order(watermark_column, desc=False).order("id", desc=False)\
+                    .range(len(rows), len(rows) + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            if by_id:
+                last_value = page[-1]["id"]
+    except Exception as e:
+        st.error(f"Error fetching {table} changes: {e}")
+        return rows
+
+def get_users_for_analytics():
+    """Users with their department name, falling back to plain users if departments are not linked."""
+    supabase = init_connection()
+    try:
+        resp = supabase.table("users").select("id, name, department:departments(name)").execute()
+        return [
+            {"id": u["id"], "name": u["name"], "department": (u.get("department") or {}).get("name")}
+            for u in resp.data
+        ]
+    except Exception:
+        try:
+            resp = supabase.table("users").select("id, name").execute()
+            return [{"id": u["id"], "name": u["name"], "department": None} for u in resp.data]
+        except Exception as e:
+            st.error(f"Error fetching users: {e}")
+            return []
+
+@cached_query("departments")
+def _fetch_departments():
+    return init_connection().table("departments").select("id, name")\
+        .order("name", desc=False).execute().data
+
+def get_all_departments():
+    try:
+        return [dict(d) for d in _fetch_departments()]
+    except Exception as e:
+        st.error(f"Error fetching departments: {e}")
+        return []
+
+# --- BULK GRID EDITS ---
+def get_reference_counts(table: str, ids: list, references: dict):
+    """
+    For each id in `table`, how many rows of each referencing table point at
+    it, in one query using PostgREST embedded counts. `references` maps a
+    label to an embed, e.g. {"expenses": "expenses(count)"}.
+    Returns {id: {label: count}}.
+    """
+    if not ids:
+        return {}
+    supabase = init_connection()
+    embeds = ", ".join(f"{label}:{embed}" for label, embed in references.items())
+    resp = supabase.table(table).select(f"id, {embeds}").in_("id", ids).execute()
+    return {
+        row["id"]: {label: ((row.get(label) or [{}])[0] or {}).get("count", 0) for label in references}
+        for row in resp.data
+    }
+
+def apply_grid_diff(table: str, entity: str, diff, references: dict = None):
+    """
+    Applies a GridDiff (see utils.grid_utils) to `table`, auditing each row
+    as `entity`, with at most one upsert, one insert and one delete.
+    Ids still referenced (per get_reference_counts) are not deleted.
+    Returns (ok, blocked) where blocked maps id -> {label: count}, or
+    id -> None when the check itself failed (then nothing is deleted).
+    """
+    supabase = init_connection()
+    blocked  = {}
+    try:
+        deletes = list(diff.deletes)
+        if deletes and references:
+            try:
+                counts = get_reference_counts(table, deletes, references)
+                blocked = {i: c for i, c in counts.items() if any(c.values())}
+            except Exception as e:
+                if getattr(e, "code", None) != "PGRST200":
+                    # Unknown usage: deleting could orphan rows, so keep them all
+                    blocked = dict.fromkeys(deletes)
+                # PGRST200: relationship not in the schema, nothing can reference these rows
+            deletes = [i for i in deletes if i not in blocked]
+        if diff.updates:
+            supabase.table(table).upsert(diff.updates).execute()
+            changed(table, "UPDATE")
+            for row in diff.updates:
+                audit("update", entity, row["id"], {k: v for k, v in row.items() if k != "id"})
+        if diff.inserts:
+            resp = supabase.table(table).insert(diff.inserts).execute()
+            changed(table, "INSERT")
+            for row in resp.data or []:
+                audit("create", entity, row.get("id"), {k: row.get(k) for k in diff.inserts[0]})
+        if deletes:
+            supabase.table(table).delete().in_("id", deletes).execute()
+            changed(table, "DELETE")
+            audit_many("delete", entity, deletes)
+        return True, blocked
+    except Exception as e:
+        st.error(f"Error saving {table}: {e}")
+        return False, blocked
+
+# --- CONCURRENT LOADING ---
+@st.cache_resource
+def _get_loader_pool() -> ThreadPoolExecutor:
+    """Process-wide worker threads for load_concurrently()."""
+    workers = int(st.secrets.get("supabase", {}).get("loader_workers", 8))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-loader")
+
+def load_concurrently(queries: dict):
+    """
+    Runs independent queries at the same time, so a page waits for the
+    slowest one instead of the sum of all of them.
+
+    `queries` maps a name to a zero-argument callable, e.g.
+        load_concurrently({"approvers": get_all_approvers,
+                           "user": lambda: get_single_user_details(uid)})
+    Returns (results, timings): both dicts keyed by name, timings in seconds.
+    Each timing is also recorded as "query: <name>" in the session's perf log.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+    from utils.perf_utils import record_timing
+
+    # Attach the session's script context so st.error() from a helper
+    # still renders on the page, for this call only: pooled threads are
+    # shared by every session
+    ctx = get_script_run_ctx()
+
+    def run(fn):
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        start = time.perf_counter()
+        try:
+            return fn(), time.perf_counter() - start
+        finally:
+            # add_script_run_ctx(thread, None) would re-attach the current ctx
+            if hasattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME):
+                delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+
+    start   = time.perf_counter()
+    pool    = _get_loader_pool()
+    futures = {name: pool.submit(run, fn) for name, fn in queries.items()}
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+        record_timing(f"query: {name}", timings[name])
+    record_timing("query fan-out (wall)", time.perf_counter() - start)
+    return results, timings
+
+
+# --- JOURNAL EXPORT PAGING ---
+# These raise instead of returning a fallback: a journal silently missing
+# a page of reports is worse than a failed export.
+def get_approved_reports_page(start, end, after_id=None, page_size: int = 200):
+    """Approved reports submitted in [start, end) with ids above `after_id`, by id."""
+    query = init_connection().table("reports")\
+        .select("id, report_name, submission_date, user_id, total_amount, user:users!left(name, username)")\
+        .eq("status", "Approved")\
+        .gte("submission_date", str(start))\
+        .lt("submission_date", str(end))
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    return query.order("id", desc=False).limit(page_size).execute().data
+
+def get_expenses_in_period(start, end, page_size: int = 1000):
+    """Every expense dated in [start, end), with taxes and category, paged by id."""
+    rows, last_id = [], None
+    while True:
+        query = init_connection().table("expenses")\
+            .select("id, report_id, expense_date, vendor, description, amount, currency, category_id, "
+                    "gst_amount, pst_amount, hst_amount")\
+            .gte("expense_date", str(start))\
+            .lt("expense_date", str(end))
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.order("id", desc=False).limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last_id = page[-1]["id"]
+
+def get_expenses_for_reports(report_ids, page_size: int = 1000, line_items: bool = True):
+    """Every expense (with taxes, and line items unless line_items=False) on the given reports, by id."""
+    if not report_ids:
+        return []
+    rows, last_id = [], None
+    while True:
+        query = init_connection().table("expenses")\
+            .select("id, report_id, expense_date, vendor, description, amount, currency, category_id, "
+                    "gst_amount, pst_amount, hst_amount" + (", line_items" if line_items else ""))\
+            .in_("report_id", list(report_ids))
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.order("id", desc=False).limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last_id = page[-1]["id"]
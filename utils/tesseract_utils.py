@@ -0,0 +1,116 @@
+# File: utils/tesseract_utils.py
+#
+# Local Tesseract OCR and the prototype's regex parser (expenseitp.py).
+# Kept free of streamlit/pandas imports: this module is what batch OCR
+# worker processes import. PyMuPDF, Pillow and pytesseract are imported
+# on first use.
+
+import io
+import os
+import re
+import time
+
+CATEGORIES = ['food', 'travel', 'utilities', 'rent', 'entertainment', 'misc']
+FILE_TYPES = {".pdf": "application/pdf", ".png": "image/png", ".jpg": "image/jpeg",
+              ".jpeg": "image/jpeg", ".tif": "image/tiff", ".tiff": "image/tiff"}
+
+AMOUNT_RE = re.compile(r'\$?\s*([0-9]+(?:\.[0-9]{2})?)')
+DATE_RE   = re.compile(r'\b(20\d{2})[-/.](\d{2})[-/.](\d{2})\b')
+# A total line: "Total", "Grand total", "Amount due"... but not a subtotal,
+# a tax total or a count; its amount must have cents (1,234.56 or 4,73)
+TOTAL_LINE_RE  = re.compile(r'\b(grand\s+total|total|amount\s+due|balance\s+due|montant\s+total)\b', re.I)
+NOT_TOTAL_RE   = re.compile(r'sub|tax|gst|hst|pst|tps|tvq|qst|saving|discount|items?\b|qty', re.I)
+MONEY_RE       = re.compile(r'(?<![\d.,])(\d{1,3}(?:[ ,]\d{3})+|\d+)[.,](\d{2})(?!\d)')
+
+
+def limit_ocr_threads():
+    """
+    Pool initializer: one Tesseract thread per worker process, so a pool of
+    one process per CPU does not oversubscribe the machine.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def extract_text(data: bytes, mime_type: str, dpi: int = 200) -> tuple:
+    """
+    (text, pages) for a receipt: a PDF's text layer, falling back to OCR of
+    its rendered pages when it has none; images always go through OCR.
+    """
+    from PIL import Image
+
+    if mime_type != "application/pdf":
+        import pytesseract
+        with Image.open(io.BytesIO(data)) as image:
+            return pytesseract.image_to_string(image), 1
+
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        text = "".join(page.get_text() for page in doc)
+        if not text.strip():
+            import pytesseract
+            for page in doc:
+                pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                text += pytesseract.image_to_string(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+                del pix
+        return text, doc.page_count
+
+
+def parse_expenses(text: str) -> list:
+    """
+    [{"Category", "Amount"}] from lines naming a category; when none do,
+    every amount in the text as Misc.
+    """
+    expenses = []
+    for line in text.splitlines():
+        line_lower = line.lower()
+        for cat in CATEGORIES:
+            if cat in line_lower:
+                amounts = AMOUNT_RE.findall(line)
+                if amounts:
+                    expenses.append({'Category': cat.capitalize(), 'Amount': float(amounts[0])})
+
+    if not expenses:
+        for amt in AMOUNT_RE.findall(text):
+            expenses.append({'Category': 'Misc', 'Amount': float(amt)})
+    return expenses
+
+
+def parse_date(text: str):
+    """First YYYY-MM-DD (or / or . separated) date in the text, else None."""
+    match = DATE_RE.search(text)
+    return "-".join(match.groups()) if match else None
+
+
+def parse_total(text: str):
+    """
+    The receipt's total: the last amount on its last total line, a
+    "grand total" line winning over a plain one. None when there is none.
+    """
+    totals, grand = [], []
+    for line in text.splitlines():
+        match = TOTAL_LINE_RE.search(line)
+        if not match or NOT_TOTAL_RE.search(line):
+            continue
+        amounts = MONEY_RE.findall(line[match.start():])
+        if amounts:
+            whole, cents = amounts[-1]
+            amount = float(f"{re.sub(r'[ ,]', '', whole)}.{cents}")
+            (grand if match.group(1).lower().startswith("grand") else totals).append(amount)
+    found = grand or totals
+    return found[-1] if found else None
+
+
+def process_receipt(data: bytes, mime_type: str, dpi: int = 200) -> dict:
+    """OCR and parse one receipt; the unit of work for a batch worker."""
+    start = time.perf_counter()
+    text, pages = extract_text(data, mime_type, dpi)
+    expenses = parse_expenses(text)
+    return {
+        "seconds":  round(time.perf_counter() - start, 3),
+        "pages":    pages,
+        "text":     text,
+        "date":     parse_date(text),
+        "expenses": expenses,          # the prototype's per-category amounts
+        "receipt_total": parse_total(text),
+    }
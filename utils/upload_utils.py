@@ -0,0 +1,242 @@
+# File: utils/upload_utils.py
+#
+# Chunked, resumable uploads to Supabase Storage over its TUS endpoint
+# (/storage/v1/upload/resumable). The source is read one part at a time
+# (zero-copy views for in-memory files such as st.file_uploader results),
+# so an upload never holds a second full copy of the file. If a part fails,
+# the upload asks the server how much it has and carries on from there;
+# the upload URL is kept in st.session_state, so retrying the same file
+# later in the session resumes instead of starting over.
+#
+# TUS takes parts strictly in order, so the parts of one file are sent one
+# after another; separate uploads run side by side over the shared pool.
+
+import base64
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import streamlit as st
+
+# Overridable under [storage.upload] in secrets.toml
+DEFAULT_SETTINGS = {
+    "part_size":      6 * 2**20,   # Supabase requires 6 MiB parts (the last may be shorter)
+    "resumable_from": 6 * 2**20,   # smaller files go up in one plain request
+    "max_retries":    5,           # consecutive failed parts before giving up
+    "backoff_base":   0.5,         # seconds; doubles per retry
+    "backoff_max":    8.0,
+}
+TUS_VERSION = "1.0.0"
+
+
+def upload_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict(st.secrets.get("storage", {}).get("upload", {})))
+    return settings
+
+
+@dataclass
+class UploadStats:
+    """What one upload did; peak_buffered is the most file data it copied at once."""
+    path:          str
+    size:          int   = 0
+    parts:         int   = 0
+    retries:       int   = 0
+    resumed_from:  int   = 0
+    peak_buffered: int   = 0
+    seconds:       float = 0.0
+
+
+def source_size(source) -> int:
+    """Length of a file-like object (or bytes) without reading it."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    size = getattr(source, "size", None)
+    if isinstance(size, int):
+        return size
+    position = source.tell()
+    end = source.seek(0, 2)
+    source.seek(position)
+    return end
+
+
+def _in_memory(source) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview)) or hasattr(source, "getvalue")
+
+
+@contextmanager
+def _whole(source):
+    """
+    A memoryview over all of `source`. BytesIO files built from bytes (as
+    st.file_uploader's are) hand back those bytes from getvalue() without a
+    copy; getbuffer() would copy them, as they are shared with the upload.
+    """
+    if hasattr(source, "getvalue"):
+        with memoryview(source.getvalue()) as view:
+            yield view
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with memoryview(source) as view:
+            yield view
+    else:
+        source.seek(0)
+        yield memoryview(source.read())
+
+
+def iter_parts(source, part_size: int, start: int = 0):
+    """
+    Yields (offset, part) from `start` to the end of `source`. In-memory
+    files are sliced as memoryviews over their buffer (no copy); anything
+    else is read part by part.
+    """
+    if _in_memory(source):
+        with _whole(source) as view:
+            for offset in range(start, len(view), part_size):
+                with view[offset:offset + part_size] as part:
+                    yield offset, part
+        return
+    source.seek(start)
+    offset = start
+    while True:
+        part = source.read(part_size)
+        if not part:
+            return
+        offset += len(part)
+        yield offset - len(part), part
+        del part   # one part in memory at a time
+
+
+class TusClient:
+    """Minimal TUS 1.0 client for Supabase Storage over the shared connection pool."""
+
+    def __init__(self, url: str, key: str, transport=None, timeout: float = 60.0):
+        import httpx
+        self.http = httpx.Client(
+            base_url=f"{url.rstrip('/')}/storage/v1/upload/resumable",
+            headers={"apikey": key, "Authorization": f"Bearer {key}", "Tus-Resumable": TUS_VERSION},
+            transport=transport,
+            timeout=timeout,
+        )
+
+    def create(self, bucket: str, path: str, size: int, content_type: str) -> str:
+        """Registers the upload; returns its URL."""
+        metadata = {"bucketName": bucket, "objectName": path, "contentType": content_type or "application/octet-stream"}
+        response = self.http.post("", headers={
+            "Upload-Length":   str(size),
+            "Upload-Metadata": ",".join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in metadata.items()),
+            "x-upsert":        "false",
+        })
+        response.raise_for_status()
+        return response.headers["location"]
+
+    def offset(self, upload_url: str) -> int:
+        """Bytes the server already has for the upload."""
+        response = self.http.head(upload_url, headers={"Cache-Control": "no-store"})
+        response.raise_for_status()
+        return int(response.headers["upload-offset"])
+
+    def send(self, upload_url: str, offset: int, part) -> int:
+        """
+        Appends `part` at `offset`; returns the new offset. The part goes to
+        the socket as is (an iterator body is not joined), and the exhausted
+        iterator lets go of it even while httpx's request/response cycle
+        waits for the garbage collector.
+        """
+        response = self.http.patch(upload_url, content=iter([part]), headers={
+            "Upload-Offset":  str(offset),
+            "Content-Length": str(len(part)),
+            "Content-Type":   "application/offset+octet-stream",
+        })
+        response.raise_for_status()
+        return int(response.headers["upload-offset"])
+
+
+@st.cache_resource
+def get_tus_client() -> TusClient:
+    """Process-wide TUS client sharing the Supabase connection pool."""
+    from utils.connection_utils import get_client_pool
+    cfg  = st.secrets["supabase"]
+    pool = get_client_pool()
+    return TusClient(cfg["url"], cfg["key"], transport=pool.transport,
+                     timeout=float(pool.settings["read_timeout"]))
+
+
+def _resumable_target(bucket: str):
+    """The TUS client, or the in-memory bucket when the local backend is on."""
+    from utils.local_backend_utils import get_local_client, local_backend_enabled
+    if local_backend_enabled():
+        return get_local_client().storage.from_(bucket).resumable()
+    return get_tus_client()
+
+
+def _pending_uploads() -> dict:
+    """Resumable upload URLs of this session, by upload key."""
+    try:
+        return st.session_state.setdefault("_resumable_uploads", {})
+    except Exception:
+        return {}  # no session (CLI / worker thread): resume only within the call
+
+
+def upload_file(bucket: str, path: str, source, content_type: str = None,
+                key: str = None, settings: dict = None, target=None) -> UploadStats:
+    """
+    Uploads `source` (bytes or a binary file-like object) to `bucket` at
+    `path`. Files below resumable_from go up in one request; larger ones in
+    part_size parts over TUS, resyncing with the server and resending after
+    a failed part. `key` identifies the file across calls (e.g. the
+    uploader's file_id): a later call with the same key resumes the earlier
+    upload, at its original path. Raises after max_retries failures in a row.
+    `target` overrides the TUS client (Supabase, or the local backend).
+    """
+    settings = settings or upload_settings()
+    size     = source_size(source)
+    stats    = UploadStats(path=path, size=size)
+    start    = time.perf_counter()
+
+    if size < int(settings["resumable_from"]):
+        from utils.supabase_utils import init_connection
+        if hasattr(source, "getvalue"):
+            data = source.getvalue()   # no copy for uploader files (see _whole)
+        elif isinstance(source, bytes):
+            data = source
+        else:
+            with _whole(source) as view:
+                data = bytes(view)
+            stats.peak_buffered = size
+        init_connection().storage.from_(bucket).upload(path, data, {"content-type": content_type or "application/octet-stream"})
+        stats.parts, stats.seconds = 1, time.perf_counter() - start
+        return stats
+
+    tus      = target or _resumable_target(bucket)
+    pending  = _pending_uploads()
+    key      = key or f"{bucket}/{path}"
+    existing = pending.get(key)
+    if existing:
+        upload_url, stats.path = existing["url"], existing["path"]
+        offset = stats.resumed_from = tus.offset(upload_url)
+    else:
+        upload_url = tus.create(bucket, path, size, content_type)
+        pending[key] = {"url": upload_url, "path": path}
+        offset = 0
+
+    part_size = int(settings["part_size"])
+    failures  = 0
+    while offset < size:
+        try:
+            for part_offset, part in iter_parts(source, part_size, offset):
+                if not isinstance(part, memoryview):   # read from a stream, not a view
+                    stats.peak_buffered = max(stats.peak_buffered, len(part))
+                offset = tus.send(upload_url, part_offset, part)
+                stats.parts += 1
+                failures = 0
+                del part
+        except Exception:
+            part = None   # the failed part is read again from the server's offset
+            if failures >= int(settings["max_retries"]):
+                raise
+            time.sleep(min(settings["backoff_max"], settings["backoff_base"] * 2 ** failures))
+            failures      += 1
+            stats.retries += 1
+            offset = tus.offset(upload_url)
+    pending.pop(key, None)
+    stats.seconds = time.perf_counter() - start
+    return stats
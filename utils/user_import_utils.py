@@ -0,0 +1,178 @@
+# File: utils/user_import_utils.py
+#
+# Bulk user import from CSV: validate every row at once with pandas, hash
+# passwords across a process pool, insert in chunks, report per row.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import supabase_utils as su
+from utils.hash_utils import BCRYPT_MAX_BYTES, hash_passwords
+
+REQUIRED_COLUMNS = ["username", "name", "email", "password"]
+OPTIONAL_COLUMNS = ["role", "approver", "default_category"]
+ROLES            = ("user", "approver", "admin")
+EMAIL_RE         = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+
+# Overridable under [user_import] in secrets.toml
+DEFAULT_SETTINGS = {
+    "bcrypt_rounds": 12,
+    "workers":       None,   # hashing processes; None = one per CPU
+    "chunk_size":    500,    # users per insert request
+}
+
+# Passwords per hashing task: small enough (a few seconds at cost 12) that
+# the progress bar keeps moving, big enough to amortise the IPC
+HASH_CHUNK_MAX = 20
+
+
+def import_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(dict(st.secrets.get("user_import", {})))
+    return settings
+
+
+@st.cache_resource
+def _get_hash_pool(workers: int = None) -> ProcessPoolExecutor:
+    """Process-wide bcrypt workers; spawned so they never inherit Streamlit threads."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def read_import_csv(file) -> pd.DataFrame:
+    """Reads the CSV as text, normalises headers and blanks, and checks required columns."""
+    frame = pd.read_csv(file, dtype=str, keep_default_na=False)
+    frame.columns = [c.strip().lower().replace(" ", "_") for c in frame.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for column in OPTIONAL_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = ""
+    frame = frame[REQUIRED_COLUMNS + OPTIONAL_COLUMNS].apply(lambda c: c.str.strip())
+    frame["role"] = frame["role"].str.lower().replace("", "user")
+    frame.index = frame.index + 2   # CSV line numbers (after the header)
+    return frame
+
+
+def validate_users(frame: pd.DataFrame, taken: set, approvers: list, categories: list) -> pd.DataFrame:
+    """
+    Adds approver_id, default_category_id and an `errors` column ("" when
+    the row is valid). Every check is one vectorised pass over the column.
+    """
+    # object dtype keeps integer ids from turning into floats next to NaN
+    approver_ids = pd.Series({a["name"].strip().lower(): a["id"] for a in approvers}, dtype=object)
+    category_ids = pd.Series({c["name"].strip().lower(): c["id"] for c in categories}, dtype=object)
+    frame = frame.assign(
+        approver_id=frame["approver"].str.lower().map(approver_ids),
+        default_category_id=frame["default_category"].str.lower().map(category_ids),
+    )
+    lowered = frame["username"].str.lower()
+    checks = {
+        "username must be letters and digits": ~frame["username"].str.fullmatch(r"[A-Za-z0-9]+"),
+        "username repeated in file":           lowered.duplicated(keep=False) & lowered.ne(""),
+        "username already exists":             lowered.isin(taken),
+        "name is required":                    frame["name"].eq(""),
+        "invalid email":                       ~frame["email"].str.fullmatch(EMAIL_RE),
+        "password is required":                frame["password"].eq(""),
+        f"password longer than {BCRYPT_MAX_BYTES} bytes":
+                                               frame["password"].str.encode("utf-8").str.len() > BCRYPT_MAX_BYTES,
+        f"role must be one of {', '.join(ROLES)}": ~frame["role"].isin(ROLES),
+        "unknown approver":                    frame["approver"].ne("") & frame["approver_id"].isna(),
+        "unknown default category":            frame["default_category"].ne("") & frame["default_category_id"].isna(),
+    }
+    errors = pd.Series("", index=frame.index)
+    for message, failed in checks.items():
+        errors = errors + np.where(failed, message + "; ", "")
+    return frame.assign(errors=errors.str.rstrip("; "))
+
+
+def hash_all(passwords: list, rounds: int, workers: int = None, progress=None) -> list:
+    """
+    bcrypt-hashes every password across the process pool, preserving order.
+    `progress(done, total)` is called as each chunk finishes, if given.
+    """
+    if not passwords:
+        return []
+    pool    = _get_hash_pool(workers)
+    n       = max(1, (workers or os.cpu_count()) * 4)
+    size    = min(HASH_CHUNK_MAX, -(-len(passwords) // n))
+    chunks  = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    futures = {pool.submit(hash_passwords, chunk, rounds): i for i, chunk in enumerate(chunks)}
+    hashed, done = [None] * len(chunks), 0
+    for future in as_completed(futures):
+        hashed[futures[future]] = future.result()
+        done += len(hashed[futures[future]])
+        if progress:
+            progress(done, len(passwords))
+    return [h for chunk in hashed for h in chunk]
+
+
+def _insert_chunk(rows: list, lines: list) -> list:
+    """Inserts a chunk in one request; if it fails, row by row to find the culprits."""
+    try:
+        su.insert_users_batch(rows)
+        return [(line, "created", "") for line in lines]
+    except Exception:
+        results = []
+        for row, line in zip(rows, lines):
+            try:
+                su.insert_users_batch([row])
+                results.append((line, "created", ""))
+            except Exception as e:
+                results.append((line, "failed", str(e)))
+        return results
+
+
+def import_users(frame: pd.DataFrame, progress=None, settings: dict = None) -> pd.DataFrame:
+    """
+    Validates, hashes and inserts the users in `frame` (see read_import_csv).
+    Looks up existing usernames, approvers and categories once each.
+    Returns one row per CSV line: line, username, status, error.
+    `progress(fraction, text)` is called between stages if given.
+    """
+    settings = settings or import_settings()
+    progress = progress or (lambda fraction, text: None)
+
+    progress(0.0, "Checking usernames, approvers and categories…")
+    checked = validate_users(
+        frame,
+        su.get_existing_usernames(frame["username"][frame["username"].ne("")].tolist()),
+        su.get_all_approvers(),
+        su.get_all_categories(),
+    )
+    valid = checked[checked["errors"].eq("")]
+
+    progress(0.1, f"Hashing {len(valid):,} passwords…")
+    hashes = hash_all(valid["password"].tolist(), int(settings["bcrypt_rounds"]), settings["workers"],
+                      lambda done, total: progress(0.1 + 0.4 * done / total, f"Hashing passwords {done:,}/{total:,}…"))
+
+    rows = [
+        {
+            "username":            r.username,
+            "name":                r.name,
+            "email":               r.email,
+            "role":                r.role,
+            "approver_id":         None if pd.isna(r.approver_id) else r.approver_id,
+            "default_category_id": None if pd.isna(r.default_category_id) else r.default_category_id,
+            "hashed_password":     h,
+        }
+        for r, h in zip(valid.itertuples(), hashes)
+    ]
+    lines   = valid.index.tolist()
+    size    = int(settings["chunk_size"])
+    results = []
+    for start in range(0, len(rows), size):
+        progress(0.5 + 0.5 * start / len(rows), f"Creating users {start + 1:,}–{min(start + size, len(rows)):,}…")
+        results += _insert_chunk(rows[start:start + size], lines[start:start + size])
+    progress(1.0, "Done.")
+
+    report = pd.DataFrame(results, columns=["line", "status", "error"]).set_index("line")
+    invalid = checked.loc[checked["errors"].ne(""), ["errors"]].rename(columns={"errors": "error"}).assign(status="invalid")
+    report = pd.concat([report, invalid]).sort_index()
+    return report.assign(username=checked["username"]).rename_axis("line").reset_index()[["line", "username", "status", "error"]]